@@ -0,0 +1,149 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.config import settings
+
+class CacheBackend:
+    """
+    Interfaz de almacenamiento para la caché de perfiles
+    
+    La implementación local vive en el proceso; un backend compartido
+    (por ejemplo Redis) implementa estos mismos métodos y se encarga de
+    serializar los valores.
+    """
+    
+    async def get(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+    
+    async def get_many(self, keys: list[str]) -> dict[str, dict]:
+        """Lectura de varias claves; un backend compartido puede hacerlo en un solo viaje"""
+        values = {}
+        for key in keys:
+            value = await self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+    
+    async def set(self, key: str, value: dict, ttl: float) -> None:
+        raise NotImplementedError
+    
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+    
+    async def clear(self) -> None:
+        raise NotImplementedError
+    
+    def stats(self) -> dict:
+        return {}
+
+class LocalCache(CacheBackend):
+    """Caché en memoria con expiración (TTL) y desalojo LRU de tamaño acotado"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+    
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+    
+    async def set(self, key: str, value: dict, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+    
+    async def clear(self) -> None:
+        self._entries.clear()
+    
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class ProfileCache:
+    """
+    Caché de lectura de perfiles por ID con contadores de aciertos y fallos
+    
+    Las escrituras de otros workers llegan como invalidaciones por el feed de
+    cambios. Mientras el feed va retrasado, suspended hace que la caché no se
+    lea ni se rellene (las invalidaciones sí se aplican).
+    """
+    
+    def __init__(self, backend: CacheBackend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.suspended = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"user:{user_id}"
+    
+    async def get(self, user_id: int) -> Optional[dict]:
+        """Devuelve el perfil cacheado o None si no está"""
+        if not self.enabled or self.suspended:
+            return None
+        value = await self.backend.get(self._key(user_id))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+    
+    async def get_many(self, user_ids: list[int]) -> dict[int, dict]:
+        """Devuelve los perfiles cacheados de los IDs indicados"""
+        if not self.enabled or self.suspended:
+            return {}
+        keys = {self._key(user_id): user_id for user_id in user_ids}
+        values = await self.backend.get_many(list(keys))
+        self.hits += len(values)
+        self.misses += len(keys) - len(values)
+        return {keys[key]: value for key, value in values.items()}
+    
+    async def set(self, user: dict) -> None:
+        """Guarda (o refresca) el perfil de un usuario"""
+        if self.enabled and not self.suspended:
+            await self.backend.set(self._key(user["id"]), dict(user), self.ttl)
+    
+    async def invalidate(self, user_id: int) -> None:
+        """Elimina el perfil de la caché tras una escritura"""
+        if self.enabled:
+            await self.backend.delete(self._key(user_id))
+            self.invalidations += 1
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "suspended": self.suspended,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            **self.backend.stats(),
+        }
+
+profile_cache = ProfileCache(
+    LocalCache(max_size=settings.cache_max_size),
+    ttl=settings.cache_ttl,
+    enabled=settings.cache_enabled
+)
@@ -0,0 +1,283 @@
+"""
+Feed de cambios de la tabla users
+
+Un trigger por sentencia registra cada alta, modificación y baja en
+user_changes (con la transacción que la escribió) y emite pg_notify. Cada
+worker mantiene una sola conexión dedicada con LISTEN; al recibir un aviso, o
+cada change_feed_poll_interval, lee los cambios posteriores a su cursor,
+invalida la caché de perfiles local y los reparte a los suscriptores en
+memoria (los streams SSE de /api/users/changes).
+
+Los cambios se recorren por (tx, id) y solo hasta el xmin del snapshot, de
+modo que una transacción que confirma tarde nunca queda detrás de un cursor
+ya entregado. Ese mismo par, como "tx-id", es el ID de cada evento SSE.
+
+El precio es que una transacción larga (de esta aplicación o de cualquier
+otra sesión) retiene todos los cambios posteriores hasta que termina. El
+retraso se expone en change_feed_lag_seconds y, si supera
+change_feed_max_lag, el worker deja de servir la caché de perfiles hasta
+ponerse al día: sin el feed no se entera de las escrituras de los demás.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator, Optional
+import psycopg
+from app.cache import profile_cache
+from app.config import settings
+from app.controllers import statements
+from app.controllers.statements import execute
+from app.database import db
+from app.metrics import (
+    change_feed_dropped_subscribers_total,
+    change_feed_events_total,
+    change_feed_reconnects_total,
+)
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "user_changes"
+
+# Intervalo entre purgas de user_changes por antigüedad
+PRUNE_INTERVAL = 3600.0
+
+class Subscription:
+    """Cola de eventos de un stream; se corta si se llena en lugar de bloquear al resto"""
+    
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.change_feed_queue_size)
+        self.closed = False
+    
+    def close(self):
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)  # despierta al stream
+        except asyncio.QueueFull:
+            pass
+
+def change_cursor(change: dict) -> tuple[int, int]:
+    return change["tx"], change["id"]
+
+def format_cursor(cursor: tuple[int, int]) -> str:
+    return f"{cursor[0]}-{cursor[1]}"
+
+def parse_cursor(token: str) -> tuple[int, int]:
+    """
+    Cursor "tx-id" de un evento (ValueError si no es válido)
+    
+    Un ID numérico solo (el formato anterior) equivale a tx 0: los cambios
+    registrados antes de guardar la transacción tienen tx = 0.
+    """
+    parts = token.split("-")
+    if len(parts) == 1:
+        parts.insert(0, "0")
+    if len(parts) != 2 or not all(part.isdigit() for part in parts):
+        raise ValueError(f"Cursor de cambios inválido: {token!r}")
+    return int(parts[0]), int(parts[1])
+
+def format_event(change: dict) -> str:
+    """Evento SSE con el cursor del cambio para reanudar con Last-Event-ID"""
+    data = {**change, "changed_at": change["changed_at"].isoformat()}
+    del data["tx"]
+    return f"id: {format_cursor(change_cursor(change))}\nevent: {change['op']}\ndata: {json.dumps(data)}\n\n"
+
+async def changes_after(after: tuple[int, int], limit: int) -> list[dict]:
+    """Cambios ya confirmados posteriores a un cursor, en orden de (tx, id)"""
+    tx, change_id = after
+    async with db.get_connection() as conn:
+        async with conn.cursor() as cur:
+            await execute(cur, statements.GET_CHANGES_AFTER, {"tx": tx, "id": change_id, "limit": limit})
+            return await cur.fetchall()
+
+class ChangeFeed:
+    
+    def __init__(self):
+        self.subscribers: set[Subscription] = set()
+        self.connected = False
+        self.cursor: Optional[tuple[int, int]] = None  # último cambio repartido
+        self.held_since: Optional[float] = None  # desde cuándo (monotonic) hay cambios retenidos
+        self._task: Optional[asyncio.Task] = None
+        self._last_prune = 0.0
+    
+    async def start(self):
+        if settings.change_feed_enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        for subscription in list(self.subscribers):
+            subscription.close()
+        self.subscribers.clear()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.connected = False
+        self.held_since = None
+        profile_cache.suspended = False
+    
+    def available(self) -> bool:
+        """Si el feed está activo y admite otro stream"""
+        return self._task is not None and len(self.subscribers) < settings.change_feed_max_subscribers
+    
+    def subscribe(self) -> Optional[Subscription]:
+        """Registra un stream; None si el feed no está activo o se alcanzó el máximo"""
+        if not self.available():
+            return None
+        subscription = Subscription()
+        self.subscribers.add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            "connected": self.connected,
+            "subscribers": len(self.subscribers),
+            "cursor": format_cursor(self.cursor) if self.cursor else None,
+            "lag_seconds": self.lag(),
+        }
+    
+    def lag(self) -> float:
+        """Segundos que lleva retenido el cambio confirmado más antiguo sin repartir"""
+        return time.monotonic() - self.held_since if self.held_since is not None else 0.0
+    
+    async def stream(self, after: Optional[tuple[int, int]] = None) -> AsyncIterator[str]:
+        """
+        Eventos SSE de un stream
+        
+        La suscripción se abre al empezar a iterar (y se cierra al terminar),
+        así que una respuesta que nunca llega a enviarse no ocupa una plaza.
+        Con after primero se envían los cambios guardados desde ese cursor y
+        luego los recibidos en vivo, sin repetir los que ya salieron del
+        histórico.
+        """
+        subscription = self.subscribe()
+        if subscription is None:
+            return
+        try:
+            replayed = after
+            if after is not None:
+                while True:
+                    changes = await changes_after(replayed, settings.change_feed_backlog_page)
+                    for change in changes:
+                        yield format_event(change)
+                        replayed = change_cursor(change)
+                    if len(changes) < settings.change_feed_backlog_page:
+                        break
+            
+            while not (subscription.closed and subscription.queue.empty()):
+                try:
+                    change = await asyncio.wait_for(subscription.queue.get(), settings.change_feed_keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if change is None:
+                    break
+                if replayed is not None and change_cursor(change) <= replayed:
+                    continue
+                yield format_event(change)
+        finally:
+            self.unsubscribe(subscription)
+    
+    async def _run(self):
+        """Mantiene la conexión de LISTEN, reconectando con espera exponencial"""
+        backoff = 1.0
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Conexión del feed de cambios perdida: %s", e)
+            # Sin LISTEN no llegan las invalidaciones; la caché vuelve al ponerse al día
+            profile_cache.suspended = True
+            if self.connected:
+                backoff = 1.0
+            self.connected = False
+            change_feed_reconnects_total.inc()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+    
+    async def _listen(self):
+        async with await psycopg.AsyncConnection.connect(settings.database_url, autocommit=True) as conn:
+            await conn.execute(f"LISTEN {CHANNEL}")
+            self.connected = True
+            if self.cursor is None:
+                self.cursor = await self._head()
+            
+            while True:
+                # Tras reconectar recupera lo ocurrido mientras no se escuchaba.
+                # Sin aviso también se relee: los cambios de una transacción
+                # quedan retenidos mientras otra anterior sigue abierta, y esa
+                # puede terminar sin escribir en users
+                await self._poll()
+                async for _ in conn.notifies(timeout=settings.change_feed_poll_interval, stop_after=1):
+                    pass
+                await self._prune()
+    
+    async def _head(self) -> tuple[int, int]:
+        """Cursor a partir del cual todo cambio confirmado es nuevo"""
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.GET_CHANGES_HEAD)
+                row = await cur.fetchone()
+                return change_cursor(row)
+    
+    async def _poll(self):
+        while changes := await changes_after(self.cursor, settings.change_feed_backlog_page):
+            await self._dispatch(changes)
+            if len(changes) < settings.change_feed_backlog_page:
+                break
+        await self._check_lag()
+    
+    async def _check_lag(self):
+        """Mide los cambios retenidos y suspende la caché de perfiles si el retraso es excesivo"""
+        tx, change_id = self.cursor
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.GET_CHANGES_LAG, {"tx": tx, "id": change_id})
+                lag = (await cur.fetchone())["lag"]
+        self.held_since = time.monotonic() - max(lag, 0.0) if lag is not None else None
+        
+        lagging = self.lag() > settings.change_feed_max_lag
+        if lagging and not profile_cache.suspended:
+            logger.warning(
+                "Feed de cambios retenido %.0fs por una transacción abierta; caché de perfiles suspendida",
+                self.lag()
+            )
+        elif profile_cache.suspended and not lagging:
+            logger.info("Feed de cambios al día; caché de perfiles reanudada")
+        profile_cache.suspended = lagging
+    
+    async def _dispatch(self, changes: list[dict]):
+        for change in changes:
+            change_feed_events_total.inc(op=change["op"])
+            if change["op"] != "insert":
+                # Escritura de otro worker: este también deja de fiarse de las réplicas para ese ID
+                db.note_write(change["user_id"])
+                await profile_cache.invalidate(change["user_id"])
+            for subscription in list(self.subscribers):
+                try:
+                    subscription.queue.put_nowait(change)
+                except asyncio.QueueFull:
+                    # El cliente reconecta con Last-Event-ID y se pone al día desde la tabla
+                    self.unsubscribe(subscription)
+                    subscription.closed = True
+                    change_feed_dropped_subscribers_total.inc()
+        if changes:
+            self.cursor = change_cursor(changes[-1])
+    
+    async def _prune(self):
+        now = time.monotonic()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.PRUNE_CHANGES, {"hours": settings.change_feed_retention_hours})
+            await conn.commit()
+
+change_feed = ChangeFeed()
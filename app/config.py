@@ -1,5 +1,7 @@
+import os
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Optional
 
 # Obtener la ruta raíz del proyecto
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -9,7 +11,161 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     
+    # Servidor de producción (python -m app.server)
+    workers: Optional[int] = None          # procesos; None usa un worker por núcleo
+    server_loop: str = "auto"              # "uvloop", "asyncio" o "auto" (uvloop si está instalado)
+    server_http: str = "auto"              # "httptools", "h11" o "auto" (httptools si está instalado)
+    keep_alive_timeout: int = 5            # segundos que se mantiene abierta una conexión ociosa
+    backlog: int = 2048                    # conexiones pendientes de aceptar en el socket
+    limit_concurrency: Optional[int] = None  # conexiones simultáneas por worker antes de responder 503
+    graceful_shutdown_timeout: float = 30.0  # segundos para drenar peticiones en curso al apagar
+    proxy_headers: bool = True             # confiar en X-Forwarded-* de forwarded_allow_ips
+    forwarded_allow_ips: str = "127.0.0.1"
+    
+    # Pool de conexiones a PostgreSQL
+    db_pool_min_size: int = 2
+    db_pool_max_size: int = 10
+    db_pool_timeout: float = 30.0         # segundos esperando una conexión libre
+    db_pool_max_idle: float = 300.0       # segundos antes de cerrar una conexión ociosa
+    db_pool_max_lifetime: float = 3600.0  # segundos antes de reciclar una conexión
+    db_pool_check: bool = True            # verificar la conexión antes de entregarla
+    db_max_connections: Optional[int] = None  # tope total entre todos los workers (None: sin tope)
+    readiness_timeout: float = 2.0        # segundos para obtener conexión en /ready
+    
+    # Réplicas de lectura (URLs separadas por comas; vacío: todo va al primario)
+    database_replica_urls: str = ""
+    replica_strategy: str = "round_robin"  # "round_robin" o "least_busy"
+    replica_connect_timeout: float = 2.0   # segundos esperando conexión de réplica antes de usar el primario
+    replica_check_interval: float = 5.0    # segundos entre comprobaciones de salud
+    replica_max_failures: int = 3          # fallos seguidos antes de expulsar una réplica
+    replica_max_lag: Optional[float] = None  # segundos de retraso de replicación tolerados
+    # Tras escribir un perfil, sus lecturas van al primario durante estos segundos (0 lo desactiva)
+    read_your_writes_window: float = 0.0
+    # Segundos tras una escritura en los que una réplica puede devolver aún la versión
+    # anterior: lo leído de réplica en ese intervalo no se guarda en la caché de perfiles
+    replica_lag_window: float = 5.0
+    recent_writes_max_size: int = 100_000  # escrituras recientes recordadas por worker
+    # Prepared statements del lado del servidor (desactivar detrás de PgBouncer en modo transacción)
+    db_prepared_statements: bool = True
+    db_prepare_threshold: Optional[int] = 5  # ejecuciones antes de preparar consultas no registradas
+    
+    # Registrar en el log las consultas más lentas que este umbral (None lo desactiva)
+    slow_query_ms: Optional[float] = 200.0
+    
+    # Aplicar migraciones pendientes al arrancar. Solo para desarrollo: en
+    # producción se migra como paso del despliegue (python -m app.migrations)
+    # y los workers únicamente comprueban la versión
+    auto_migrate: bool = False
+    
+    # Paginación de listados
+    page_size_default: int = 20
+    page_size_max: int = 100
+    search_max_offset: int = 1000  # la búsqueda pagina por offset; se limita su profundidad
+    search_min_length: int = 3     # caracteres mínimos: un prefijo más corto coincide con media tabla
+    search_max_candidates: int = 2000  # coincidencias por prefijo y por texto que se ordenan por relevancia
+    
+    # Exportación masiva: filas por cada lectura del cursor del servidor
+    export_chunk_size: int = 2000
+    
+    # Importación masiva: filas validadas que se cargan por cada COPY
+    import_batch_size: int = 5000
+    import_max_line_bytes: int = 64 * 1024  # una fila más larga se informa como inválida y se salta
+    
+    # Lectura en lote de perfiles por ID
+    batch_get_max_ids: int = 1000    # IDs máximos por petición
+    batch_get_chunk_size: int = 500  # IDs por consulta a la base de datos
+    
+    # Plantillas
+    template_auto_reload: bool = False  # activar solo en desarrollo
+    template_bytecode_cache_dir: Optional[str] = str(BASE_DIR / ".cache" / "jinja")
+    
+    # Serialización JSON con orjson sin revalidar filas del controlador (requiere pip install .[fast])
+    fast_json: bool = False
+    
+    # Compresión de respuestas y archivos estáticos
+    gzip_min_size: int = 1000   # bytes mínimos para comprimir una respuesta
+    gzip_level: int = 6
+    static_build_dir: Optional[str] = str(BASE_DIR / ".cache" / "static")  # copias .gz precomprimidas
+    
+    # Plazo por petición en segundos (None: sin plazo); se aplica como statement_timeout en PostgreSQL
+    request_timeout: Optional[float] = 15.0
+    # Plazos por prefijo de ruta que sustituyen al global
+    request_timeouts: dict[str, Optional[float]] = {"/api/users/export": None, "/api/users/bulk": 300.0}
+    
+    # Control de admisión: peticiones simultáneas por grupo de rutas (prefijo -> límite).
+    # Exportación e importación masivas tienen su propio grupo: duran minutos y
+    # no deben ocupar los turnos de las peticiones cortas de /api/users
+    admission_enabled: bool = True
+    admission_limits: dict[str, int] = {
+        "/api/users/export": 4,
+        "/api/users/bulk": 4,
+        "/api/users": 64,
+        "/web/users": 32,
+    }
+    admission_queue_size: int = 128       # peticiones en espera por grupo antes de rechazar
+    admission_queue_timeout: float = 1.0  # segundos máximos en cola antes de responder 503
+    admission_retry_after: int = 1        # segundos sugeridos en Retry-After
+    # Límite por IP con token bucket en memoria (None lo desactiva)
+    rate_limit_per_ip: Optional[float] = None  # peticiones por segundo
+    rate_limit_burst: int = 20
+    
+    # Feed de cambios (LISTEN/NOTIFY y stream SSE en /api/users/changes)
+    change_feed_enabled: bool = True
+    change_feed_queue_size: int = 1000        # eventos pendientes por suscriptor antes de cortarlo
+    change_feed_max_subscribers: int = 1000   # streams abiertos por worker
+    change_feed_keepalive: float = 15.0       # segundos entre comentarios keep-alive del stream
+    change_feed_backlog_page: int = 500       # cambios por consulta al reanudar un stream
+    change_feed_poll_interval: float = 1.0    # segundos entre lecturas de user_changes sin avisos
+    # Retraso del feed (cambios retenidos por una transacción larga) a partir del
+    # cual el worker deja de servir la caché de perfiles, cuya invalidación depende del feed
+    change_feed_max_lag: float = 30.0
+    change_feed_retention_hours: float = 72.0 # antigüedad máxima de user_changes
+    
+    # Trabajos por lotes de desactivación y purga (python -m app.jobs o /api/admin/jobs)
+    # Token que exige /api/admin (Authorization: Bearer o X-Admin-Token); sin él la API de administración responde 503
+    admin_token: Optional[str] = None
+    job_batch_size: int = 1000
+    job_batch_pause: float = 0.1      # segundos de pausa entre lotes
+    job_backoff_step: float = 0.5     # espera extra mientras haya peticiones esperando conexión
+    job_max_backoff: float = 30.0     # espera máxima por lote antes de continuar igualmente
+    job_locked_retries: int = 50      # lotes seguidos sin avanzar por filas bloqueadas antes de fallar
+    # Segundos sin progreso tras los que un trabajo running o cancelling se da por
+    # huérfano y se puede reanudar; debe superar lo que tarda un lote más job_max_backoff
+    job_stale_after: float = 300.0
+    
+    # Caché de perfiles (lectura por ID)
+    cache_enabled: bool = True
+    cache_ttl: float = 60.0      # segundos de vida de cada entrada
+    cache_max_size: int = 10000  # entradas máximas antes de desalojar (LRU)
+    
+    @property
+    def replica_urls(self) -> list[str]:
+        return [url.strip() for url in self.database_replica_urls.split(",") if url.strip()]
+    
+    @property
+    def worker_count(self) -> int:
+        """Workers efectivos del servidor de producción"""
+        return max(1, self.workers or os.cpu_count() or 1)
+    
+    def dedicated_connections(self) -> int:
+        """Conexiones de cada worker fuera del pool (la de LISTEN del feed de cambios)"""
+        return 1 if self.change_feed_enabled else 0
+    
+    def pool_sizes(self) -> tuple[int, int]:
+        """
+        Tamaño (mínimo, máximo) del pool de cada worker
+        
+        Con db_max_connections el máximo se reparte entre los workers para que
+        la suma de todos los pools no supere el tope de PostgreSQL, descontando
+        la conexión de LISTEN que cada worker abre para el feed de cambios.
+        """
+        max_size = self.db_pool_max_size
+        if self.db_max_connections is not None:
+            per_worker = self.db_max_connections // self.worker_count - self.dedicated_connections()
+            max_size = min(max_size, max(1, per_worker))
+        return min(self.db_pool_min_size, max_size), max_size
+    
     class Config:
         env_file = BASE_DIR / ".env"  # Busca .env en la raíz del proyecto
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
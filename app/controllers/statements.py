@@ -0,0 +1,298 @@
+import logging
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from app.config import settings
+from app.deadlines import remaining
+from app.metrics import db_query_duration_seconds, db_query_errors_total, db_slow_queries_total
+
+logger = logging.getLogger(__name__)
+
+class Statement(NamedTuple):
+    """Sentencia SQL con nombre, definida una sola vez y ejecutada como prepared statement"""
+    name: str
+    sql: str
+
+# Proyección completa de un usuario, compartida por todas las consultas
+USER_COLUMNS = """id, email, full_name, phone, bio, location,
+                  is_active, created_at, updated_at, version"""
+
+# Campos que puede modificar el usuario en su perfil
+UPDATABLE_FIELDS = ("full_name", "phone", "bio", "location")
+
+CREATE_USER = Statement("create_user", f"""
+    INSERT INTO users (email, full_name, phone, bio, location)
+    VALUES (%(email)s, %(full_name)s, %(phone)s, %(bio)s, %(location)s)
+    ON CONFLICT (email) DO NOTHING
+    RETURNING {USER_COLUMNS}
+""")
+
+GET_USER_BY_ID = Statement("get_user_by_id", f"""
+    SELECT {USER_COLUMNS}
+    FROM users
+    WHERE id = %s AND is_active = TRUE
+""")
+
+# Validación de cachés HTTP: solo lo necesario para calcular ETag y Last-Modified
+GET_USER_VERSION = Statement("get_user_version", """
+    SELECT id, version, updated_at
+    FROM users
+    WHERE id = %s AND is_active = TRUE
+""")
+
+GET_USERS_BY_IDS = Statement("get_users_by_ids", f"""
+    SELECT {USER_COLUMNS}
+    FROM users
+    WHERE id = ANY(%s::int[]) AND is_active = TRUE
+""")
+
+GET_USER_BY_EMAIL = Statement("get_user_by_email", f"""
+    SELECT {USER_COLUMNS}
+    FROM users
+    WHERE email = %s AND is_active = TRUE
+""")
+
+DELETE_USER = Statement("delete_user", """
+    DELETE FROM users
+    WHERE id = %s AND is_active = TRUE
+    RETURNING id, email
+""")
+
+DEACTIVATE_USER = Statement("deactivate_user", """
+    UPDATE users
+    SET is_active = FALSE
+    WHERE id = %s AND is_active = TRUE
+    RETURNING id, email, is_active
+""")
+
+# Paginación por cursor: una forma por dirección para que cada una tenga su plan
+LIST_USERS_FIRST = Statement("list_users_first", f"""
+    SELECT {USER_COLUMNS}
+    FROM users
+    WHERE is_active = TRUE
+    ORDER BY created_at DESC, id DESC
+    LIMIT %(limit)s
+""")
+
+LIST_USERS_NEXT = Statement("list_users_next", f"""
+    SELECT {USER_COLUMNS}
+    FROM users
+    WHERE is_active = TRUE AND (created_at, id) < (%(created_at)s, %(id)s)
+    ORDER BY created_at DESC, id DESC
+    LIMIT %(limit)s
+""")
+
+LIST_USERS_PREV = Statement("list_users_prev", f"""
+    SELECT {USER_COLUMNS}
+    FROM users
+    WHERE is_active = TRUE AND (created_at, id) > (%(created_at)s, %(id)s)
+    ORDER BY created_at ASC, id ASC
+    LIMIT %(limit)s
+""")
+
+# Búsqueda: primero coincidencias por prefijo de nombre/email, luego por relevancia del texto
+# Los candidatos (por prefijo y por texto completo) se acotan antes de
+# calcular ts_rank: un término frecuente no obliga a puntuar media tabla
+_SEARCH_USERS = f"""
+    SELECT {USER_COLUMNS},
+           ts_rank(search_vector, query) AS rank
+    FROM (
+        (SELECT id FROM users
+         WHERE is_active = TRUE
+           AND (lower(full_name) LIKE %(prefix)s OR lower(email) LIKE %(prefix)s)
+           {{location_filter}}
+         LIMIT %(max_candidates)s)
+        UNION
+        (SELECT id FROM users
+         WHERE is_active = TRUE
+           AND search_vector @@ websearch_to_tsquery('simple', %(q)s)
+           {{location_filter}}
+         LIMIT %(max_candidates)s)
+    ) AS candidates
+    JOIN users USING (id), websearch_to_tsquery('simple', %(q)s) AS query
+    ORDER BY (lower(full_name) LIKE %(prefix)s OR lower(email) LIKE %(prefix)s) DESC,
+             rank DESC, id DESC
+    LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+SEARCH_USERS = Statement("search_users", _SEARCH_USERS.format(location_filter=""))
+
+SEARCH_USERS_IN_LOCATION = Statement("search_users_in_location", _SEARCH_USERS.format(
+    location_filter="AND lower(location) LIKE %(location)s"
+))
+
+# Solo la primera aparición de cada email dentro del lote compite por insertarse
+BULK_INSERT_FROM_STAGING = Statement("bulk_insert_from_staging", """
+    INSERT INTO users (email, full_name, phone, bio, location)
+    SELECT email, full_name, phone, bio, location
+    FROM (
+        SELECT DISTINCT ON (email) ord, email, full_name, phone, bio, location
+        FROM users_import_staging
+        ORDER BY email, ord
+    ) AS first_rows
+    ORDER BY ord
+    ON CONFLICT (email) DO NOTHING
+    RETURNING id, email
+""")
+
+# Feed de cambios
+CHANGE_COLUMNS = "id, tx::text::bigint AS tx, user_id, op, version, changed_at"
+
+# Solo cambios de transacciones anteriores al xmin del snapshot: todas ya
+# terminaron, así que ninguna confirmación posterior puede quedar por detrás
+# del cursor (tx, id)
+GET_CHANGES_AFTER = Statement("get_changes_after", f"""
+    SELECT {CHANGE_COLUMNS}
+    FROM user_changes
+    WHERE (tx, id) > (%(tx)s::text::xid8, %(id)s)
+      AND tx < pg_snapshot_xmin(pg_current_snapshot())
+    ORDER BY tx, id
+    LIMIT %(limit)s
+""")
+
+# Antigüedad del cambio confirmado más antiguo que sigue retenido por una
+# transacción anterior aún abierta (NULL si no hay ninguno)
+GET_CHANGES_LAG = Statement("get_changes_lag", """
+    SELECT extract(epoch FROM CURRENT_TIMESTAMP - min(changed_at))::float8 AS lag
+    FROM user_changes
+    WHERE (tx, id) > (%(tx)s::text::xid8, %(id)s)
+      AND tx >= pg_snapshot_xmin(pg_current_snapshot())
+""")
+
+GET_CHANGES_HEAD = Statement("get_changes_head", """
+    SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS tx, 0 AS id
+""")
+
+PRUNE_CHANGES = Statement("prune_changes", """
+    DELETE FROM user_changes
+    WHERE changed_at < CURRENT_TIMESTAMP - %(hours)s * INTERVAL '1 hour'
+""")
+
+# Trabajos por lotes
+JOB_COLUMNS = """id, action, params, status, processed, batches, last_id,
+                 error, created_at, updated_at, finished_at"""
+
+CREATE_JOB = Statement("create_job", f"""
+    INSERT INTO batch_jobs (action, params)
+    VALUES (%(action)s, %(params)s)
+    RETURNING {JOB_COLUMNS}
+""")
+
+GET_JOB = Statement("get_job", f"""
+    SELECT {JOB_COLUMNS} FROM batch_jobs WHERE id = %s
+""")
+
+LIST_JOBS = Statement("list_jobs", f"""
+    SELECT {JOB_COLUMNS} FROM batch_jobs ORDER BY id DESC LIMIT %s
+""")
+
+# Un trabajo running o cancelling sin progreso registrado en stale_after
+# segundos quedó huérfano (su proceso murió); updated_at es el latido
+STALE_JOB = "updated_at < CURRENT_TIMESTAMP - %(stale_after)s * INTERVAL '1 second'"
+
+# Solo un proceso puede tomar el trabajo; se reanuda desde last_id
+CLAIM_JOB = Statement("claim_job", f"""
+    UPDATE batch_jobs
+    SET status = 'running', error = NULL, finished_at = NULL, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(id)s AND (
+        status IN ('pending', 'cancelled', 'failed')
+        OR (status IN ('running', 'cancelling') AND {STALE_JOB})
+    )
+    RETURNING {JOB_COLUMNS}
+""")
+
+# Se registra en la misma transacción que el lote (y hace de latido del
+# trabajo): el progreso nunca se adelanta ni se pierde
+RECORD_JOB_PROGRESS = Statement("record_job_progress", """
+    UPDATE batch_jobs
+    SET processed = processed + %(count)s, batches = batches + 1,
+        last_id = %(last_id)s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(id)s
+    RETURNING status
+""")
+
+FINISH_JOB = Statement("finish_job", f"""
+    UPDATE batch_jobs
+    SET status = %(status)s, error = %(error)s,
+        updated_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+    WHERE id = %(id)s
+    RETURNING {JOB_COLUMNS}
+""")
+
+# Un trabajo huérfano no tiene quien atienda el cancelling: pasa a cancelled
+CANCEL_JOB = Statement("cancel_job", f"""
+    UPDATE batch_jobs
+    SET status = CASE WHEN status = 'running' AND NOT ({STALE_JOB}) THEN 'cancelling' ELSE 'cancelled' END,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(id)s AND (status IN ('pending', 'running') OR (status = 'cancelling' AND {STALE_JOB}))
+    RETURNING {JOB_COLUMNS}
+""")
+
+ENSURE_ARCHIVE_PARTITION = Statement("ensure_archive_partition", """
+    SELECT ensure_users_archive_partition(CURRENT_TIMESTAMP::timestamp)
+""")
+
+@lru_cache(maxsize=2 ** (len(UPDATABLE_FIELDS) + 1))
+def update_profile_statement(fields: frozenset[str], conditional: bool = False) -> Statement:
+    """
+    Sentencia UPDATE para un conjunto de campos
+    
+    Los campos se ordenan para que cada combinación produzca siempre el mismo
+    texto SQL: como máximo hay (2^4 - 1) x 2 formas distintas que preparar.
+    Con conditional=True solo actualiza si la versión coincide con %(expected_version)s.
+    """
+    unknown = fields - set(UPDATABLE_FIELDS)
+    if unknown or not fields:
+        raise ValueError(f"Campos no actualizables: {', '.join(sorted(unknown)) or '(ninguno)'}")
+    
+    ordered = [field for field in UPDATABLE_FIELDS if field in fields]
+    set_clauses = ", ".join(f"{field} = %({field})s" for field in ordered)
+    version_check = "AND version = %(expected_version)s" if conditional else ""
+    name = f"update_user_profile{'_if_version' if conditional else ''}:{','.join(ordered)}"
+    return Statement(name, f"""
+    UPDATE users
+    SET {set_clauses}
+    WHERE id = %(id)s AND is_active = TRUE {version_check}
+    RETURNING {USER_COLUMNS}
+""")
+
+# statement_timeout local a la transacción, derivado del plazo de la petición
+SET_STATEMENT_TIMEOUT = "SELECT set_config('statement_timeout', %s, true)"
+
+async def execute(cur, statement: Statement, params: Optional[dict | tuple] = None):
+    """
+    Ejecuta una sentencia del registro, preparada en el servidor por cada conexión del pool
+    
+    Dentro de una petición con plazo, la sentencia se limita al tiempo que le
+    queda con statement_timeout. El set_config va en el mismo pipeline que la
+    sentencia, así que no añade un viaje de ida y vuelta a PostgreSQL.
+    """
+    time_left = remaining()
+    with measured(statement.name):
+        if time_left is None:
+            return await cur.execute(statement.sql, params, prepare=settings.db_prepared_statements)
+        async with cur.connection.pipeline():
+            await cur.connection.execute(SET_STATEMENT_TIMEOUT, (str(max(1, int(time_left * 1000))),))
+            return await cur.execute(statement.sql, params, prepare=settings.db_prepared_statements)
+
+@contextmanager
+def measured(name: str):
+    """
+    Duración, errores y aviso de consulta lenta de lo que se ejecute dentro
+    
+    Lo usa execute(); también las consultas que no pasan por el registro
+    (como el cursor con nombre de la exportación).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        db_query_errors_total.inc(statement=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        db_query_duration_seconds.observe(elapsed, statement=name)
+        if settings.slow_query_ms is not None and elapsed * 1000 >= settings.slow_query_ms:
+            db_slow_queries_total.inc(statement=name)
+            logger.warning("Consulta lenta %s: %.1f ms", name, elapsed * 1000)
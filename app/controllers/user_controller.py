@@ -1,141 +1,370 @@
-from typing import Optional
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from psycopg import sql
+from app.config import settings
 from app.database import db
+from app.cache import profile_cache
+from app.controllers import statements
+from app.controllers.statements import execute, measured
 from app.models.user import UserCreate, UserUpdate
+from app.utils.pagination import NEXT, PREV, encode_cursor, decode_cursor
+from app.utils.search import like_prefix
+
+# Columnas que se pueden solicitar en una exportación
+EXPORT_COLUMNS = (
+    "id", "email", "full_name", "phone", "bio", "location",
+    "is_active", "created_at", "updated_at", "version"
+)
+
+@dataclass(frozen=True)
+class CreateUserResult:
+    """Resultado de crear un usuario: el registro creado, o None si el email ya existía"""
+    user: Optional[dict]
+    
+    @property
+    def duplicate(self) -> bool:
+        return self.user is None
+
+@dataclass(frozen=True)
+class UpdateUserResult:
+    """Resultado de actualizar un perfil: el registro actualizado, o el motivo por el que no se hizo"""
+    user: Optional[dict]
+    # La versión esperada no coincide: otro cliente modificó el perfil
+    conflict: bool = False
+    
+    @property
+    def not_found(self) -> bool:
+        return self.user is None and not self.conflict
 
 class UserController:
     
     @staticmethod
-    def create_user(user: UserCreate) -> dict:
-        """Crea un nuevo usuario"""
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO users (email, full_name, phone, bio, location)
-                    VALUES (%(email)s, %(full_name)s, %(phone)s, %(bio)s, %(location)s)
-                    RETURNING id, email, full_name, phone, bio, location, 
-                              is_active, created_at, updated_at
-                    """,
-                    user.model_dump()
-                )
-                result = cur.fetchone()
-                conn.commit()
-                return result
+    async def create_user(user: UserCreate) -> CreateUserResult:
+        """Crea un nuevo usuario; detecta el email duplicado en la misma sentencia"""
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.CREATE_USER, user.model_dump())
+                result = await cur.fetchone()
+                await conn.commit()
+        
+        if result:
+            db.note_write(result["id"])
+        return CreateUserResult(user=result)
     
     @staticmethod
-    def get_user_by_id(user_id: int) -> Optional[dict]:
-        """Obtiene el perfil de un usuario por su ID"""
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT id, email, full_name, phone, bio, location, 
-                           is_active, created_at, updated_at 
-                    FROM users 
-                    WHERE id = %s AND is_active = TRUE
-                    """,
-                    (user_id,)
-                )
-                return cur.fetchone()
+    async def get_user_by_id(user_id: int) -> Optional[dict]:
+        """Obtiene el perfil de un usuario por su ID (consultando primero la caché)"""
+        cached = await profile_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
+        async with db.get_read_connection(user_id) as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.GET_USER_BY_ID, (user_id,))
+                user = await cur.fetchone()
+        
+        # Una réplica retrasada podría devolver la versión anterior a una escritura reciente
+        if user and not db.may_be_stale(user_id):
+            await profile_cache.set(user)
+        return user
+    
+    @staticmethod
+    async def get_user_version(user_id: int) -> Optional[dict]:
+        """Obtiene solo id, version y updated_at (de la caché si está) para peticiones condicionales"""
+        cached = await profile_cache.get(user_id)
+        if cached is not None:
+            return {"id": cached["id"], "version": cached["version"], "updated_at": cached["updated_at"]}
+        
+        async with db.get_read_connection(user_id) as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.GET_USER_VERSION, (user_id,))
+                return await cur.fetchone()
     
     @staticmethod
-    def get_user_by_email(email: str) -> Optional[dict]:
+    async def get_users_by_ids(user_ids: list[int]) -> dict[int, dict]:
+        """
+        Obtiene varios perfiles por ID en pocas consultas
+        
+        Primero se consulta la caché; los IDs que faltan se piden con
+        id = ANY(...) en bloques de batch_get_chunk_size. Devuelve un
+        diccionario ID -> perfil solo con los usuarios encontrados.
+        """
+        unique_ids = list(dict.fromkeys(user_ids))
+        users = await profile_cache.get_many(unique_ids)
+        missing = [user_id for user_id in unique_ids if user_id not in users]
+        if not missing:
+            return users
+        
+        async with db.get_read_connection(*missing) as conn:
+            async with conn.cursor() as cur:
+                for start in range(0, len(missing), settings.batch_get_chunk_size):
+                    chunk = missing[start:start + settings.batch_get_chunk_size]
+                    await execute(cur, statements.GET_USERS_BY_IDS, (chunk,))
+                    for user in await cur.fetchall():
+                        users[user["id"]] = user
+                        if not db.may_be_stale(user["id"]):
+                            await profile_cache.set(user)
+        return users
+    
+    @staticmethod
+    async def get_user_by_email(email: str) -> Optional[dict]:
         """Obtiene un usuario por su email"""
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT id, email, full_name, phone, bio, location, 
-                           is_active, created_at, updated_at 
-                    FROM users 
-                    WHERE email = %s AND is_active = TRUE
-                    """,
-                    (email,)
-                )
-                return cur.fetchone()
+        async with db.get_read_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.GET_USER_BY_EMAIL, (email,))
+                user = await cur.fetchone()
+        
+        if user is None:
+            return None
+        users = await UserController._with_recent_writes([user])
+        return users[0] if users else None
+    
+    @staticmethod
+    async def _with_recent_writes(rows: list[dict]) -> list[dict]:
+        """
+        Sustituye las filas escritas hace poco por su versión del primario
+        
+        Los listados no conocen sus IDs antes de consultar, así que pueden
+        haberse leído de una réplica; las filas dentro de read_your_writes_window
+        se vuelven a leer del primario (y se quitan si ya no están activas).
+        """
+        stale = db.recently_written(row["id"] for row in rows)
+        if not stale:
+            return rows
+        
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.GET_USERS_BY_IDS, (list(stale),))
+                fresh = {user["id"]: user for user in await cur.fetchall()}
+        # Se conservan las columnas propias del listado (p. ej. rank)
+        return [
+            {**row, **fresh[row["id"]]} if row["id"] in stale else row
+            for row in rows
+            if row["id"] not in stale or row["id"] in fresh
+        ]
     
     @staticmethod
-    def update_user_profile(user_id: int, user: UserUpdate) -> Optional[dict]:
-        """Actualiza la información personal del usuario"""
-        # Construir query dinámicamente solo con campos proporcionados
+    async def update_user_profile(
+        user_id: int,
+        user: UserUpdate,
+        expected_version: Optional[int] = None
+    ) -> UpdateUserResult:
+        """
+        Actualiza la información personal del usuario
+        
+        Si se indica expected_version la actualización es condicional en la
+        misma sentencia (sin bloquear la fila entre peticiones) y se informa
+        conflicto cuando otra escritura ya cambió la versión.
+        """
+        # Solo se actualizan los campos proporcionados
         update_data = user.model_dump(exclude_unset=True)
         
         if not update_data:
-            return UserController.get_user_by_id(user_id)
-        
-        set_clauses = ", ".join([f"{key} = %({key})s" for key in update_data.keys()])
-        
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    f"""
-                    UPDATE users 
-                    SET {set_clauses}
-                    WHERE id = %(id)s AND is_active = TRUE
-                    RETURNING id, email, full_name, phone, bio, location, 
-                              is_active, created_at, updated_at
-                    """,
-                    {**update_data, "id": user_id}
-                )
-                result = cur.fetchone()
-                conn.commit()
-                return result
+            current = await UserController.get_user_by_id(user_id)
+            if current and expected_version is not None and current["version"] != expected_version:
+                return UpdateUserResult(user=None, conflict=True)
+            return UpdateUserResult(user=current)
+        
+        conditional = expected_version is not None
+        statement = statements.update_profile_statement(frozenset(update_data), conditional)
+        params = {**update_data, "id": user_id}
+        if conditional:
+            params["expected_version"] = expected_version
+        
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statement, params)
+                result = await cur.fetchone()
+                conflict = False
+                if result is None and conditional:
+                    # Distinguir entre usuario inexistente y versión desactualizada
+                    await execute(cur, statements.GET_USER_VERSION, (user_id,))
+                    conflict = await cur.fetchone() is not None
+                await conn.commit()
+        
+        db.note_write(user_id)
+        # Refrescar la caché con el perfil actualizado
+        if result:
+            await profile_cache.set(result)
+        else:
+            await profile_cache.invalidate(user_id)
+        return UpdateUserResult(user=result, conflict=conflict)
     
     @staticmethod
-    def delete_user_account(user_id: int) -> Optional[dict]:
+    async def delete_user_account(user_id: int) -> Optional[dict]:
         """Elimina la cuenta del usuario de forma permanente"""
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                # Primero obtener información del usuario antes de eliminar
-                cur.execute(
-                    "SELECT id, email FROM users WHERE id = %s AND is_active = TRUE",
-                    (user_id,)
-                )
-                user = cur.fetchone()
-                
-                if not user:
-                    return None
-                
-                # Eliminar el usuario de forma permanente
-                cur.execute(
-                    "DELETE FROM users WHERE id = %s RETURNING id, email",
-                    (user_id,)
-                )
-                deleted_user = cur.fetchone()
-                conn.commit()
-                
-                return deleted_user
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.DELETE_USER, (user_id,))
+                deleted_user = await cur.fetchone()
+                await conn.commit()
+        
+        db.note_write(user_id)
+        await profile_cache.invalidate(user_id)
+        return deleted_user
     
     @staticmethod
-    def deactivate_user_account(user_id: int) -> Optional[dict]:
+    async def deactivate_user_account(user_id: int) -> Optional[dict]:
         """Desactiva la cuenta del usuario (soft delete - alternativa)"""
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE users 
-                    SET is_active = FALSE
-                    WHERE id = %s AND is_active = TRUE
-                    RETURNING id, email, is_active
-                    """,
-                    (user_id,)
-                )
-                result = cur.fetchone()
-                conn.commit()
-                return result
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.DEACTIVATE_USER, (user_id,))
+                result = await cur.fetchone()
+                await conn.commit()
+        
+        db.note_write(user_id)
+        await profile_cache.invalidate(user_id)
+        return result
+    
+    @staticmethod
+    async def list_users(limit: int, cursor: Optional[str] = None) -> dict:
+        """Obtiene una página de usuarios activos con paginación por cursor (keyset)"""
+        direction, key = NEXT, None
+        if cursor:
+            direction, created_at, user_id = decode_cursor(cursor)
+            key = (created_at, user_id)
+        
+        # Se pide una fila extra para saber si hay más páginas en esa dirección
+        params = {"limit": limit + 1}
+        if key is None:
+            statement = statements.LIST_USERS_FIRST
+        else:
+            statement = statements.LIST_USERS_NEXT if direction == NEXT else statements.LIST_USERS_PREV
+            params.update(created_at=key[0], id=key[1])
+        
+        async with db.get_read_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statement, params)
+                rows = await cur.fetchall()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if direction == PREV:
+            rows.reverse()
+        
+        next_cursor = prev_cursor = None
+        if rows:
+            # Hay página siguiente si sobraron filas al avanzar o si se retrocedió
+            if (direction == NEXT and has_more) or direction == PREV:
+                next_cursor = encode_cursor(rows[-1], NEXT)
+            # Hay página anterior si se partió de un cursor al avanzar o sobraron al retroceder
+            if (direction == NEXT and key is not None) or (direction == PREV and has_more):
+                prev_cursor = encode_cursor(rows[0], PREV)
+        
+        return {
+            "items": await UserController._with_recent_writes(rows),
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor
+        }
+    
+    @staticmethod
+    async def search_users(
+        q: str,
+        location: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> dict:
+        """
+        Busca usuarios activos por prefijo de nombre/email y texto completo de la biografía
+        
+        Se ordenan como máximo search_max_candidates coincidencias de cada tipo.
+        """
+        params = {
+            "q": q,
+            "prefix": like_prefix(q.strip()),
+            "max_candidates": settings.search_max_candidates,
+            "limit": limit + 1,
+            "offset": offset
+        }
+        statement = statements.SEARCH_USERS
+        if location:
+            statement = statements.SEARCH_USERS_IN_LOCATION
+            params["location"] = like_prefix(location.strip())
+        
+        async with db.get_read_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statement, params)
+                rows = await cur.fetchall()
+        
+        return {
+            "items": await UserController._with_recent_writes(rows[:limit]),
+            "limit": limit,
+            "offset": offset,
+            "has_more": len(rows) > limit
+        }
+    
+    @staticmethod
+    async def export_users(
+        columns: list[str],
+        updated_since: Optional[datetime] = None
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Recorre toda la tabla users con un cursor del servidor, en bloques
+        
+        La consulta (columnas variables) no pasa por execute(): un cursor con
+        nombre no admite prepared statements ni pipeline, así que tampoco lleva
+        el statement_timeout del plazo de la petición (la exportación no tiene
+        plazo por defecto; solo aplica el statement_timeout del servidor). El
+        DECLARE y cada lectura por bloques sí se miden con measured(), como
+        export_users y export_users_fetch.
+        """
+        query = sql.SQL("SELECT {columns} FROM users {where} ORDER BY id").format(
+            columns=sql.SQL(", ").join(sql.Identifier(col) for col in columns),
+            where=sql.SQL("WHERE updated_at >= %s" if updated_since else "")
+        )
+        params = (updated_since,) if updated_since else None
+        
+        async with db.get_read_connection() as conn:
+            # Cursor con nombre: las filas quedan en el servidor y se traen por bloques
+            async with conn.cursor(name="users_export") as cur:
+                cur.itersize = settings.export_chunk_size
+                with measured("export_users"):
+                    await cur.execute(query, params)
+                while True:
+                    with measured("export_users_fetch"):
+                        rows = await cur.fetchmany(settings.export_chunk_size)
+                    if not rows:
+                        break
+                    yield rows
     
     @staticmethod
-    def get_all_users() -> list[dict]:
-        """Obtiene todos los usuarios activos"""
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT id, email, full_name, phone, bio, location, 
-                           is_active, created_at, updated_at 
-                    FROM users 
-                    WHERE is_active = TRUE
-                    ORDER BY created_at DESC
-                    """
-                )
-                return cur.fetchall()
\ No newline at end of file
+    async def bulk_create_users(users: list[UserCreate]) -> list[Optional[int]]:
+        """
+        Crea muchos usuarios en una sola transacción usando COPY a una tabla temporal
+        
+        Devuelve, en el mismo orden, el ID creado o None si el email ya existía
+        (en la base de datos o repetido dentro del mismo lote).
+        """
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                # La tabla temporal vive en la conexión del pool y se vacía en cada commit
+                await cur.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS users_import_staging (
+                        ord INTEGER NOT NULL,
+                        email VARCHAR(255) NOT NULL,
+                        full_name VARCHAR(200) NOT NULL,
+                        phone VARCHAR(20),
+                        bio TEXT,
+                        location VARCHAR(100)
+                    ) ON COMMIT DELETE ROWS
+                """)
+                
+                async with cur.copy(
+                    "COPY users_import_staging (ord, email, full_name, phone, bio, location) FROM STDIN"
+                ) as copy:
+                    for position, user in enumerate(users):
+                        await copy.write_row(
+                            (position, user.email, user.full_name, user.phone, user.bio, user.location)
+                        )
+                
+                await execute(cur, statements.BULK_INSERT_FROM_STAGING)
+                created = {row["email"]: row["id"] for row in await cur.fetchall()}
+                await conn.commit()
+        
+        result = []
+        for user in users:
+            # pop: una segunda aparición del mismo email queda como duplicada
+            result.append(created.pop(user.email, None))
+        return result
@@ -1,55 +1,300 @@
-import psycopg
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Iterable, Optional
 from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
 from app.config import settings
+from app.deadlines import DeadlineExceeded, remaining
+from app.metrics import db_reads_total, db_replica_ejections_total
+from app.migrations import LATEST_VERSION, get_schema_version, migrate
+
+logger = logging.getLogger("app.database")
+
+def _create_pool(conninfo: str, name: str) -> AsyncConnectionPool:
+    """Pool asíncrono con la configuración común (se crea cerrado)"""
+    min_size, max_size = settings.pool_sizes()
+    return AsyncConnectionPool(
+        conninfo,
+        min_size=min_size,
+        max_size=max_size,
+        timeout=settings.db_pool_timeout,
+        max_idle=settings.db_pool_max_idle,
+        max_lifetime=settings.db_pool_max_lifetime,
+        check=AsyncConnectionPool.check_connection if settings.db_pool_check else None,
+        kwargs={
+            "row_factory": dict_row,
+            "prepare_threshold": settings.db_prepare_threshold
+        },
+        name=name,
+        open=False
+    )
+
+class Replica:
+    """Pool de una réplica de lectura y su estado de salud"""
+    
+    def __init__(self, name: str, conninfo: str):
+        self.name = name
+        self.pool = _create_pool(conninfo, name)
+        self.healthy = True
+        self.failures = 0    # fallos seguidos
+        self.in_flight = 0   # lecturas en curso (para least_busy)
+        self.lag: Optional[float] = None
+    
+    def record_success(self):
+        self.failures = 0
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.healthy and self.failures >= settings.replica_max_failures:
+            self.eject("fallos de conexión")
+    
+    def eject(self, reason: str):
+        self.healthy = False
+        db_replica_ejections_total.inc(replica=self.name)
+        logger.warning("Réplica %s expulsada: %s", self.name, reason)
 
 class Database:
     def __init__(self):
         self.connection_string = settings.database_url
+        # Los pools se crean cerrados; se abren en el lifespan de la aplicación
+        self.pool = _create_pool(self.connection_string, "users")
+        self.replicas = [
+            Replica(f"replica{index}", url) for index, url in enumerate(settings.replica_urls, start=1)
+        ]
+        self._next_replica = 0
+        # ID de usuario -> instante de su última escritura, de la más antigua a la más reciente
+        self._recent_writes: OrderedDict[int, float] = OrderedDict()
+        self._monitor: Optional[asyncio.Task] = None
+    
+    async def open(self):
+        """Abre el pool y espera a que tenga min_size conexiones listas"""
+        await self.pool.open(wait=True, timeout=settings.db_pool_timeout)
+        # Una réplica caída no impide arrancar: el monitor la readmite cuando responda
+        for replica in self.replicas:
+            await replica.pool.open(wait=False)
+        if self.replicas:
+            self._monitor = asyncio.create_task(self._monitor_replicas())
+    
+    async def close(self):
+        """Cierra los pools y todas sus conexiones"""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        for replica in self.replicas:
+            await replica.pool.close()
+        await self.pool.close()
+    
+    @asynccontextmanager
+    async def get_connection(self):
+        """
+        Obtiene una conexión asíncrona del pool (se devuelve al salir del bloque async with)
+        
+        Dentro de una petición con plazo, la espera por la conexión se acota
+        al tiempo restante (el statement_timeout lo añade execute() a cada
+        sentencia).
+        """
+        conn = await self._getconn(self.pool, settings.db_pool_timeout, remaining())
+        try:
+            async with conn:
+                yield conn
+        finally:
+            await self.pool.putconn(conn)
+    
+    async def _getconn(self, pool: AsyncConnectionPool, timeout: float, time_left: Optional[float]):
+        """Pide una conexión al pool sin esperar más allá del plazo de la petición"""
+        if time_left is None or time_left > timeout:
+            return await pool.getconn(timeout=timeout)
+        try:
+            return await pool.getconn(timeout=time_left)
+        except PoolTimeout as e:
+            raise DeadlineExceeded() from e
+    
+    @asynccontextmanager
+    async def get_read_connection(self, *user_ids: int):
+        """
+        Obtiene una conexión para consultas de solo lectura
+        
+        Va a una réplica sana (round_robin o least_busy) salvo que no haya
+        ninguna, que no entregue conexión a tiempo, o que alguno de user_ids
+        se haya escrito dentro de read_your_writes_window; en esos casos se
+        usa el primario. Las consultas que no conocen los IDs de antemano
+        (listados, búsquedas) corrigen después sus filas con recently_written.
+        """
+        replica = None if self.recently_written(user_ids) else self._choose_replica()
+        time_left = remaining()
+        conn = None
+        if replica is not None:
+            try:
+                conn = await self._getconn(replica.pool, settings.replica_connect_timeout, time_left)
+            except DeadlineExceeded:
+                raise
+            except Exception:
+                replica.record_failure()
+        
+        if conn is None:
+            db_reads_total.inc(target="primary")
+            async with self.get_connection() as conn:
+                yield conn
+            return
+        
+        db_reads_total.inc(target=replica.name)
+        replica.in_flight += 1
+        try:
+            async with conn:
+                yield conn
+            replica.record_success()
+        except Exception:
+            # Solo una conexión rota cuenta contra la salud de la réplica: un
+            # statement_timeout o un error de la consulta no dicen nada de ella
+            if conn.broken:
+                replica.record_failure()
+            raise
+        finally:
+            replica.in_flight -= 1
+            await replica.pool.putconn(conn)
+    
+    def note_write(self, user_id: int):
+        """
+        Registra una escritura de user_id (propia o recibida por el feed de cambios)
+        
+        Con réplicas, durante read_your_writes_window sus lecturas van al
+        primario y durante replica_lag_window no se cachea lo leído de réplica.
+        """
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        self._recent_writes[user_id] = now
+        self._recent_writes.move_to_end(user_id)
+        # Están ordenadas por antigüedad: se descartan por el principio
+        retention = max(settings.read_your_writes_window, settings.replica_lag_window)
+        while self._recent_writes:
+            oldest_id, written_at = next(iter(self._recent_writes.items()))
+            if now - written_at < retention and len(self._recent_writes) <= settings.recent_writes_max_size:
+                break
+            del self._recent_writes[oldest_id]
+    
+    def _written_within(self, user_id: int, window: float) -> bool:
+        written_at = self._recent_writes.get(user_id)
+        return written_at is not None and time.monotonic() - written_at < window
+    
+    def recently_written(self, user_ids: Iterable[int]) -> set[int]:
+        """IDs que se escribieron dentro de read_your_writes_window (deben leerse del primario)"""
+        if not self._recent_writes or settings.read_your_writes_window <= 0:
+            return set()
+        return {
+            user_id for user_id in user_ids
+            if self._written_within(user_id, settings.read_your_writes_window)
+        }
+    
+    def may_be_stale(self, user_id: int) -> bool:
+        """
+        Indica si una lectura de user_id pudo servirla una réplica sin su última escritura
+        
+        Es el caso entre el fin de read_your_writes_window (la lectura ya va
+        a réplica) y replica_lag_window; lo leído entonces no se cachea.
+        """
+        if not self._recent_writes or self.recently_written((user_id,)):
+            return False
+        return self._written_within(user_id, settings.replica_lag_window)
+    
+    def _choose_replica(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if settings.replica_strategy == "least_busy":
+            return min(healthy, key=lambda replica: (replica.in_flight, replica.pool.get_stats().get("requests_waiting", 0)))
+        self._next_replica = (self._next_replica + 1) % len(healthy)
+        return healthy[self._next_replica]
+    
+    async def _check_replica(self, replica: Replica):
+        """Consulta la réplica y su retraso de replicación; la expulsa o readmite según el resultado"""
+        try:
+            async with replica.pool.connection(timeout=settings.readiness_timeout) as conn:
+                cur = await conn.execute(
+                    "SELECT CASE WHEN pg_is_in_recovery() "
+                    "THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END AS lag"
+                )
+                row = await cur.fetchone()
+        except Exception:
+            replica.record_failure()
+            return
+        
+        replica.lag = float(row["lag"]) if row["lag"] is not None else None
+        if settings.replica_max_lag is not None and replica.lag is not None and replica.lag > settings.replica_max_lag:
+            if replica.healthy:
+                replica.eject(f"retraso de {replica.lag:.1f}s")
+            return
+        replica.record_success()
+        if not replica.healthy:
+            replica.healthy = True
+            logger.info("Réplica %s readmitida", replica.name)
+    
+    async def _monitor_replicas(self):
+        while True:
+            await asyncio.gather(*(self._check_replica(replica) for replica in self.replicas))
+            await asyncio.sleep(settings.replica_check_interval)
+    
+    async def ping(self) -> bool:
+        """Comprueba que el pool entrega una conexión utilizable"""
+        try:
+            async with self.pool.connection(timeout=settings.readiness_timeout) as conn:
+                await conn.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+    
+    def get_pool_stats(self) -> dict:
+        """Estadísticas del pool para dimensionarlo"""
+        stats = self.pool.get_stats()
+        return {
+            "pool_min": stats.get("pool_min", 0),
+            "pool_max": stats.get("pool_max", 0),
+            "pool_size": stats.get("pool_size", 0),
+            "pool_available": stats.get("pool_available", 0),
+            "in_use": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+            "requests_waiting": stats.get("requests_waiting", 0),
+            "requests_num": stats.get("requests_num", 0),
+            "requests_wait_ms": stats.get("requests_wait_ms", 0),
+            "requests_errors": stats.get("requests_errors", 0),
+            "connections_num": stats.get("connections_num", 0),
+            "connections_lost": stats.get("connections_lost", 0),
+        }
+    
+    def get_replica_stats(self) -> list[dict]:
+        """Estado de cada réplica de lectura"""
+        return [
+            {
+                "name": replica.name,
+                "healthy": replica.healthy,
+                "failures": replica.failures,
+                "in_flight": replica.in_flight,
+                "lag_seconds": replica.lag,
+                "pool_size": replica.pool.get_stats().get("pool_size", 0),
+            }
+            for replica in self.replicas
+        ]
     
-    def get_connection(self):
-        """Obtiene una conexión a la base de datos"""
-        return psycopg.connect(
-            self.connection_string,
-            row_factory=dict_row
-        )
-    
-    def init_db(self):
-        """Inicializa la base de datos creando las tablas necesarias"""
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id SERIAL PRIMARY KEY,
-                        email VARCHAR(255) UNIQUE NOT NULL,
-                        full_name VARCHAR(200) NOT NULL,
-                        phone VARCHAR(20),
-                        bio TEXT,
-                        location VARCHAR(100),
-                        is_active BOOLEAN DEFAULT TRUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Trigger para actualizar updated_at automáticamente
-                cur.execute("""
-                    CREATE OR REPLACE FUNCTION update_updated_at_column()
-                    RETURNS TRIGGER AS $$
-                    BEGIN
-                        NEW.updated_at = CURRENT_TIMESTAMP;
-                        RETURN NEW;
-                    END;
-                    $$ language 'plpgsql';
-                """)
-                
-                cur.execute("""
-                    DROP TRIGGER IF EXISTS update_users_updated_at ON users;
-                    CREATE TRIGGER update_users_updated_at
-                    BEFORE UPDATE ON users
-                    FOR EACH ROW
-                    EXECUTE FUNCTION update_updated_at_column();
-                """)
-                
-                conn.commit()
+    async def ensure_schema(self):
+        """
+        Comprueba la versión del esquema al arrancar
+        
+        Los workers no ejecutan DDL: si faltan migraciones el arranque falla
+        indicando cómo migrar. auto_migrate (desactivado por defecto) permite
+        aplicarlas aquí en desarrollo.
+        """
+        async with self.get_connection() as conn:
+            version = await get_schema_version(conn)
+        
+        if version >= LATEST_VERSION:
+            return
+        if not settings.auto_migrate:
+            raise RuntimeError(
+                f"Esquema en la versión {version}, se requiere la {LATEST_VERSION}. "
+                "Ejecuta: python -m app.migrations"
+            )
+        await migrate(self.connection_string)
 
 db = Database()
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""
+Plazos por petición
+
+El middleware fija en request_deadline el instante (time.monotonic) en que
+vence la petición; Database lo usa como tiempo máximo de espera por una
+conexión del pool y statements.execute() lo envía como statement_timeout
+local a la transacción junto a cada sentencia.
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """La petición agotó su plazo antes de terminar el trabajo en la base de datos"""
+
+def remaining() -> Optional[float]:
+    """Segundos que le quedan a la petición actual (None si no tiene plazo)"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded()
+    return left
@@ -0,0 +1,339 @@
+"""
+Trabajos por lotes de desactivación y purga de usuarios
+
+La purga mueve los usuarios a users_archive (particionada por mes) con
+DELETE ... RETURNING en lotes acotados, así users y sus índices solo guardan
+cuentas vivas. Cada lote es una transacción que toma sus filas con
+FOR UPDATE SKIP LOCKED (nunca espera a las peticiones en curso) y registra el
+progreso en batch_jobs, visible desde cualquier worker y reanudable desde el
+último ID. Una fila saltada por estar bloqueada no deja avanzar last_id más
+allá de ella: los lotes siguientes la vuelven a intentar (las ya procesadas
+dejan de cumplir el filtro) y el trabajo solo termina como completed cuando
+no queda ninguna. Entre lotes el trabajo hace una pausa y cede mientras haya
+peticiones esperando conexión del pool.
+
+El progreso de cada lote actualiza también updated_at, que sirve de latido:
+si el proceso que ejecutaba un trabajo muere, pasados job_stale_after
+segundos sin progreso el trabajo se puede reanudar (o cancelar) desde otro.
+
+Uso:
+    python -m app.jobs purge --inactive --updated-before 2025-01-01
+    python -m app.jobs deactivate --ids 1,2,3
+    python -m app.jobs status [ID]
+    python -m app.jobs resume ID
+    python -m app.jobs cancel ID
+"""
+import argparse
+import asyncio
+import contextvars
+import logging
+from datetime import datetime
+from typing import Callable, Optional
+from psycopg import sql
+from psycopg.types.json import Jsonb
+from pydantic import ValidationError
+from app.cache import profile_cache
+from app.config import settings
+from app.controllers import statements
+from app.controllers.statements import execute
+from app.database import db
+from app.metrics import batch_job_rows_total, batch_job_throttle_seconds_total
+from app.models.job import JobCreate
+
+logger = logging.getLogger(__name__)
+
+# Columnas que se conservan en users_archive
+ARCHIVE_COLUMNS = (
+    "id", "email", "full_name", "phone", "bio", "location",
+    "is_active", "created_at", "updated_at", "version"
+)
+
+def batch_query(action: str, params: dict) -> sql.Composed:
+    """
+    Sentencia de un lote: selecciona por keyset sobre id y desactiva o archiva en una sola ida
+    
+    Devuelve una fila con los IDs procesados (ids), cuántos cumplían el filtro
+    (candidates) y el menor de los que se saltaron por estar bloqueados
+    (first_skipped).
+    """
+    conditions = [sql.SQL("id > %(after)s")]
+    if params.get("ids"):
+        conditions.append(sql.SQL("id = ANY(%(ids)s::int[])"))
+    if params.get("inactive_only"):
+        conditions.append(sql.SQL("is_active = FALSE"))
+    if params.get("updated_before"):
+        conditions.append(sql.SQL("updated_at < %(updated_before)s"))
+    if action == "deactivate":
+        conditions.append(sql.SQL("is_active = TRUE"))
+    
+    # candidates se lee sin bloquear; batch bloquea las que estén libres
+    batch = sql.SQL("""
+        WITH candidates AS (
+            SELECT id FROM users
+            WHERE {conditions}
+            ORDER BY id
+            LIMIT %(limit)s
+        ), batch AS (
+            SELECT id FROM users
+            WHERE id IN (SELECT id FROM candidates) AND {conditions}
+            FOR UPDATE SKIP LOCKED
+        )
+    """).format(conditions=sql.SQL(" AND ").join(conditions))
+    summary = sql.SQL("""
+        SELECT
+            coalesce((SELECT array_agg(id) FROM processed), '{}') AS ids,
+            (SELECT count(*) FROM candidates) AS candidates,
+            (SELECT min(id) FROM candidates WHERE id NOT IN (SELECT id FROM batch)) AS first_skipped
+    """)
+    
+    if action == "deactivate":
+        return batch + sql.SQL("""
+            , processed AS (
+                UPDATE users SET is_active = FALSE
+                FROM batch WHERE users.id = batch.id
+                RETURNING users.id
+            )
+        """) + summary
+    columns = sql.SQL(", ").join(sql.Identifier(col) for col in ARCHIVE_COLUMNS)
+    return batch + sql.SQL("""
+        , purged AS (
+            DELETE FROM users USING batch WHERE users.id = batch.id
+            RETURNING {returning}
+        ), processed AS (
+            INSERT INTO users_archive ({columns}, job_id)
+            SELECT {columns}, %(job_id)s FROM purged
+            RETURNING id
+        )
+    """).format(
+        columns=columns,
+        returning=sql.SQL(", ").join(sql.Identifier("users", col) for col in ARCHIVE_COLUMNS)
+    ) + summary
+
+class BatchJobs:
+    """Crea, ejecuta y consulta trabajos; el estado vive en batch_jobs"""
+    
+    def __init__(self):
+        self._tasks: dict[int, asyncio.Task] = {}
+    
+    async def create(self, job: JobCreate) -> dict:
+        params = job.model_dump(mode="json", exclude={"action"}, exclude_none=True)
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.CREATE_JOB, {"action": job.action, "params": Jsonb(params)})
+                created = await cur.fetchone()
+                await conn.commit()
+        return created
+    
+    async def get(self, job_id: int) -> Optional[dict]:
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.GET_JOB, (job_id,))
+                return await cur.fetchone()
+    
+    async def list(self, limit: int = 20) -> list[dict]:
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.LIST_JOBS, (limit,))
+                return await cur.fetchall()
+    
+    async def cancel(self, job_id: int) -> Optional[dict]:
+        """Pide la cancelación; el trabajo en curso se detiene al terminar su lote actual"""
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.CANCEL_JOB, {"id": job_id, "stale_after": settings.job_stale_after})
+                job = await cur.fetchone()
+                await conn.commit()
+        return job
+    
+    async def claim(self, job_id: int) -> Optional[dict]:
+        """
+        Toma el trabajo para ejecutarlo; None si no existe o no se puede tomar
+        
+        Se pueden tomar los pendientes, cancelados y fallidos, y los que siguen
+        running o cancelling sin progreso desde hace job_stale_after segundos.
+        """
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, statements.CLAIM_JOB, {"id": job_id, "stale_after": settings.job_stale_after})
+                job = await cur.fetchone()
+                await conn.commit()
+        return job
+    
+    def start(self, job: dict):
+        """Ejecuta en segundo plano en este worker un trabajo ya tomado con claim()"""
+        job_id = job["id"]
+        # Contexto vacío: el trabajo no hereda el plazo de la petición que lo creó
+        task = asyncio.create_task(self._process(job), context=contextvars.Context())
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+    
+    async def shutdown(self):
+        """Interrumpe los trabajos de este worker (quedan como cancelados y se pueden reanudar)"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+    
+    async def run(self, job_id: int, on_progress: Optional[Callable[[dict], None]] = None) -> Optional[dict]:
+        """Ejecuta el trabajo hasta terminarlo o cancelarlo; None si no estaba disponible"""
+        job = await self.claim(job_id)
+        if job is None:
+            return None
+        return await self._process(job, on_progress)
+    
+    async def _process(self, job: dict, on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+        job_id = job["id"]
+        params = job["params"]
+        batch_size = params.get("batch_size") or settings.job_batch_size
+        query = batch_query(job["action"], params)
+        query_params = {
+            "ids": params.get("ids"),
+            "updated_before": datetime.fromisoformat(params["updated_before"]) if params.get("updated_before") else None,
+            "limit": batch_size,
+            "job_id": job_id,
+        }
+        
+        status, error = "completed", None
+        stalled = 0
+        try:
+            while True:
+                count, candidates, skipped, state = await self._run_batch(job, query, query_params)
+                if on_progress is not None:
+                    on_progress(job)
+                if state == "cancelling":
+                    status = "cancelled"
+                    break
+                if candidates < batch_size and not skipped:
+                    break
+                # Lotes seguidos sin avanzar: todo lo pendiente está bloqueado
+                stalled = stalled + 1 if count == 0 else 0
+                if stalled > settings.job_locked_retries:
+                    raise RuntimeError(f"Usuarios bloqueados por otras transacciones desde el ID {job['last_id'] + 1}")
+                await self._throttle()
+        except asyncio.CancelledError:
+            status, error = "cancelled", "Interrumpido al detener el proceso"
+            raise
+        except Exception as e:
+            logger.exception("Trabajo %s fallido", job_id)
+            status, error = "failed", str(e)
+        finally:
+            async with db.get_connection() as conn:
+                async with conn.cursor() as cur:
+                    await execute(cur, statements.FINISH_JOB, {"id": job_id, "status": status, "error": error})
+                    job = await cur.fetchone()
+                    await conn.commit()
+        return job
+    
+    async def _run_batch(self, job: dict, query: sql.Composed, query_params: dict) -> tuple[int, int, bool, str]:
+        """
+        Procesa un lote y registra su progreso en la misma transacción
+        
+        Devuelve las filas procesadas, las que cumplían el filtro, si alguna
+        se saltó por estar bloqueada y el estado del trabajo.
+        """
+        async with db.get_connection() as conn:
+            async with conn.cursor() as cur:
+                if job["action"] == "purge":
+                    await execute(cur, statements.ENSURE_ARCHIVE_PARTITION)
+                await cur.execute(query, {**query_params, "after": job["last_id"]})
+                result = await cur.fetchone()
+                ids, first_skipped = result["ids"], result["first_skipped"]
+                # last_id no pasa de la primera fila saltada: se reintenta en el siguiente lote
+                if first_skipped is not None:
+                    job["last_id"] = first_skipped - 1
+                elif ids:
+                    job["last_id"] = max(ids)
+                await execute(cur, statements.RECORD_JOB_PROGRESS, {
+                    "id": job["id"], "count": len(ids), "last_id": job["last_id"]
+                })
+                state = (await cur.fetchone())["status"]
+                await conn.commit()
+        
+        job["processed"] += len(ids)
+        job["batches"] += 1
+        batch_job_rows_total.inc(len(ids), action=job["action"])
+        for user_id in ids:
+            await profile_cache.invalidate(user_id)
+        return len(ids), result["candidates"], first_skipped is not None, state
+    
+    async def _throttle(self):
+        """Pausa entre lotes, alargada mientras el tráfico en vivo espera conexiones"""
+        await asyncio.sleep(settings.job_batch_pause)
+        waited = 0.0
+        while db.get_pool_stats()["requests_waiting"] > 0 and waited < settings.job_max_backoff:
+            await asyncio.sleep(settings.job_backoff_step)
+            waited += settings.job_backoff_step
+        if waited:
+            batch_job_throttle_seconds_total.inc(waited)
+
+batch_jobs = BatchJobs()
+
+def _format_job(job: dict) -> str:
+    return (
+        f"#{job['id']} {job['action']} {job['status']}: {job['processed']} usuarios, "
+        f"{job['batches']} lotes, último ID {job['last_id']}"
+        + (f" ({job['error']})" if job.get("error") else "")
+    )
+
+async def _main(args) -> int:
+    await db.open()
+    try:
+        if args.command in ("deactivate", "purge"):
+            try:
+                request = JobCreate(
+                    action=args.command,
+                    ids=args.ids,
+                    inactive_only=args.inactive,
+                    updated_before=args.updated_before,
+                    batch_size=args.batch_size
+                )
+            except ValidationError as e:
+                print(f"❌ {e.errors()[0]['msg']}")
+                return 2
+            job = await batch_jobs.create(request)
+            job_id = job["id"]
+        elif args.command == "resume":
+            job_id = args.job_id
+        elif args.command == "cancel":
+            job = await batch_jobs.cancel(args.job_id)
+            print(_format_job(job) if job else f"❌ El trabajo {args.job_id} no está pendiente ni en curso")
+            return 0 if job else 1
+        else:
+            jobs = [await batch_jobs.get(args.job_id)] if args.job_id else await batch_jobs.list()
+            for job in jobs:
+                print(_format_job(job) if job else f"❌ El trabajo {args.job_id} no existe")
+            return 0
+        
+        job = await batch_jobs.run(job_id, on_progress=lambda progress: print(_format_job(progress)))
+        if job is None:
+            print(f"❌ El trabajo {job_id} no existe, está en curso o ya terminó")
+            return 1
+        print(f"✅ {_format_job(job)}")
+        return 0 if job["status"] == "completed" else 1
+    finally:
+        await db.close()
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.jobs", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    for action, help_text in (("deactivate", "Desactivar usuarios en lotes"),
+                              ("purge", "Archivar y eliminar usuarios en lotes")):
+        action_parser = commands.add_parser(action, help=help_text)
+        action_parser.add_argument("--ids", type=lambda value: [int(part) for part in value.split(",") if part])
+        if action == "purge":
+            action_parser.add_argument("--inactive", action="store_true", help="Solo usuarios ya desactivados")
+        else:
+            action_parser.set_defaults(inactive=False)
+        action_parser.add_argument("--updated-before", type=datetime.fromisoformat)
+        action_parser.add_argument("--batch-size", type=int)
+    status_parser = commands.add_parser("status", help="Progreso de los trabajos")
+    status_parser.add_argument("job_id", type=int, nargs="?")
+    for name, help_text in (("resume", "Reanudar un trabajo cancelado, fallido o huérfano"),
+                            ("cancel", "Cancelar un trabajo pendiente o en curso")):
+        commands.add_parser(name, help=help_text).add_argument("job_id", type=int)
+    
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
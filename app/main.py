@@ -1,23 +1,39 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from contextlib import asynccontextmanager
-from pathlib import Path
 from app.database import db
-# from app.views.user_view import router as user_api_router
+from app.cache import profile_cache
+from app.change_feed import change_feed
+from app.metrics import REGISTRY, CallbackMetric, db_statement_timeouts_total
+from app.deadlines import DeadlineExceeded
+from app.middleware import AdmissionControlMiddleware, CompressionMiddleware, DeadlineMiddleware, MetricsMiddleware
+from app.templating import precompile_templates
+from app.static_assets import FingerprintedStaticFiles, STATIC_DIR, static_manifest
+from app.utils.fast_json import FAST_JSON
+from fastapi.responses import JSONResponse, ORJSONResponse
+from psycopg.errors import QueryCanceled
+from app.views.user_view import router as user_api_router
 from app.views.user_web_view import router as user_web_router  # ← NUEVO
+from app.views.admin_view import router as admin_router
+from app.jobs import batch_jobs
 from app.config import settings
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Inicializar base de datos
-    db.init_db()
+    # Startup: Abrir el pool de conexiones y verificar la versión del esquema
+    await db.open()
+    await db.ensure_schema()
+    await change_feed.start()
     print("✅ Base de datos inicializada")
+    print(f"🗂️ {static_manifest.build()} archivos estáticos con huella")
+    print(f"📄 {precompile_templates()} plantillas precompiladas")
     print(f"🚀 API ejecutándose en http://{settings.host}:{settings.port}")
     print(f"🌐 Frontend disponible en http://{settings.host}:{settings.port}/web")  # ← NUEVO
     yield
     # Shutdown
+    await batch_jobs.shutdown()
+    await change_feed.stop()
+    await db.close()
     print("👋 Cerrando aplicación")
 
 app = FastAPI(
@@ -25,6 +41,7 @@ app = FastAPI(
     description="API REST con interfaz web para gestión de perfiles",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse if FAST_JSON else JSONResponse,
     docs_url="/docs",
     redoc_url="/redoc"
 )
@@ -38,13 +55,73 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Montar archivos estáticos
-BASE_DIR = Path(__file__).resolve().parent.parent
-app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
+# Compresión gzip de HTML y JSON por encima del umbral
+app.add_middleware(CompressionMiddleware, minimum_size=settings.gzip_min_size, compresslevel=settings.gzip_level)
+
+# Control de admisión: limita la concurrencia por grupo de rutas y rechaza con 503 al saturarse
+app.add_middleware(AdmissionControlMiddleware)
+
+# Plazo por petición: statement_timeout en PostgreSQL y cancelación al vencer o desconectarse el cliente
+app.add_middleware(DeadlineMiddleware)
+
+# Métricas de latencia y estado por ruta
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(QueryCanceled)
+async def statement_timeout_handler(request: Request, exc: QueryCanceled):
+    """Una consulta superó el statement_timeout derivado del plazo de la petición"""
+    db_statement_timeouts_total.inc()
+    return JSONResponse({"detail": "La consulta superó el tiempo máximo de la petición"}, status_code=504)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    """La petición agotó su plazo esperando una conexión"""
+    return JSONResponse({"detail": "La petición superó su tiempo máximo"}, status_code=504)
+
+# Métricas del pool y de la caché, leídas en cada consulta a /metrics
+for name, documentation, stat, kind in (
+    ("db_pool_size", "Conexiones abiertas en el pool", "pool_size", "gauge"),
+    ("db_pool_in_use", "Conexiones del pool en uso", "in_use", "gauge"),
+    ("db_pool_requests_waiting", "Peticiones esperando una conexión", "requests_waiting", "gauge"),
+    ("db_pool_connections_opened_total", "Conexiones abiertas contra PostgreSQL", "connections_num", "counter"),
+    ("db_pool_requests_errors_total", "Peticiones al pool que fallaron", "requests_errors", "counter"),
+):
+    REGISTRY.register(CallbackMetric(
+        name, documentation, lambda stat=stat: db.get_pool_stats()[stat], kind
+    ))
+REGISTRY.register(CallbackMetric(
+    "db_pool_wait_seconds_total", "Tiempo total esperando conexiones del pool",
+    lambda: db.get_pool_stats()["requests_wait_ms"] / 1000, "counter"
+))
+REGISTRY.register(CallbackMetric(
+    "db_replicas_healthy", "Réplicas de lectura admitidas",
+    lambda: sum(replica.healthy for replica in db.replicas)
+))
+REGISTRY.register(CallbackMetric(
+    "change_feed_subscribers", "Streams de cambios abiertos",
+    lambda: len(change_feed.subscribers)
+))
+REGISTRY.register(CallbackMetric(
+    "change_feed_lag_seconds", "Antigüedad del cambio más antiguo retenido por una transacción abierta",
+    change_feed.lag
+))
+for stat in ("hits", "misses", "evictions"):
+    REGISTRY.register(CallbackMetric(
+        f"profile_cache_{stat}_total", f"Caché de perfiles: {stat}",
+        lambda stat=stat: profile_cache.stats()[stat], "counter"
+    ))
+
+# Montar archivos estáticos (nombres con hash, caché inmutable y .gz precomprimidos)
+app.mount(
+    "/static",
+    FingerprintedStaticFiles(directory=str(STATIC_DIR), manifest=static_manifest),
+    name="static"
+)
 
 # Incluir rutas
-# app.include_router(user_router)
+app.include_router(user_api_router)
 app.include_router(user_web_router)
+app.include_router(admin_router)
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -55,9 +132,16 @@ async def root():
         "web_interface": "/web",  # ← NUEVO
         "endpoints": {
             "api_create_user": "POST /api/users/",
+            "api_list_users": "GET /api/users/?limit=&cursor=",
+            "api_search_users": "GET /api/users/search?q=&location=",
+            "api_export_users": "GET /api/users/export?format=ndjson|csv",
+            "api_bulk_import": "POST /api/users/bulk",
             "api_get_profile": "GET /api/users/{user_id}/profile",
+            "api_batch_get_profiles": "POST /api/users/batch-get",
             "api_update_profile": "PUT /api/users/{user_id}/profile",
             "api_delete_account": "DELETE /api/users/{user_id}/account",
+            "api_changes_stream": "GET /api/users/changes",
+            "admin_jobs": "POST /api/admin/jobs",
             "web_interface": "GET /web",  # ← NUEVO
         }
     }
@@ -66,14 +150,37 @@ async def root():
 async def health_check():
     return {
         "status": "healthy",
-        "database": "connected"
+        "database": "connected",
+        "pool": db.get_pool_stats(),
+        "replicas": db.get_replica_stats(),
+        "cache": profile_cache.stats(),
+        "change_feed": change_feed.stats()
     }
 
+@app.get("/live", tags=["Health"])
+async def liveness():
+    """El proceso está vivo (no consulta la base de datos)"""
+    return {"status": "alive"}
+
+@app.get("/ready", tags=["Health"])
+async def readiness(response: Response):
+    """El worker puede atender tráfico: el pool entrega una conexión que responde"""
+    if not await db.ping():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "not_ready", "database": "unavailable"}
+    return {"status": "ready", "database": "connected"}
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
+    # Servidor de desarrollo con recarga; en producción usar python -m app.server
     import uvicorn
     uvicorn.run(
         "app.main:app",
         host=settings.host,
         port=settings.port,
         reload=True
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,193 @@
+"""
+Métricas en formato de texto de Prometheus
+
+Implementación mínima en proceso (contadores, gauges e histogramas con
+etiquetas). Cada worker expone sus propias métricas en /metrics.
+"""
+import math
+from typing import Callable
+
+# Buckets de latencia en segundos (de 1 ms a 10 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Metric:
+    type = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+    
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+    
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+class Counter(Metric):
+    type = "counter"
+    
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple, float] = {}
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+    
+    def samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self.values.items()
+        ]
+
+class Gauge(Counter):
+    type = "gauge"
+    
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+    
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class CallbackMetric(Metric):
+    """Métrica cuyo valor se lee al momento de exponerla (p. ej. estadísticas del pool)"""
+    
+    def __init__(self, name, documentation, callback: Callable[[], float], type: str = "gauge"):
+        super().__init__(name, documentation)
+        self.callback = callback
+        self.type = type
+    
+    def samples(self):
+        return [f"{self.name} {_format_value(self.callback())}"]
+
+class Histogram(Metric):
+    type = "histogram"
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.values: dict[tuple, tuple[list[int], list[float]]] = {}
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts, total = self.values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        total[0] += value
+    
+    def samples(self):
+        lines = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+    
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+    
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self.metrics.values())
+
+REGISTRY = Registry()
+
+# Peticiones HTTP
+http_requests_total = REGISTRY.register(Counter(
+    "http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status")
+))
+http_request_duration_seconds = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP", ("method", "route")
+))
+http_requests_in_flight = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "Peticiones HTTP en curso"
+))
+http_request_timeouts_total = REGISTRY.register(Counter(
+    "http_request_timeouts_total", "Peticiones canceladas por agotar su plazo", ("route",)
+))
+http_client_disconnects_total = REGISTRY.register(Counter(
+    "http_client_disconnects_total", "Peticiones canceladas porque el cliente se desconectó", ("route",)
+))
+
+# Control de admisión
+admission_in_flight = REGISTRY.register(Gauge(
+    "admission_in_flight", "Peticiones admitidas en curso por grupo", ("group",)
+))
+admission_queue_depth = REGISTRY.register(Gauge(
+    "admission_queue_depth", "Peticiones esperando turno por grupo", ("group",)
+))
+admission_queue_wait_seconds = REGISTRY.register(Histogram(
+    "admission_queue_wait_seconds", "Tiempo en cola antes de ser admitida", ("group",)
+))
+admission_rejections_total = REGISTRY.register(Counter(
+    "admission_rejections_total", "Peticiones rechazadas por grupo y motivo", ("group", "reason")
+))
+
+# Consultas a la base de datos
+db_query_duration_seconds = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Duración de las consultas por sentencia", ("statement",)
+))
+db_query_errors_total = REGISTRY.register(Counter(
+    "db_query_errors_total", "Consultas que terminaron en error", ("statement",)
+))
+db_statement_timeouts_total = REGISTRY.register(Counter(
+    "db_statement_timeouts_total", "Consultas canceladas por statement_timeout"
+))
+db_slow_queries_total = REGISTRY.register(Counter(
+    "db_slow_queries_total", "Consultas que superaron slow_query_ms", ("statement",)
+))
+db_reads_total = REGISTRY.register(Counter(
+    "db_reads_total", "Lecturas por destino (primario o réplica)", ("target",)
+))
+db_replica_ejections_total = REGISTRY.register(Counter(
+    "db_replica_ejections_total", "Réplicas expulsadas por fallos o retraso", ("replica",)
+))
+
+# Feed de cambios
+change_feed_events_total = REGISTRY.register(Counter(
+    "change_feed_events_total", "Cambios recibidos por LISTEN/NOTIFY", ("op",)
+))
+change_feed_dropped_subscribers_total = REGISTRY.register(Counter(
+    "change_feed_dropped_subscribers_total", "Streams cortados por no consumir los eventos a tiempo"
+))
+change_feed_reconnects_total = REGISTRY.register(Counter(
+    "change_feed_reconnects_total", "Reconexiones de la conexión de LISTEN"
+))
+
+# Trabajos por lotes
+batch_job_rows_total = REGISTRY.register(Counter(
+    "batch_job_rows_total", "Usuarios procesados por los trabajos por lotes", ("action",)
+))
+batch_job_throttle_seconds_total = REGISTRY.register(Counter(
+    "batch_job_throttle_seconds_total", "Tiempo que los trabajos esperaron para ceder el pool al tráfico"
+))
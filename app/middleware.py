@@ -0,0 +1,321 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder, IdentityResponder
+from starlette.responses import JSONResponse
+from app.config import settings
+from app.deadlines import request_deadline
+from app.metrics import (
+    admission_in_flight,
+    admission_queue_depth,
+    admission_queue_wait_seconds,
+    admission_rejections_total,
+    http_client_disconnects_total,
+    http_request_timeouts_total,
+    http_requests_total,
+    http_request_duration_seconds,
+    http_requests_in_flight,
+)
+from app.utils.http_cache import accepts_encoding, gzip_etag
+
+def route_label(scope) -> str:
+    """Plantilla de la ruta (/api/users/{user_id}/profile) para no crear una serie por ID"""
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    if scope["path"].startswith("/static"):
+        return "/static"
+    return "unmatched"
+
+class MetricsMiddleware:
+    """Registra latencia, código de estado y peticiones en curso por ruta"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            route = route_label(scope)
+            http_request_duration_seconds.observe(elapsed, method=scope["method"], route=route)
+            http_requests_total.inc(method=scope["method"], route=route, status=str(status_code))
+
+# Rutas que nunca pasan por el control de admisión, el límite por IP ni el plazo
+# (el stream de cambios es de larga duración y no retiene conexiones del pool)
+ADMISSION_EXEMPT = ("/health", "/live", "/ready", "/metrics", "/static", "/api/users/changes")
+
+class _RouteGroup:
+    """Límite de concurrencia con cola acotada para un grupo de rutas"""
+    
+    def __init__(self, prefix: str, limit: int):
+        self.prefix = prefix
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+    
+    async def acquire(self) -> Optional[str]:
+        """Espera turno; devuelve el motivo del rechazo o None si se admitió"""
+        if self.active >= self.limit and self.waiting >= settings.admission_queue_size:
+            return "queue_full"
+        self.waiting += 1
+        admission_queue_depth.inc(group=self.prefix)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), settings.admission_queue_timeout)
+        except asyncio.TimeoutError:
+            return "queue_timeout"
+        finally:
+            self.waiting -= 1
+            admission_queue_depth.dec(group=self.prefix)
+            admission_queue_wait_seconds.observe(time.perf_counter() - start, group=self.prefix)
+        self.active += 1
+        admission_in_flight.inc(group=self.prefix)
+        return None
+    
+    def release(self):
+        self.active -= 1
+        admission_in_flight.dec(group=self.prefix)
+        self._semaphore.release()
+
+class _TokenBuckets:
+    """
+    Token bucket por IP en memoria del worker
+    
+    Los buckets se guardan en orden LRU y, al pasar de max_clients, se
+    descarta el cliente que lleva más tiempo sin peticiones: coste O(1) por
+    petición aunque lleguen muchas IPs distintas.
+    """
+    
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()  # ip -> (tokens, instante)
+    
+    def allow(self, client: str) -> bool:
+        now = time.monotonic()
+        tokens, last = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        allowed = tokens >= 1
+        self._buckets[client] = (tokens - 1 if allowed else tokens, now)
+        self._buckets.move_to_end(client)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return allowed
+
+class AdmissionControlMiddleware:
+    """
+    Limita las peticiones simultáneas por grupo de rutas
+    
+    Cada grupo (prefijo de admission_limits) admite un número fijo de
+    peticiones a la vez; el resto espera en una cola acotada. Si la cola está
+    llena o la espera supera admission_queue_timeout, se responde 503 con
+    Retry-After en lugar de acumular peticiones contra la base de datos.
+    Opcionalmente limita la tasa por IP (429).
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        # Prefijos más largos primero para que el grupo más específico gane
+        self.groups = [
+            _RouteGroup(prefix, limit)
+            for prefix, limit in sorted(settings.admission_limits.items(), key=lambda item: -len(item[0]))
+        ]
+        self.buckets = (
+            _TokenBuckets(settings.rate_limit_per_ip, settings.rate_limit_burst)
+            if settings.rate_limit_per_ip else None
+        )
+    
+    def _group_for(self, path: str) -> Optional[_RouteGroup]:
+        for group in self.groups:
+            if path == group.prefix or path.startswith(group.prefix + "/"):
+                return group
+        return None
+    
+    async def _reject(self, scope, receive, send, status_code: int, detail: str):
+        response = JSONResponse(
+            {"detail": detail},
+            status_code=status_code,
+            headers={"Retry-After": str(settings.admission_retry_after)}
+        )
+        await response(scope, receive, send)
+    
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not settings.admission_enabled or path.startswith(ADMISSION_EXEMPT):
+            await self.app(scope, receive, send)
+            return
+        
+        group = self._group_for(path)
+        label = group.prefix if group else "other"
+        
+        if self.buckets is not None:
+            client = scope["client"][0] if scope.get("client") else "unknown"
+            if not self.buckets.allow(client):
+                admission_rejections_total.inc(group=label, reason="rate_limited")
+                await self._reject(scope, receive, send, 429, "Demasiadas peticiones")
+                return
+        
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+        
+        reason = await group.acquire()
+        if reason is not None:
+            admission_rejections_total.inc(group=label, reason=reason)
+            await self._reject(scope, receive, send, 503, "Servicio saturado, reintenta en unos segundos")
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            group.release()
+
+class DeadlineMiddleware:
+    """
+    Fija el plazo de cada petición y cancela el trabajo cuando ya no sirve
+    
+    El plazo (request_timeout, o el de request_timeouts para el prefijo más
+    largo que coincida) queda en request_deadline para que las consultas lo
+    apliquen como statement_timeout. Si vence antes de que empiece la
+    respuesta, la petición se cancela y se responde 504; una vez enviado
+    http.response.start el plazo deja de contar, para no cortar a medias una
+    respuesta en streaming. La petición se cancela también si el cliente se
+    desconecta antes de recibir la respuesta completa (las tareas en segundo
+    plano que corren después no se tocan); al cancelarse, psycopg cancela
+    también la consulta en el servidor.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.overrides = sorted(settings.request_timeouts.items(), key=lambda item: -len(item[0]))
+    
+    def _timeout_for(self, path: str) -> Optional[float]:
+        for prefix, timeout in self.overrides:
+            if path == prefix or path.startswith(prefix + "/"):
+                return timeout
+        return settings.request_timeout
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(ADMISSION_EXEMPT):
+            await self.app(scope, receive, send)
+            return
+        
+        timeout = self._timeout_for(scope["path"])
+        # Los mensajes del cliente pasan por una cola de un elemento (sin perder
+        # la contrapresión de las subidas) para detectar la desconexión
+        messages: asyncio.Queue = asyncio.Queue(maxsize=1)
+        disconnected = asyncio.Event()
+        response_started = asyncio.Event()
+        response_complete = False
+        
+        async def pump():
+            while True:
+                message = await receive()
+                # Tras la respuesta completa, la desconexión ya no cancela nada
+                if message["type"] == "http.disconnect" and not response_complete:
+                    disconnected.set()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    return
+        
+        async def send_wrapper(message):
+            nonlocal response_complete
+            await send(message)
+            if message["type"] == "http.response.start":
+                response_started.set()
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+        
+        token = request_deadline.set(time.monotonic() + timeout if timeout else None)
+        try:
+            app_task = asyncio.create_task(self.app(scope, messages.get, send_wrapper))
+        finally:
+            request_deadline.reset(token)
+        pump_task = asyncio.create_task(pump())
+        disconnect_task = asyncio.create_task(disconnected.wait())
+        started_task = asyncio.create_task(response_started.wait())
+        try:
+            # El plazo corre hasta que empieza la respuesta; después solo se
+            # espera a que termine la aplicación o se vaya el cliente
+            await asyncio.wait(
+                {app_task, disconnect_task, started_task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if response_started.is_set() and not app_task.done() and not disconnected.is_set():
+                await asyncio.wait({app_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            pump_task.cancel()
+            disconnect_task.cancel()
+            started_task.cancel()
+            if not app_task.done():
+                app_task.cancel()
+                await asyncio.gather(app_task, return_exceptions=True)
+        
+        if not app_task.cancelled():
+            app_task.result()
+            return
+        if disconnected.is_set():
+            http_client_disconnects_total.inc(route=route_label(scope))
+            return
+        http_request_timeouts_total.inc(route=route_label(scope))
+        if not response_started.is_set():
+            response = JSONResponse({"detail": "La petición superó su tiempo máximo"}, status_code=504)
+            await response(scope, receive, send)
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware que negocia Accept-Encoding con sus q-values
+    
+    El de Starlette comprime si el texto "gzip" aparece en la cabecera, incluso
+    con "gzip;q=0", que es un rechazo explícito. Además, al comprimir una
+    respuesta con ETag fuerte le añade el sufijo -gzip: los bytes comprimidos
+    son otra representación y no pueden compartir el ETag de la original.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        headers = Headers(scope=scope)
+        if not accepts_encoding(headers.get("accept-encoding"), "gzip"):
+            await IdentityResponder(self.app, self.minimum_size)(scope, receive, send)
+            return
+        
+        responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+        if_none_match = headers.get("if-none-match", "")
+        
+        async def send_with_etag(message):
+            # content_encoding_set: la aplicación ya envió el cuerpo codificado (p. ej. un .gz estático)
+            if message["type"] == "http.response.start" and not responder.content_encoding_set:
+                response_headers = MutableHeaders(raw=message["headers"])
+                etag = response_headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    encoded = gzip_etag(etag)
+                    # Un 304 no lleva cuerpo: se devuelve la variante que el cliente tiene guardada
+                    if response_headers.get("content-encoding") == "gzip" or (
+                        message["status"] == 304 and encoded in if_none_match
+                    ):
+                        response_headers["etag"] = encoded
+            await send(message)
+        
+        await responder(scope, receive, send_with_etag)
@@ -0,0 +1,410 @@
+"""
+Migraciones versionadas del esquema
+
+Cada migración se aplica una sola vez y queda registrada en schema_version.
+El proceso que migra toma un advisory lock, así que aunque se lance dos veces
+a la vez solo uno ejecuta el DDL; el otro espera y encuentra el esquema al día.
+
+Es un paso del despliegue, previo a arrancar los workers (que solo comprueban
+la versión en Database.ensure_schema):
+    python -m app.migrations
+"""
+import asyncio
+from typing import NamedTuple
+import psycopg
+from psycopg.rows import dict_row
+from app.config import settings
+
+# Clave del advisory lock que serializa las migraciones entre procesos
+MIGRATION_LOCK_KEY = 720_451_001
+# Segundos entre intentos de tomar el lock mientras otro proceso migra
+MIGRATION_LOCK_POLL = 0.5
+# Filas por transacción al rellenar columnas nuevas
+BACKFILL_BATCH_SIZE = 5000
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    statements: tuple[str, ...]
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción,
+    # ni un relleno que confirma cada lote
+    transactional: bool = True
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(1, "Tabla users y trigger de updated_at", (
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            full_name VARCHAR(200) NOT NULL,
+            phone VARCHAR(20),
+            bio TEXT,
+            location VARCHAR(100),
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION update_updated_at_column()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.updated_at = CURRENT_TIMESTAMP;
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql'
+        """,
+        "DROP TRIGGER IF EXISTS update_users_updated_at ON users",
+        """
+        CREATE TRIGGER update_users_updated_at
+        BEFORE UPDATE ON users
+        FOR EACH ROW
+        EXECUTE FUNCTION update_updated_at_column()
+        """,
+    )),
+    Migration(2, "Índice parcial para la paginación por cursor", (
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_active_created_at_id
+        ON users (created_at DESC, id DESC)
+        WHERE is_active = TRUE
+        """,
+    ), transactional=False),
+    Migration(3, "Índice para exportaciones incrementales por updated_at", (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_updated_at ON users (updated_at)",
+    ), transactional=False),
+    Migration(4, "Columna search_vector para búsqueda de texto completo", (
+        """
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            to_tsvector('simple', coalesce(full_name, '') || ' ' || coalesce(bio, ''))
+        ) STORED
+        """,
+    )),
+    Migration(5, "Índices de búsqueda (GIN y prefijos)", (
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_search_vector
+        ON users USING GIN (search_vector)
+        WHERE is_active = TRUE
+        """,
+        *(
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_{column}_prefix
+            ON users (lower({column}) text_pattern_ops)
+            WHERE is_active = TRUE
+            """
+            for column in ("full_name", "email", "location")
+        ),
+    ), transactional=False),
+    Migration(6, "Columna version para control de concurrencia optimista", (
+        # Con DEFAULT constante PostgreSQL no reescribe la tabla
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+        """
+        CREATE OR REPLACE FUNCTION update_updated_at_column()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.updated_at = CURRENT_TIMESTAMP;
+            NEW.version = OLD.version + 1;
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql'
+        """,
+    )),
+    Migration(7, "Feed de cambios: tabla user_changes y pg_notify", (
+        """
+        CREATE TABLE IF NOT EXISTS user_changes (
+            id BIGSERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            version INTEGER,
+            changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_user_changes_changed_at ON user_changes (changed_at)",
+        # Trigger por sentencia con tablas de transición: una importación masiva
+        # registra sus filas en un solo INSERT y emite un único aviso con el
+        # rango de IDs y la transacción que los escribió
+        """
+        CREATE OR REPLACE FUNCTION record_user_changes()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            first_id BIGINT;
+            last_id BIGINT;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                WITH inserted AS (
+                    INSERT INTO user_changes (user_id, op, version)
+                    SELECT id, 'delete', version FROM old_rows
+                    RETURNING id
+                )
+                SELECT min(id), max(id) INTO first_id, last_id FROM inserted;
+            ELSE
+                WITH inserted AS (
+                    INSERT INTO user_changes (user_id, op, version)
+                    SELECT id, lower(TG_OP), version FROM new_rows
+                    RETURNING id
+                )
+                SELECT min(id), max(id) INTO first_id, last_id FROM inserted;
+            END IF;
+            IF first_id IS NOT NULL THEN
+                PERFORM pg_notify(
+                    'user_changes',
+                    first_id || ':' || last_id || ':' || pg_current_xact_id()::xid
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql'
+        """,
+        "DROP TRIGGER IF EXISTS users_changes_insert ON users",
+        "DROP TRIGGER IF EXISTS users_changes_update ON users",
+        "DROP TRIGGER IF EXISTS users_changes_delete ON users",
+        """
+        CREATE TRIGGER users_changes_insert
+        AFTER INSERT ON users
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION record_user_changes()
+        """,
+        """
+        CREATE TRIGGER users_changes_update
+        AFTER UPDATE ON users
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION record_user_changes()
+        """,
+        """
+        CREATE TRIGGER users_changes_delete
+        AFTER DELETE ON users
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION record_user_changes()
+        """,
+    )),
+    Migration(8, "Archivo de usuarios purgados (particionado por mes) y trabajos por lotes", (
+        """
+        CREATE TABLE IF NOT EXISTS users_archive (
+            id INTEGER NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            full_name VARCHAR(200) NOT NULL,
+            phone VARCHAR(20),
+            bio TEXT,
+            location VARCHAR(100),
+            is_active BOOLEAN,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            version INTEGER,
+            job_id INTEGER,
+            archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, archived_at)
+        ) PARTITION BY RANGE (archived_at)
+        """,
+        # Crea la partición del mes al vuelo; el trabajo la pide antes de cada lote
+        """
+        CREATE OR REPLACE FUNCTION ensure_users_archive_partition(ts TIMESTAMP)
+        RETURNS VOID AS $$
+        DECLARE
+            month_start TIMESTAMP := date_trunc('month', ts);
+            partition_name TEXT := 'users_archive_' || to_char(ts, 'YYYY_MM');
+        BEGIN
+            IF to_regclass(partition_name) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF users_archive FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, month_start, month_start + INTERVAL '1 month'
+                );
+            END IF;
+        END;
+        $$ language 'plpgsql'
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS batch_jobs (
+            id SERIAL PRIMARY KEY,
+            action VARCHAR(20) NOT NULL,
+            params JSONB NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            processed INTEGER NOT NULL DEFAULT 0,
+            batches INTEGER NOT NULL DEFAULT 0,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """,
+    )),
+    Migration(9, "Índice parcial de usuarios inactivos para la purga", (
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_inactive_id
+        ON users (id)
+        WHERE is_active = FALSE
+        """,
+    ), transactional=False),
+    # El ID (BIGSERIAL) se asigna al insertar, no al confirmar: una transacción
+    # puede confirmar después otra con IDs mayores. La transacción que escribió
+    # cada cambio permite repartirlos en orden de confirmación seguro. Con un
+    # default constante el ADD COLUMN no reescribe la tabla; las filas previas
+    # quedan con tx = 0 y se ordenan por ID como hasta ahora
+    Migration(10, "Transacción de cada cambio en user_changes", (
+        "ALTER TABLE user_changes ADD COLUMN IF NOT EXISTS tx xid8 NOT NULL DEFAULT '0'",
+        "ALTER TABLE user_changes ALTER COLUMN tx SET DEFAULT pg_current_xact_id()",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_changes_tx_id ON user_changes (tx, id)",
+    ), transactional=False),
+    # La columna generada de la migración 4 recalcula el tsvector en cada
+    # UPDATE de la fila. DROP EXPRESSION la convierte en una columna normal sin
+    # reescribir la tabla (conserva los valores y el índice GIN) y el trigger
+    # la mantiene solo cuando cambian full_name o bio. Ambos van en la misma
+    # transacción para que ninguna escritura quede sin calcular entre medias
+    Migration(11, "search_vector mantenida por trigger en lugar de columna generada", (
+        """
+        CREATE OR REPLACE FUNCTION update_search_vector_column()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.search_vector = to_tsvector('simple', coalesce(NEW.full_name, '') || ' ' || coalesce(NEW.bio, ''));
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql'
+        """,
+        """
+        DO $$
+        BEGIN
+            ALTER TABLE users ALTER COLUMN search_vector DROP EXPRESSION IF EXISTS;
+            DROP TRIGGER IF EXISTS update_users_search_vector ON users;
+            CREATE TRIGGER update_users_search_vector
+            BEFORE INSERT OR UPDATE OF full_name, bio ON users
+            FOR EACH ROW
+            EXECUTE FUNCTION update_search_vector_column();
+        END
+        $$
+        """,
+        # Relleno por rangos de id, confirmando cada lote, de las filas que
+        # hubieran quedado sin valor. El trigger de updated_at se desactiva
+        # dentro de cada lote para que el relleno no cambie updated_at; las
+        # demás sesiones nunca lo ven desactivado (el ALTER TABLE les hace
+        # esperar a que el lote confirme)
+        f"""
+        DO $$
+        DECLARE
+            last_id INTEGER;
+            batch_start INTEGER := 0;
+        BEGIN
+            SELECT coalesce(max(id), 0) INTO last_id FROM users;
+            WHILE batch_start < last_id LOOP
+                ALTER TABLE users DISABLE TRIGGER update_users_updated_at;
+                UPDATE users
+                SET search_vector = to_tsvector('simple', coalesce(full_name, '') || ' ' || coalesce(bio, ''))
+                WHERE id > batch_start AND id <= batch_start + {BACKFILL_BATCH_SIZE}
+                  AND search_vector IS NULL;
+                ALTER TABLE users ENABLE TRIGGER update_users_updated_at;
+                COMMIT;
+                batch_start := batch_start + {BACKFILL_BATCH_SIZE};
+            END LOOP;
+        END
+        $$
+        """,
+    ), transactional=False),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+async def get_schema_version(conn) -> int:
+    """Versión aplicada del esquema (0 si nunca se migró)"""
+    # Dos consultas: la subconsulta sobre schema_version se analiza aunque
+    # la tabla no exista, así que no puede ir en un CASE
+    cur = await conn.execute(
+        "SELECT to_regclass('schema_version') IS NOT NULL AS migrated"
+    )
+    if not (await cur.fetchone())["migrated"]:
+        return 0
+    cur = await conn.execute(
+        "SELECT coalesce(max(version), 0) AS version FROM schema_version"
+    )
+    row = await cur.fetchone()
+    return row["version"]
+
+async def _acquire_migration_lock(conn):
+    """
+    Toma el advisory lock reintentando con pg_try_advisory_lock
+    
+    pg_advisory_lock bloquearía dentro de la sentencia SELECT y el proceso
+    que espera retendría su snapshot (y su xmin) todo ese tiempo, frenando
+    el VACUUM mientras dura un CREATE INDEX CONCURRENTLY largo. En autocommit
+    cada intento es una transacción corta y entre intentos no se retiene nada.
+    """
+    waiting = False
+    while True:
+        cur = await conn.execute(
+            "SELECT pg_try_advisory_lock(%s) AS locked", (MIGRATION_LOCK_KEY,)
+        )
+        if (await cur.fetchone())["locked"]:
+            return
+        if not waiting:
+            print("⏳ Otro proceso está migrando; esperando al advisory lock...")
+            waiting = True
+        await asyncio.sleep(MIGRATION_LOCK_POLL)
+
+async def _drop_invalid_indexes(conn):
+    """Elimina índices que un CREATE INDEX CONCURRENTLY interrumpido dejó inválidos"""
+    cur = await conn.execute(
+        """
+        SELECT indexrelid::regclass::text AS index_name
+        FROM pg_index
+        WHERE indrelid IN (to_regclass('users'), to_regclass('user_changes'))
+          AND NOT indisvalid
+        """
+    )
+    for row in await cur.fetchall():
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {row['index_name']}")
+
+async def migrate(database_url: str = settings.database_url) -> list[int]:
+    """Aplica las migraciones pendientes y devuelve las versiones aplicadas"""
+    applied = []
+    # Conexión propia en autocommit: el advisory lock es de sesión y
+    # los índices CONCURRENTLY necesitan ejecutarse fuera de transacción
+    async with await psycopg.AsyncConnection.connect(
+        database_url, autocommit=True, row_factory=dict_row
+    ) as conn:
+        await _acquire_migration_lock(conn)
+        try:
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            current = await get_schema_version(conn)
+            
+            for migration in MIGRATIONS:
+                if migration.version <= current:
+                    continue
+                
+                if migration.transactional:
+                    async with conn.transaction():
+                        for statement in migration.statements:
+                            await conn.execute(statement)
+                        await _record(conn, migration)
+                else:
+                    await _drop_invalid_indexes(conn)
+                    for statement in migration.statements:
+                        await conn.execute(statement)
+                    await _record(conn, migration)
+                
+                applied.append(migration.version)
+                print(f"✅ Migración {migration.version} aplicada: {migration.description}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+    return applied
+
+async def _record(conn, migration: Migration):
+    await conn.execute(
+        "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+        (migration.version, migration.description)
+    )
+
+if __name__ == "__main__":
+    versions = asyncio.run(migrate())
+    if versions:
+        print(f"Esquema en la versión {versions[-1]}")
+    else:
+        print(f"El esquema ya estaba en la versión {LATEST_VERSION}")
@@ -0,0 +1,37 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import Literal, Optional
+from datetime import datetime
+
+JobAction = Literal["deactivate", "purge"]
+JobStatus = Literal["pending", "running", "cancelling", "cancelled", "completed", "failed"]
+
+class JobCreate(BaseModel):
+    """Trabajo de desactivación o purga; selecciona usuarios por lista de IDs y/o criterios"""
+    action: JobAction
+    ids: Optional[list[int]] = Field(None, min_length=1)
+    inactive_only: bool = Field(False, description="Solo usuarios ya desactivados")
+    updated_before: Optional[datetime] = Field(None, description="Solo usuarios sin cambios desde esta fecha")
+    batch_size: Optional[int] = Field(None, ge=1, le=10000)
+    
+    @model_validator(mode="after")
+    def check_selection(self):
+        # Un trabajo sin criterios afectaría a toda la tabla
+        if not self.ids and not self.inactive_only and self.updated_before is None:
+            raise ValueError("Indica ids, inactive_only o updated_before")
+        if self.action == "deactivate" and self.inactive_only:
+            raise ValueError("inactive_only no aplica a una desactivación")
+        return self
+
+class JobResponse(BaseModel):
+    """Estado y progreso de un trabajo por lotes"""
+    id: int
+    action: JobAction
+    params: dict
+    status: JobStatus
+    processed: int
+    batches: int
+    last_id: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -26,6 +26,7 @@ class UserResponse(UserBase):
     is_active: bool
     created_at: datetime
     updated_at: datetime
+    version: int
     
     class Config:
         from_attributes = True
@@ -41,6 +42,48 @@ class UserProfileResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class UserListResponse(BaseModel):
+    """Página de usuarios con cursores opacos para navegar"""
+    items: list[UserResponse]
+    limit: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+class UserSearchResult(UserResponse):
+    """Usuario encontrado con su relevancia en la búsqueda"""
+    rank: float
+
+class UserSearchResponse(BaseModel):
+    """Página de resultados de búsqueda"""
+    items: list[UserSearchResult]
+    limit: int
+    offset: int
+    has_more: bool
+
+class BatchGetRequest(BaseModel):
+    """IDs de los perfiles a consultar en lote"""
+    ids: list[int] = Field(..., min_length=1)
+
+class BatchGetResponse(BaseModel):
+    """Perfiles en el orden solicitado y los IDs no encontrados"""
+    users: list[UserProfileResponse]
+    missing: list[int]
+
+class BulkImportRow(BaseModel):
+    """Resultado de una fila de la importación masiva"""
+    row: int
+    status: Literal["created", "duplicate", "invalid"]
+    id: Optional[int] = None
+    email: Optional[str] = None
+    errors: Optional[list[str]] = None
+
+class BulkImportResponse(BaseModel):
+    """Reporte de la importación masiva"""
+    created: int
+    duplicates: int
+    invalid: int
+    rows: list[BulkImportRow]
+
 class DeleteAccountResponse(BaseModel):
     """Modelo de respuesta al eliminar cuenta"""
     message: str
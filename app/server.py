@@ -0,0 +1,51 @@
+"""
+Punto de entrada de producción
+
+    python -m app.server
+
+Lanza uvicorn con varios workers (uno por núcleo por defecto), uvloop y
+httptools cuando están instalados, y apagado ordenado: al recibir SIGTERM
+cada worker deja de aceptar conexiones, drena las peticiones en curso durante
+graceful_shutdown_timeout y cierra su pool en el lifespan de la aplicación.
+Todo se configura con Settings / .env.
+
+Las migraciones no se aplican aquí: se ejecutan antes, como paso del
+despliegue (python -m app.migrations), y cada worker solo comprueba al
+arrancar que el esquema está en la versión esperada.
+"""
+import logging
+import uvicorn
+from app.config import settings
+
+logger = logging.getLogger("app.server")
+
+def server_options() -> dict:
+    """Opciones de uvicorn derivadas de Settings"""
+    return {
+        "host": settings.host,
+        "port": settings.port,
+        "workers": settings.worker_count,
+        "loop": settings.server_loop,
+        "http": settings.server_http,
+        "timeout_keep_alive": settings.keep_alive_timeout,
+        "backlog": settings.backlog,
+        "limit_concurrency": settings.limit_concurrency,
+        "timeout_graceful_shutdown": settings.graceful_shutdown_timeout,
+        "proxy_headers": settings.proxy_headers,
+        "forwarded_allow_ips": settings.forwarded_allow_ips,
+        "access_log": False,  # las peticiones ya se miden en /metrics
+    }
+
+def run():
+    options = server_options()
+    min_size, max_size = settings.pool_sizes()
+    per_worker = max_size + settings.dedicated_connections()
+    logger.info(
+        "Iniciando %d workers (pool por worker %d-%d, máximo total %d conexiones)",
+        options["workers"], min_size, max_size, options["workers"] * per_worker
+    )
+    uvicorn.run("app.main:app", **options)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run()
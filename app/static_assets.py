@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+from typing import Optional
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+from app.config import BASE_DIR, settings
+from app.utils.http_cache import accepts_encoding
+
+STATIC_DIR = BASE_DIR / "static"
+
+# Los archivos con hash en el nombre nunca cambian: el navegador puede guardarlos un año
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Los archivos sin hash se pueden cachear pero deben revalidarse
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Tipos que vale la pena precomprimir
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".html", ".json", ".txt", ".map"}
+
+class StaticManifest:
+    """
+    Huellas de contenido de los archivos estáticos
+    
+    Al arrancar se calcula un hash por archivo (css/styles.css ->
+    css/styles.3f2a9c1b7d4e.css) y se escribe una copia .gz de los
+    archivos comprimibles en el directorio de build.
+    """
+    
+    def __init__(self, directory: Path, build_dir: Optional[Path]):
+        self.directory = directory
+        self.build_dir = build_dir
+        self.urls: dict[str, str] = {}        # original -> con hash
+        self.originals: dict[str, str] = {}   # con hash -> original
+        self.gzipped: dict[str, Path] = {}    # con hash -> copia .gz
+    
+    def build(self) -> int:
+        urls, originals, gzipped = {}, {}, {}
+        for path in sorted(self.directory.rglob("*")):
+            if not path.is_file():
+                continue
+            relative = path.relative_to(self.directory).as_posix()
+            content = path.read_bytes()
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            hashed = f"{path.parent.relative_to(self.directory).as_posix()}/{path.stem}.{digest}{path.suffix}"
+            hashed = hashed.removeprefix("./")
+            urls[relative] = hashed
+            originals[hashed] = relative
+            
+            if (
+                self.build_dir is not None
+                and path.suffix in COMPRESSIBLE_SUFFIXES
+                and len(content) >= settings.gzip_min_size
+            ):
+                target = self.build_dir / f"{hashed}.gz"
+                if not target.exists():
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    # Escritura atómica: varios workers pueden construir a la vez
+                    tmp = target.with_suffix(f".gz.{os.getpid()}.tmp")
+                    tmp.write_bytes(gzip.compress(content, compresslevel=9, mtime=0))
+                    tmp.replace(target)
+                gzipped[hashed] = target
+        
+        self.urls, self.originals, self.gzipped = urls, originals, gzipped
+        return len(urls)
+    
+    def url(self, path: str) -> str:
+        """URL pública de un archivo estático (con hash si el manifiesto está construido)"""
+        path = path.lstrip("/")
+        return f"/static/{self.urls.get(path, path)}"
+
+static_manifest = StaticManifest(
+    STATIC_DIR,
+    Path(settings.static_build_dir) if settings.static_build_dir else None
+)
+
+class FingerprintedStaticFiles(StaticFiles):
+    """StaticFiles que resuelve nombres con hash, los marca inmutables y sirve su .gz precomprimido"""
+    
+    def __init__(self, *args, manifest: StaticManifest, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest
+    
+    async def get_response(self, path, scope):
+        original = self.manifest.originals.get(path)
+        if original is None:
+            response = await super().get_response(path, scope)
+            response.headers.setdefault("Cache-Control", REVALIDATE_CACHE_CONTROL)
+            return response
+        
+        compressed = self.manifest.gzipped.get(path)
+        if compressed is not None and _accepts_gzip(scope) and scope["method"] in ("GET", "HEAD"):
+            media_type = mimetypes.guess_type(original)[0] or "application/octet-stream"
+            return FileResponse(
+                compressed,
+                media_type=media_type,
+                headers={
+                    "Content-Encoding": "gzip",
+                    "Vary": "Accept-Encoding",
+                    "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+                },
+                method=scope["method"],
+            )
+        
+        response = await super().get_response(original, scope)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+def _accepts_gzip(scope) -> bool:
+    for name, value in scope.get("headers", []):
+        if name == b"accept-encoding":
+            return accepts_encoding(value.decode("latin-1"), "gzip")
+    return False
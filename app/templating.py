@@ -0,0 +1,76 @@
+from pathlib import Path
+from typing import Iterator, Optional
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from app.config import settings
+from app.static_assets import static_manifest
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+
+# Tamaño aproximado de cada bloque enviado al renderizar en streaming
+STREAM_CHUNK_SIZE = 16 * 1024
+
+def build_environment() -> Environment:
+    """
+    Entorno de Jinja2 para producción
+    
+    - Caché de bytecode en disco: los workers nuevos no recompilan las plantillas.
+    - auto_reload desactivado salvo en desarrollo: no se consulta el disco en cada render.
+    """
+    bytecode_cache = None
+    if settings.template_bytecode_cache_dir:
+        cache_dir = Path(settings.template_bytecode_cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(str(cache_dir))
+    
+    return Environment(
+        loader=FileSystemLoader(str(TEMPLATES_DIR)),
+        autoescape=True,
+        auto_reload=settings.template_auto_reload,
+        bytecode_cache=bytecode_cache,
+    )
+
+templates = Jinja2Templates(env=build_environment())
+templates.env.globals["static_url"] = static_manifest.url
+
+def precompile_templates() -> int:
+    """Carga todas las plantillas al arrancar para no compilarlas en la primera petición"""
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.get_template(name)
+    return len(names)
+
+def _buffered(chunks: Iterator[str]) -> Iterator[str]:
+    """Agrupa los fragmentos de generate() en bloques de STREAM_CHUNK_SIZE"""
+    buffer, size = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+def stream_template(
+    request: Request,
+    name: str,
+    context: dict,
+    status_code: int = 200,
+    headers: Optional[dict] = None
+) -> StreamingResponse:
+    """
+    Renderiza una plantilla en streaming con Template.generate()
+    
+    El primer bloque sale en cuanto se renderiza la cabecera de la página,
+    sin esperar a tener todo el HTML en memoria.
+    """
+    template = templates.get_template(name)
+    return StreamingResponse(
+        _buffered(template.generate({**context, "request": request})),
+        status_code=status_code,
+        headers=headers,
+        media_type="text/html; charset=utf-8"
+    )
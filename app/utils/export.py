@@ -0,0 +1,35 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+# Tipos de contenido por formato de exportación
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+def _serialize(value):
+    """Convierte los valores de PostgreSQL a tipos representables en texto"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def csv_header(columns: list[str]) -> str:
+    """Línea de cabecera del CSV"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue()
+
+def format_chunk(rows: list[dict], columns: list[str], fmt: str) -> str:
+    """Serializa un bloque de filas como NDJSON o CSV"""
+    if fmt == "ndjson":
+        return "".join(
+            json.dumps({col: _serialize(row[col]) for col in columns}, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_serialize(row[col]) for col in columns] for row in rows)
+    return buffer.getvalue()
@@ -0,0 +1,53 @@
+import typing
+from functools import lru_cache
+from typing import Any, Optional
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional: pip install .[fast]
+    orjson = None
+
+# Ruta rápida activa solo si se pidió y orjson está instalado
+FAST_JSON = settings.fast_json and orjson is not None
+
+@lru_cache(maxsize=None)
+def _plan(model: type[BaseModel]) -> tuple[tuple[str, Optional[type[BaseModel]], bool], ...]:
+    """Campos del modelo con su submodelo (si lo hay) y si es una lista de submodelos"""
+    plan = []
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        is_list = typing.get_origin(annotation) is list
+        inner = typing.get_args(annotation)[0] if is_list else annotation
+        submodel = inner if isinstance(inner, type) and issubclass(inner, BaseModel) else None
+        plan.append((name, submodel, is_list))
+    return tuple(plan)
+
+def shape(data: dict, model: type[BaseModel]) -> dict:
+    """Proyecta una fila (o un dict anidado) a los campos del modelo, sin validar"""
+    shaped = {}
+    for name, submodel, is_list in _plan(model):
+        value = data.get(name)
+        if submodel is not None and value is not None:
+            value = [shape(item, submodel) for item in value] if is_list else shape(value, submodel)
+        shaped[name] = value
+    return shaped
+
+def model_response(data: Any, model: type[BaseModel], response: Optional[Response] = None):
+    """
+    Respuesta JSON de datos ya formados por el SQL del controlador
+    
+    Con fast_json activo se proyectan los campos del modelo y se serializa con
+    orjson, sin volver a validar con pydantic (el response_model de la ruta se
+    mantiene para el esquema OpenAPI). Sin él, se devuelven los datos tal cual
+    para que FastAPI los valide como siempre.
+    """
+    if not FAST_JSON:
+        return data
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    return ORJSONResponse(shape(data, model), headers=headers)
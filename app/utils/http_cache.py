@@ -0,0 +1,111 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+from fastapi import Request, Response
+
+# Los clientes pueden guardar la respuesta pero deben revalidarla en cada uso
+CACHE_CONTROL = "private, no-cache"
+
+# Sufijo del ETag de la representación comprimida: cada codificación es una
+# representación distinta y necesita su propio ETag fuerte
+GZIP_ETAG_SUFFIX = "-gzip"
+
+def _as_utc(value: datetime) -> datetime:
+    """updated_at es TIMESTAMP sin zona horaria; se interpreta como UTC"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def make_etag(user_id: int, version: int) -> str:
+    """ETag fuerte de un perfil: su ID y la versión que incrementa cada UPDATE"""
+    return f'"{user_id}.{version}"'
+
+def gzip_etag(etag: str) -> str:
+    """ETag de la versión comprimida con gzip de la misma representación"""
+    return f'{etag[:-1]}{GZIP_ETAG_SUFFIX}"'
+
+def _opaque_tag(etag: str) -> str:
+    """Etiqueta sin W/ ni el sufijo de codificación, para comparar versiones"""
+    return etag.strip().removeprefix("W/").strip('"').removesuffix(GZIP_ETAG_SUFFIX)
+
+def parse_etag(etag: str, user_id: int) -> Optional[int]:
+    """Versión contenida en un ETag de perfil, o None si no corresponde a ese usuario"""
+    user_part, _, version = _opaque_tag(etag).partition(".")
+    if user_part != str(user_id) or not version.isdigit():
+        return None
+    return int(version)
+
+def page_etag(rows: Iterable[dict], *extra: Optional[str]) -> str:
+    """
+    ETag de una página de usuarios: cambia si cambia, entra o sale cualquiera de sus filas
+    
+    Se calcula sobre las filas ya leídas, así que no evita la consulta.
+    """
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(f"{row['id']}.{row['version']};".encode())
+    # Otros datos que alteran la página (p. ej. los enlaces de navegación)
+    for value in extra:
+        digest.update(f"{value or ''};".encode())
+    return f'"{digest.hexdigest()[:20]}"'
+
+def format_last_modified(updated_at: datetime) -> str:
+    return format_datetime(_as_utc(updated_at), usegmt=True)
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Evalúa If-None-Match (prioritario) e If-Modified-Since según RFC 9110"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Comparación débil: vale el ETag de cualquier codificación de la representación
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or _opaque_tag(etag) in map(_opaque_tag, candidates)
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # La fecha HTTP tiene resolución de segundos
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+def has_conditional_headers(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_last_modified(last_modified)
+    return headers
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
+
+def accepts_encoding(accept_encoding: Optional[str], coding: str) -> bool:
+    """
+    Indica si Accept-Encoding admite una codificación según RFC 9110
+    
+    Cuenta el q-value: "gzip;q=0" la rechaza expresamente. Si la codificación
+    no aparece decide el comodín "*".
+    """
+    if not accept_encoding:
+        return False
+    wildcard = False
+    for item in accept_encoding.split(","):
+        name, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        name = name.strip().lower()
+        if name == coding:
+            return quality > 0
+        if name == "*":
+            wildcard = quality > 0
+    return wildcard
@@ -0,0 +1,141 @@
+import csv
+import json
+from typing import AsyncIterator, Optional
+from app.config import settings
+
+# Campos aceptados en cada fila importada
+IMPORT_FIELDS = ("email", "full_name", "phone", "bio", "location")
+
+# Error de la fila que no se pudo decodificar; la importación se detiene en ella
+ENCODING_ERROR = "La fila no está codificada en UTF-8; la importación se detuvo aquí"
+
+def line_too_long_error() -> str:
+    return f"La fila supera el máximo de {settings.import_max_line_bytes} bytes"
+
+class OverlongLine:
+    """Línea descartada por superar import_max_line_bytes (con sus comillas, para el CSV)"""
+    
+    def __init__(self, quotes: int):
+        self.quotes = quotes
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str | OverlongLine]:
+    """
+    Convierte un flujo de bytes en líneas de texto sin cargarlo entero
+    
+    Una línea de más de import_max_line_bytes no se acumula: se descarta hasta
+    el siguiente salto de línea y en su lugar se devuelve un OverlongLine.
+    """
+    limit = settings.import_max_line_bytes
+    pending = bytearray()
+    overlong: Optional[OverlongLine] = None
+    async for chunk in chunks:
+        view = memoryview(chunk)
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            stop = len(chunk) if end == -1 else end
+            if overlong is not None:
+                overlong.quotes += chunk.count(b'"', start, stop)
+            else:
+                pending += view[start:stop]
+                if len(pending) > limit:
+                    overlong = OverlongLine(pending.count(b'"'))
+                    pending.clear()
+            if end == -1:
+                break
+            if overlong is not None:
+                yield overlong
+                overlong = None
+            else:
+                yield pending.decode("utf-8").rstrip("\r")
+                pending.clear()
+            start = end + 1
+    if overlong is not None:
+        yield overlong
+    elif pending:
+        yield pending.decode("utf-8").rstrip("\r")
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict | str]]:
+    """
+    Devuelve (número de fila, datos) por cada línea NDJSON; el error como texto si no es válida
+    
+    Una línea que no es UTF-8 se informa como fila inválida y termina el flujo;
+    una demasiado larga se informa como inválida y se sigue con la siguiente.
+    """
+    row_number = 0
+    try:
+        async for line in iter_lines(chunks):
+            if isinstance(line, OverlongLine):
+                row_number += 1
+                yield row_number, line_too_long_error()
+                continue
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, f"JSON inválido: {e.msg}"
+                continue
+            if not isinstance(data, dict):
+                yield row_number, "Cada línea debe ser un objeto JSON"
+                continue
+            yield row_number, data
+    except UnicodeDecodeError:
+        yield row_number + 1, ENCODING_ERROR
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict | str]]:
+    """
+    Devuelve (número de fila, datos) por cada registro CSV; la primera línea es la cabecera
+    
+    Una línea que no es UTF-8 se informa como fila inválida y termina el flujo.
+    Un registro de más de import_max_line_bytes (en una línea o en varias entre
+    comillas) se informa como inválido y se sigue con el siguiente.
+    """
+    header = None
+    row_number = 0
+    record = []
+    record_size = 0
+    record_quotes = 0
+    overlong = False
+    try:
+        async for line in iter_lines(chunks):
+            if isinstance(line, OverlongLine):
+                overlong = True
+                record_quotes += line.quotes
+            else:
+                record_quotes += line.count('"')
+                record_size += len(line.encode("utf-8"))
+                if record_size > settings.import_max_line_bytes:
+                    overlong = True
+                if not overlong:
+                    record.append(line)
+            # Un registro termina cuando sus comillas están balanceadas (admite saltos de línea entre comillas)
+            if record_quotes % 2:
+                continue
+            text = "\n".join(record)
+            record, record_size, record_quotes = [], 0, 0
+            if overlong:
+                overlong = False
+                if header is None:
+                    yield 1, f"Cabecera: {line_too_long_error()}"
+                    return
+                row_number += 1
+                yield row_number, line_too_long_error()
+                continue
+            if not text.strip():
+                continue
+            values = next(csv.reader([text]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row_number += 1
+            if len(values) != len(header):
+                yield row_number, f"Se esperaban {len(header)} columnas y llegaron {len(values)}"
+                continue
+            yield row_number, {name: (value if value != "" else None) for name, value in zip(header, values)}
+    except UnicodeDecodeError:
+        yield row_number + 1, ENCODING_ERROR
+        return
+    if record or overlong:
+        yield row_number + 1, "Registro CSV incompleto (comillas sin cerrar)"
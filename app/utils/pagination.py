@@ -0,0 +1,26 @@
+import base64
+import json
+from datetime import datetime
+
+# Direcciones posibles de un cursor de paginación
+NEXT = "next"
+PREV = "prev"
+
+def encode_cursor(row: dict, direction: str = NEXT) -> str:
+    """Codifica la clave (created_at, id) de una fila en un cursor opaco"""
+    payload = {"d": direction, "k": [row["created_at"].isoformat(), row["id"]]}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[str, datetime, int]:
+    """Decodifica un cursor opaco; lanza ValueError si es inválido"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload["d"]
+        created_at, user_id = payload["k"]
+        if direction not in (NEXT, PREV):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(created_at), int(user_id)
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Cursor de paginación inválido") from e
@@ -0,0 +1,4 @@
+def like_prefix(text: str) -> str:
+    """Patrón LIKE de prefijo en minúsculas, escapando los comodines del texto"""
+    escaped = text.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
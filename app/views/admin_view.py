@@ -0,0 +1,87 @@
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Path, Query
+from app.config import settings
+from app.jobs import batch_jobs
+from app.models.job import JobCreate, JobResponse
+
+async def require_admin_token(
+    authorization: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Exige el token de administración (Authorization: Bearer o X-Admin-Token)
+    
+    Sin admin_token configurado no se admite ninguna petición: la API de
+    administración queda cerrada en lugar de abierta.
+    """
+    if not settings.admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="API de administración deshabilitada (falta ADMIN_TOKEN)"
+        )
+    token = x_admin_token
+    if token is None and authorization is not None:
+        scheme, _, credentials = authorization.partition(" ")
+        if scheme.lower() == "bearer":
+            token = credentials.strip()
+    if token is None or not secrets.compare_digest(token.encode(), settings.admin_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de administración inválido",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+router = APIRouter(prefix="/api/admin/jobs", tags=["Admin Jobs"], dependencies=[Depends(require_admin_token)])
+
+@router.post("/", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(job: JobCreate):
+    """
+    Crea un trabajo de desactivación o purga y lo ejecuta en segundo plano
+    
+    El progreso se consulta en GET /api/admin/jobs/{job_id} desde cualquier worker.
+    """
+    created = await batch_jobs.create(job)
+    claimed = await batch_jobs.claim(created["id"])
+    batch_jobs.start(claimed)
+    return claimed
+
+@router.get("/", response_model=list[JobResponse])
+async def list_jobs(limit: int = Query(20, ge=1, le=100)):
+    """Trabajos más recientes con su progreso"""
+    return await batch_jobs.list(limit)
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: int = Path(..., gt=0)):
+    """Estado y progreso de un trabajo"""
+    job = await batch_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+@router.post("/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(job_id: int = Path(..., gt=0)):
+    """Cancela un trabajo; si está en curso se detiene al terminar el lote actual"""
+    job = await batch_jobs.cancel(job_id)
+    if job:
+        return job
+    if await batch_jobs.get(job_id):
+        raise HTTPException(status_code=409, detail="El trabajo no está pendiente ni en curso")
+    raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+@router.post("/{job_id}/resume", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def resume_job(job_id: int = Path(..., gt=0)):
+    """
+    Reanuda un trabajo desde el último ID procesado
+    
+    Se reanudan los cancelados o fallidos y los huérfanos: running o
+    cancelling sin progreso en job_stale_after segundos porque el proceso que
+    los ejecutaba murió.
+    """
+    job = await batch_jobs.claim(job_id)
+    if job:
+        batch_jobs.start(job)
+        return job
+    if await batch_jobs.get(job_id):
+        raise HTTPException(status_code=409, detail="Solo se reanudan trabajos cancelados, fallidos o sin actividad")
+    raise HTTPException(status_code=404, detail="Trabajo no encontrado")
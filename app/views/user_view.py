@@ -1,12 +1,35 @@
-from fastapi import APIRouter, HTTPException, status, Path
+from fastapi import APIRouter, HTTPException, status, Path, Query, Request, Response, Header
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Literal, Optional
+import psycopg
+from pydantic import ValidationError
 from app.models.user import (
     UserCreate, 
     UserUpdate, 
     UserResponse, 
     UserProfileResponse,
+    UserListResponse,
+    UserSearchResponse,
+    BulkImportResponse,
+    BatchGetRequest,
+    BatchGetResponse,
     DeleteAccountResponse
 )
-from app.controllers.user_controller import UserController
+from app.controllers.user_controller import UserController, EXPORT_COLUMNS
+from app.change_feed import change_feed, parse_cursor
+from app.config import settings
+from app.utils.export import MEDIA_TYPES, csv_header, format_chunk
+from app.utils.importers import IMPORT_FIELDS, iter_csv_rows, iter_ndjson_rows
+from app.utils.fast_json import model_response
+from app.utils.http_cache import (
+    cache_headers,
+    has_conditional_headers,
+    is_not_modified,
+    make_etag,
+    not_modified_response,
+    parse_etag
+)
 
 router = APIRouter(prefix="/api/users", tags=["User Profile Management"])
 
@@ -14,47 +37,248 @@ router = APIRouter(prefix="/api/users", tags=["User Profile Management"])
 async def create_user(user: UserCreate):
     """
     Registra un nuevo usuario en la plataforma
+    
+    Un email ya registrado responde 400 (lo detecta el propio INSERT con
+    ON CONFLICT); solo los errores de la base de datos se convierten en 500.
     """
     try:
-        # Verificar si el email ya existe
-        existing_user = UserController.get_user_by_email(user.email)
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"El email {user.email} ya está registrado"
-            )
-        
-        result = UserController.create_user(user)
-        return result
-    except HTTPException:
-        raise
-    except Exception as e:
+        result = await UserController.create_user(user)
+    except psycopg.Error as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al crear el usuario: {str(e)}"
         )
+    if result.duplicate:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El email {user.email} ya está registrado"
+        )
+    return result.user
+
+@router.get("/", response_model=UserListResponse)
+async def list_users(
+    limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devuelto en next_cursor/prev_cursor")
+):
+    """
+    Lista los usuarios activos paginados por cursor
+    
+    Los usuarios se ordenan del más reciente al más antiguo. Para navegar
+    se envía el valor de `next_cursor` o `prev_cursor` de la respuesta anterior.
+    """
+    try:
+        return model_response(await UserController.list_users(limit, cursor), UserListResponse)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.get("/search", response_model=UserSearchResponse)
+async def search_users(
+    q: str = Query(..., min_length=settings.search_min_length, max_length=200, description="Texto a buscar"),
+    location: Optional[str] = Query(None, max_length=100, description="Prefijo de la ubicación"),
+    limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max),
+    offset: int = Query(0, ge=0, le=settings.search_max_offset)
+):
+    """
+    Busca usuarios activos
+    
+    Coincide por prefijo del nombre o del email y por texto completo sobre
+    nombre y biografía. Las coincidencias por prefijo aparecen primero y el
+    resto se ordena por relevancia. El texto debe tener al menos
+    search_min_length caracteres.
+    """
+    return model_response(await UserController.search_users(q, location, limit, offset), UserSearchResponse)
+
+@router.get("/export")
+async def export_users(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Formato de salida"),
+    columns: Optional[str] = Query(None, description="Columnas separadas por coma (por defecto todas)"),
+    updated_since: Optional[datetime] = Query(None, description="Solo filas actualizadas desde esta fecha")
+):
+    """
+    Exporta la tabla de usuarios completa en streaming
+    
+    Las filas se leen con un cursor del servidor y se envían por bloques,
+    por lo que la memoria usada no depende del tamaño de la tabla.
+    Incluye usuarios activos e inactivos.
+    """
+    selected = [col.strip() for col in columns.split(",") if col.strip()] if columns else list(EXPORT_COLUMNS)
+    invalid = [col for col in selected if col not in EXPORT_COLUMNS]
+    if invalid or not selected:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Columnas inválidas: {', '.join(invalid)}. Permitidas: {', '.join(EXPORT_COLUMNS)}"
+        )
+    
+    async def stream():
+        if format == "csv":
+            yield csv_header(selected)
+        async for rows in UserController.export_users(selected, updated_since):
+            yield format_chunk(rows, selected, format)
+    
+    return StreamingResponse(
+        stream(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+    )
+
+@router.get("/changes")
+async def stream_changes(
+    after: Optional[str] = Query(None, description="Reanudar después de este cursor de cambio (tx-id)"),
+    last_event_id: Optional[str] = Header(None, description="ID del último evento recibido (lo envía EventSource al reconectar)")
+):
+    """
+    Stream de cambios de usuarios (Server-Sent Events)
+    
+    Cada evento (insert, update o delete) lleva como ID su cursor "tx-id"; al
+    reconectar con Last-Event-ID o ?after= se reenvían primero los cambios
+    posteriores guardados en user_changes.
+    """
+    token = last_event_id if last_event_id is not None else after
+    cursor = None
+    if token is not None:
+        try:
+            cursor = parse_cursor(token)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de cambios inválido")
+    
+    if not change_feed.available():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Feed de cambios no disponible",
+            headers={"Retry-After": str(settings.admission_retry_after)}
+        )
+    return StreamingResponse(
+        change_feed.stream(cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/bulk", response_model=BulkImportResponse)
+async def bulk_import_users(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = Query(None, description="Formato del cuerpo (por defecto según Content-Type)")
+):
+    """
+    Importa usuarios de forma masiva desde un cuerpo NDJSON o CSV
+    
+    El cuerpo se lee en streaming y se valida por lotes; cada lote se carga
+    con COPY y se inserta con ON CONFLICT (email). La respuesta indica por
+    fila si fue creada, duplicada o inválida. Si una línea no es UTF-8 la
+    importación se detiene en ella: las filas anteriores se cargan y esa se
+    informa como inválida. Una fila de más de import_max_line_bytes se informa
+    como inválida sin leerla entera en memoria y la importación continúa.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    parse_rows = iter_csv_rows if format == "csv" else iter_ndjson_rows
+    
+    report = []
+    batch: list[tuple[int, UserCreate]] = []
+    
+    async def flush():
+        ids = await UserController.bulk_create_users([user for _, user in batch])
+        for (row_number, user), user_id in zip(batch, ids):
+            report.append({
+                "row": row_number,
+                "status": "created" if user_id else "duplicate",
+                "id": user_id,
+                "email": user.email
+            })
+        batch.clear()
+    
+    # Los lotes ya cargados quedan confirmados aunque una fila posterior falle;
+    # una fila que no es UTF-8 llega como inválida y es la última del flujo
+    async for row_number, data in parse_rows(request.stream()):
+        if isinstance(data, str):
+            report.append({"row": row_number, "status": "invalid", "errors": [data]})
+            continue
+        try:
+            user = UserCreate.model_validate({key: data[key] for key in IMPORT_FIELDS if key in data})
+        except ValidationError as e:
+            report.append({
+                "row": row_number,
+                "status": "invalid",
+                "email": data.get("email") if isinstance(data.get("email"), str) else None,
+                "errors": [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()]
+            })
+            continue
+        batch.append((row_number, user))
+        if len(batch) >= settings.import_batch_size:
+            await flush()
+    if batch:
+        await flush()
+    
+    report.sort(key=lambda item: item["row"])
+    return {
+        "created": sum(1 for item in report if item["status"] == "created"),
+        "duplicates": sum(1 for item in report if item["status"] == "duplicate"),
+        "invalid": sum(1 for item in report if item["status"] == "invalid"),
+        "rows": report
+    }
+
+@router.post("/batch-get", response_model=BatchGetResponse)
+async def batch_get_profiles(payload: BatchGetRequest):
+    """
+    Obtiene varios perfiles de usuario en una sola petición
+    
+    Devuelve los perfiles en el orden solicitado (sin repetir IDs) y
+    la lista de IDs que no existen o pertenecen a cuentas inactivas.
+    """
+    if len(payload.ids) > settings.batch_get_max_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Se permiten como máximo {settings.batch_get_max_ids} IDs por petición"
+        )
+    
+    found = await UserController.get_users_by_ids(payload.ids)
+    requested = list(dict.fromkeys(payload.ids))
+    return model_response({
+        "users": [found[user_id] for user_id in requested if user_id in found],
+        "missing": [user_id for user_id in requested if user_id not in found]
+    }, BatchGetResponse)
 
 @router.get("/{user_id}/profile", response_model=UserProfileResponse)
 async def get_user_profile(
+    request: Request,
+    response: Response,
     user_id: int = Path(..., description="ID del usuario", gt=0)
 ):
     """
     Obtiene el perfil completo del usuario
     
-    Permite a un usuario acceder a toda su información personal almacenada
+    Permite a un usuario acceder a toda su información personal almacenada.
+    Admite peticiones condicionales (If-None-Match / If-Modified-Since):
+    si el perfil no cambió responde 304 sin cuerpo.
     """
-    user = UserController.get_user_by_id(user_id)
+    not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Usuario con ID {user_id} no encontrado o cuenta inactiva"
+    )
+    
+    if has_conditional_headers(request):
+        version = await UserController.get_user_version(user_id)
+        if not version:
+            raise not_found
+        etag = make_etag(user_id, version["version"])
+        if is_not_modified(request, etag, version["updated_at"]):
+            return not_modified_response(etag, version["updated_at"])
+    
+    user = await UserController.get_user_by_id(user_id)
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Usuario con ID {user_id} no encontrado o cuenta inactiva"
-        )
-    return user
+        raise not_found
+    response.headers.update(cache_headers(make_etag(user_id, user["version"]), user["updated_at"]))
+    return model_response(user, UserProfileResponse, response)
 
 @router.put("/{user_id}/profile", response_model=UserResponse)
 async def update_user_profile(
+    response: Response,
     user_id: int = Path(..., description="ID del usuario", gt=0),
-    user_data: UserUpdate = None
+    user_data: UserUpdate = None,
+    if_match: Optional[str] = Header(None, description="ETag del perfil leído; si cambió se responde 412")
 ):
     """
     Actualiza la información personal del usuario
@@ -65,15 +289,36 @@ async def update_user_profile(
     - Biografía
     - Ubicación
     
-    Solo se actualizan los campos proporcionados (actualización parcial)
+    Solo se actualizan los campos proporcionados (actualización parcial).
+    Con el encabezado If-Match la actualización solo se aplica si el perfil
+    no cambió desde que se leyó (y sigue existiendo); en caso contrario
+    responde 412.
     """
-    result = UserController.update_user_profile(user_id, user_data)
-    if not result:
+    expected_version = None
+    if if_match is not None and if_match.strip() != "*":
+        # Se usa la primera etiqueta que corresponda a este usuario
+        versions = [parse_etag(tag, user_id) for tag in if_match.split(",")]
+        expected_version = next((version for version in versions if version is not None), None)
+        if expected_version is None:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="El encabezado If-Match no corresponde a este perfil"
+            )
+    
+    result = await UserController.update_user_profile(user_id, user_data or UserUpdate(), expected_version)
+    if result.conflict:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="El perfil fue modificado por otra petición; vuelve a leerlo e intenta de nuevo"
+        )
+    if result.not_found:
+        # RFC 9110: If-Match (incluso "*") no se cumple si el perfil no existe
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED if if_match is not None else status.HTTP_404_NOT_FOUND,
             detail=f"Usuario con ID {user_id} no encontrado o cuenta inactiva"
         )
-    return result
+    response.headers["ETag"] = make_etag(user_id, result.user["version"])
+    return result.user
 
 @router.delete("/{user_id}/account", response_model=DeleteAccountResponse)
 async def delete_user_account(
@@ -91,7 +336,7 @@ async def delete_user_account(
     
     Esta operación NO puede deshacerse.
     """
-    deleted_user = UserController.delete_user_account(user_id)
+    deleted_user = await UserController.delete_user_account(user_id)
     if not deleted_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -116,7 +361,7 @@ async def deactivate_account(
     - Mantener los datos en el sistema
     - Posibilidad de reactivación futura
     """
-    result = UserController.deactivate_user_account(user_id)
+    result = await UserController.deactivate_user_account(user_id)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,29 +1,84 @@
-from fastapi import APIRouter, Request, Form, HTTPException
+from fastapi import APIRouter, Request, Form, HTTPException, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from pathlib import Path
 from typing import Optional
+from urllib.parse import urlencode
 from app.controllers.user_controller import UserController
 from app.models.user import UserCreate, UserUpdate
+from app.config import settings
+from app.templating import templates, stream_template
+from app.utils.http_cache import (
+    cache_headers,
+    has_conditional_headers,
+    is_not_modified,
+    make_etag,
+    not_modified_response,
+    page_etag
+)
 
 router = APIRouter(prefix="/web", tags=["Web Interface"])
 
-# Configurar templates
-BASE_DIR = Path(__file__).resolve().parent.parent
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
-
 @router.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Página de inicio"""
     return templates.TemplateResponse("index.html", {"request": request})
 
 @router.get("/users", response_class=HTMLResponse)
-async def list_users(request: Request):
-    """Lista todos los usuarios"""
-    users = UserController.get_all_users()
-    return templates.TemplateResponse(
+async def list_users(
+    request: Request,
+    cursor: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=200),
+    location: Optional[str] = Query(None, max_length=100),
+    offset: int = Query(0, ge=0, le=settings.search_max_offset),
+    limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max)
+):
+    """Lista los usuarios paginados por cursor, o los resultados de una búsqueda"""
+    next_url = prev_url = None
+    
+    if q and q.strip():
+        if len(q.strip()) < settings.search_min_length:
+            raise HTTPException(
+                status_code=400,
+                detail=f"La búsqueda necesita al menos {settings.search_min_length} caracteres"
+            )
+        # Búsqueda: resultados por relevancia paginados por offset
+        page = await UserController.search_users(q, location, limit, offset)
+        params = {"q": q, "location": location or "", "limit": limit}
+        if page["has_more"] and offset + limit <= settings.search_max_offset:
+            next_url = f"/web/users?{urlencode({**params, 'offset': offset + limit})}"
+        if offset > 0:
+            prev_url = f"/web/users?{urlencode({**params, 'offset': max(offset - limit, 0)})}"
+    else:
+        try:
+            page = await UserController.list_users(limit, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+        if page["next_cursor"]:
+            next_url = f"/web/users?{urlencode({'cursor': page['next_cursor'], 'limit': limit})}"
+        if page["prev_cursor"]:
+            prev_url = f"/web/users?{urlencode({'cursor': page['prev_cursor'], 'limit': limit})}"
+    
+    # La página cambia si cambia alguna de sus filas. La consulta se ejecuta
+    # igualmente: el 304 solo ahorra renderizar y enviar la página. Un
+    # validador previo con max(updated_at)/count(*) no es fiable: updated_at
+    # es el inicio de la transacción, así que una que confirme tarde no mueve
+    # el máximo, y una edición no cambia el recuento
+    etag = page_etag(page["items"], next_url, prev_url)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    # La lista se envía en streaming: el tiempo hasta el primer byte no crece con la página
+    return stream_template(
+        request,
         "users_list.html",
-        {"request": request, "users": users}
+        {
+            "users": page["items"],
+            "q": q,
+            "location": location,
+            "search_min_length": settings.search_min_length,
+            "next_url": next_url,
+            "prev_url": prev_url
+        },
+        headers=cache_headers(etag)
     )
 
 @router.get("/users/create", response_class=HTMLResponse)
@@ -42,9 +97,16 @@ async def create_user_submit(
 ):
     """Procesar creación de usuario"""
     try:
-        # Verificar si el email ya existe
-        existing_user = UserController.get_user_by_email(email)
-        if existing_user:
+        # Crear usuario (el email duplicado se detecta en el mismo INSERT)
+        user_data = UserCreate(
+            email=email,
+            full_name=full_name,
+            phone=phone,
+            bio=bio,
+            location=location
+        )
+        result = await UserController.create_user(user_data)
+        if result.duplicate:
             return templates.TemplateResponse(
                 "create_user.html",
                 {
@@ -58,19 +120,9 @@ async def create_user_submit(
                 }
             )
         
-        # Crear usuario
-        user_data = UserCreate(
-            email=email,
-            full_name=full_name,
-            phone=phone,
-            bio=bio,
-            location=location
-        )
-        new_user = UserController.create_user(user_data)
-        
         # Redirigir al perfil del usuario creado
         return RedirectResponse(
-            url=f"/web/users/{new_user['id']}/profile",
+            url=f"/web/users/{result.user['id']}/profile",
             status_code=303
         )
     except Exception as e:
@@ -89,20 +141,29 @@ async def create_user_submit(
 
 @router.get("/users/{user_id}/profile", response_class=HTMLResponse)
 async def view_profile(request: Request, user_id: int):
-    """Ver perfil de usuario"""
-    user = UserController.get_user_by_id(user_id)
+    """Ver perfil de usuario (responde 304 si el navegador ya tiene la versión actual)"""
+    if has_conditional_headers(request):
+        version = await UserController.get_user_version(user_id)
+        if not version:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        etag = make_etag(user_id, version["version"])
+        if is_not_modified(request, etag, version["updated_at"]):
+            return not_modified_response(etag, version["updated_at"])
+    
+    user = await UserController.get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
     return templates.TemplateResponse(
         "view_profile.html",
-        {"request": request, "user": user}
+        {"request": request, "user": user},
+        headers=cache_headers(make_etag(user_id, user["version"]), user["updated_at"])
     )
 
 @router.get("/users/{user_id}/edit", response_class=HTMLResponse)
 async def edit_profile_form(request: Request, user_id: int):
     """Formulario para editar perfil"""
-    user = UserController.get_user_by_id(user_id)
+    user = await UserController.get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
@@ -118,9 +179,10 @@ async def edit_profile_submit(
     full_name: str = Form(...),
     phone: Optional[str] = Form(None),
     bio: Optional[str] = Form(None),
-    location: Optional[str] = Form(None)
+    location: Optional[str] = Form(None),
+    version: Optional[int] = Form(None)
 ):
-    """Procesar actualización de perfil"""
+    """Procesar actualización de perfil (falla si otro cambio llegó antes)"""
     try:
         user_data = UserUpdate(
             full_name=full_name,
@@ -129,8 +191,19 @@ async def edit_profile_submit(
             location=location if location else None
         )
         
-        updated_user = UserController.update_user_profile(user_id, user_data)
-        if not updated_user:
+        result = await UserController.update_user_profile(user_id, user_data, version)
+        if result.conflict:
+            user = await UserController.get_user_by_id(user_id)
+            return templates.TemplateResponse(
+                "edit_profile.html",
+                {
+                    "request": request,
+                    "user": user,
+                    "error": "El perfil fue modificado mientras lo editabas. Revisa los datos actuales y vuelve a guardar."
+                },
+                status_code=409
+            )
+        if result.not_found:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
         return RedirectResponse(
@@ -138,7 +211,7 @@ async def edit_profile_submit(
             status_code=303
         )
     except Exception as e:
-        user = UserController.get_user_by_id(user_id)
+        user = await UserController.get_user_by_id(user_id)
         return templates.TemplateResponse(
             "edit_profile.html",
             {
@@ -151,7 +224,7 @@ async def edit_profile_submit(
 @router.post("/users/{user_id}/delete")
 async def delete_user_submit(user_id: int):
     """Eliminar usuario"""
-    deleted_user = UserController.delete_user_account(user_id)
+    deleted_user = await UserController.delete_user_account(user_id)
     if not deleted_user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
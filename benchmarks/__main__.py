@@ -0,0 +1,77 @@
+"""
+Suite de benchmarks
+
+Ejemplos:
+    python -m benchmarks seed --users 1000000
+    python -m benchmarks load --mode asgi --concurrency 1,8,32 --duration 10 --out asgi.json
+    python -m benchmarks load --mode http --workers 4 --concurrency 16,64 --out http.json
+    python -m benchmarks micro --iterations 2000 --out micro.json
+    python -m benchmarks compare base.json nuevo.json
+"""
+import argparse
+import asyncio
+from benchmarks import common, load, micro, seed
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part]
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    seed_parser = commands.add_parser("seed", help="Cargar usuarios sintéticos")
+    seed_parser.add_argument("--users", type=int, default=100_000)
+    seed_parser.add_argument("--batch-size", type=int, default=50_000)
+    seed_parser.add_argument("--reset", action="store_true", help="Borrar antes los usuarios de prueba")
+    
+    load_parser = commands.add_parser("load", help="Prueba de carga de las rutas")
+    load_parser.add_argument("--mode", choices=("asgi", "http"), default="asgi")
+    load_parser.add_argument("--scenarios", default=",".join(load.SCENARIOS))
+    load_parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32])
+    load_parser.add_argument("--duration", type=float, default=10.0, help="Segundos por nivel")
+    load_parser.add_argument("--warmup", type=float, default=2.0)
+    load_parser.add_argument("--url", help="Servidor ya en marcha (modo http)")
+    load_parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn (modo http)")
+    load_parser.add_argument("--port", type=int, default=8765)
+    load_parser.add_argument("--out")
+    
+    micro_parser = commands.add_parser("micro", help="Micro-benchmarks de controlador, plantillas y serialización")
+    micro_parser.add_argument("--iterations", type=int, default=1000)
+    micro_parser.add_argument("--warmup", type=int, default=100)
+    micro_parser.add_argument("--templates-only", action="store_true", help="No usar la base de datos")
+    micro_parser.add_argument("--out")
+    
+    compare_parser = commands.add_parser("compare", help="Comparar dos archivos de resultados")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    
+    args = parser.parse_args()
+    
+    if args.command == "seed":
+        seed.seed(args.users, args.batch_size, args.reset)
+    elif args.command == "load":
+        scenarios = [name for name in args.scenarios.split(",") if name]
+        unknown = set(scenarios) - set(load.SCENARIOS)
+        if unknown:
+            parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+        ids = seed.sample_user_ids()
+        if not ids:
+            parser.error("No hay usuarios activos; ejecuta primero: python -m benchmarks seed")
+        results = asyncio.run(load.run(
+            args.mode, scenarios, args.concurrency, ids, args.duration, args.warmup,
+            url=args.url, workers=args.workers, port=args.port
+        ))
+        if args.out:
+            common.save_results(args.out, "load", results, mode=args.mode, workers=args.workers,
+                                duration=args.duration)
+    elif args.command == "micro":
+        ids = [] if args.templates_only else seed.sample_user_ids()
+        results = asyncio.run(micro.run(ids, args.iterations, args.warmup, include_db=bool(ids)))
+        if args.out:
+            common.save_results(args.out, "micro", results, iterations=args.iterations)
+    elif args.command == "compare":
+        common.compare(args.baseline, args.candidate)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark de la ruta de lectura de perfiles (UserController.get_user_by_id)
+
+Compara la latencia con y sin prepared statements del servidor, con la caché
+de perfiles desactivada para medir solo el acceso a PostgreSQL.
+
+Uso:
+    python -m benchmarks.bench_profile_read --iterations 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from benchmarks.common import percentile
+from app.cache import profile_cache
+from app.config import settings
+from app.controllers.user_controller import UserController
+from app.database import db
+from app.models.user import UserCreate
+
+async def measure(user_id: int, iterations: int, prepared: bool) -> list[float]:
+    settings.db_prepared_statements = prepared
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await UserController.get_user_by_id(user_id)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+async def main(iterations: int, warmup: int):
+    await db.open()
+    await db.ensure_schema()
+    profile_cache.enabled = False
+    try:
+        result = await UserController.create_user(
+            UserCreate(email="bench-profile@example.com", full_name="Benchmark")
+        )
+        user = result.user or await UserController.get_user_by_email("bench-profile@example.com")
+        
+        for prepared in (False, True):
+            await measure(user["id"], warmup, prepared)
+            samples = await measure(user["id"], iterations, prepared)
+            label = "preparada" if prepared else "sin preparar"
+            print(
+                f"{label:>13}: p50={percentile(samples, 50):.3f} ms  "
+                f"p99={percentile(samples, 99):.3f} ms  "
+                f"media={statistics.fmean(samples):.3f} ms  (n={iterations})"
+            )
+    finally:
+        await db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations, args.warmup))
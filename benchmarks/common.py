@@ -0,0 +1,88 @@
+"""Utilidades compartidas por los benchmarks: estadísticas y resultados en JSON"""
+import json
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+def summarize(name: str, samples_ms: list[float], elapsed_s: float, errors: int = 0, **extra) -> dict:
+    """Resumen de una serie de latencias en milisegundos"""
+    if not samples_ms:
+        return {"name": name, "requests": 0, "errors": errors, **extra}
+    return {
+        "name": name,
+        **extra,
+        "requests": len(samples_ms),
+        "errors": errors,
+        "throughput_rps": round(len(samples_ms) / elapsed_s, 2) if elapsed_s else None,
+        "mean_ms": round(statistics.fmean(samples_ms), 3),
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p95_ms": round(percentile(samples_ms, 95), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+    }
+
+def print_result(result: dict):
+    if not result.get("requests"):
+        print(f"{result['name']:<40} sin muestras (errores={result.get('errors', 0)})")
+        return
+    concurrency = f"c={result['concurrency']:<4}" if "concurrency" in result else " " * 6
+    throughput = f"{result['throughput_rps']:>10.1f} req/s" if result.get("throughput_rps") else " " * 16
+    print(
+        f"{result['name']:<40} {concurrency} {throughput}  "
+        f"p50={result['p50_ms']:>8.3f}  p95={result['p95_ms']:>8.3f}  p99={result['p99_ms']:>8.3f} ms  "
+        f"errores={result['errors']}"
+    )
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_results(path: str | Path, kind: str, results: list[dict], **meta):
+    """Guarda los resultados con metadatos para poder comparar ejecuciones"""
+    document = {
+        "kind": kind,
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            **meta,
+        },
+        "results": results,
+    }
+    Path(path).write_text(json.dumps(document, indent=2, ensure_ascii=False))
+    print(f"💾 Resultados guardados en {path}")
+
+def compare(baseline_path: str | Path, candidate_path: str | Path):
+    """Compara dos archivos de resultados por nombre y concurrencia"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    candidate = json.loads(Path(candidate_path).read_text())
+    
+    def key(result):
+        return (result["name"], result.get("concurrency"))
+    
+    base_by_key = {key(result): result for result in baseline["results"]}
+    print(f"{'benchmark':<40} {'c':>5} {'métrica':>15} {'base':>10} {'nuevo':>10} {'cambio':>9}")
+    for result in candidate["results"]:
+        base = base_by_key.get(key(result))
+        if not base or not base.get("requests") or not result.get("requests"):
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p99_ms"):
+            before, after = base.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            print(
+                f"{result['name']:<40} {str(result.get('concurrency', '')):>5} {metric:>15} "
+                f"{before:>10.2f} {after:>10.2f} {change:>+8.1f}%"
+            )
@@ -0,0 +1,143 @@
+"""
+Prueba de carga de las rutas /api/users/* y /web/users*
+
+Dos modos:
+- asgi: la aplicación se ejecuta en el mismo proceso con httpx.ASGITransport
+  (sin red; mide el coste de la aplicación y de PostgreSQL).
+- http: se lanza uvicorn en otro proceso (o se usa --url) y se genera carga
+  real por HTTP con conexiones keep-alive.
+"""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Callable
+import httpx
+from benchmarks.common import summarize, print_result
+
+# Escenarios: nombre -> función que construye (método, url, cuerpo) para un ID aleatorio
+Scenario = Callable[[random.Random, list[int]], tuple[str, str, dict | None]]
+
+SEARCH_TERMS = ("ana", "juan", "gómez", "python", "café", "mar")
+
+SCENARIOS: dict[str, Scenario] = {
+    "api_get_profile": lambda rng, ids: ("GET", f"/api/users/{rng.choice(ids)}/profile", None),
+    "api_list_users": lambda rng, ids: ("GET", "/api/users/?limit=20", None),
+    "api_search_users": lambda rng, ids: ("GET", f"/api/users/search?q={rng.choice(SEARCH_TERMS)}", None),
+    "api_batch_get": lambda rng, ids: ("POST", "/api/users/batch-get", {"ids": rng.sample(ids, min(50, len(ids)))}),
+    "web_list_users": lambda rng, ids: ("GET", "/web/users", None),
+    "web_view_profile": lambda rng, ids: ("GET", f"/web/users/{rng.choice(ids)}/profile", None),
+}
+
+async def run_level(
+    client: httpx.AsyncClient,
+    name: str,
+    scenario: Scenario,
+    ids: list[int],
+    concurrency: int,
+    duration: float,
+    warmup: float
+) -> dict:
+    """Mantiene `concurrency` peticiones en vuelo durante `duration` segundos"""
+    samples: list[float] = []
+    errors = 0
+    
+    async def worker(seed: int, until: float, record: bool):
+        nonlocal errors
+        rng = random.Random(seed)
+        while time.perf_counter() < until:
+            method, url, body = scenario(rng, ids)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                ok = response.status_code < 500
+            except httpx.HTTPError:
+                ok = False
+            if record:
+                if ok:
+                    samples.append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+    
+    if warmup:
+        until = time.perf_counter() + warmup
+        await asyncio.gather(*(worker(i, until, False) for i in range(concurrency)))
+    
+    start = time.perf_counter()
+    until = start + duration
+    await asyncio.gather(*(worker(i, until, True) for i in range(concurrency)))
+    return summarize(name, samples, time.perf_counter() - start, errors, concurrency=concurrency)
+
+@asynccontextmanager
+async def asgi_client(max_connections: int):
+    """Cliente contra la aplicación en proceso, ejecutando su lifespan"""
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client
+
+@asynccontextmanager
+async def http_client(url: str | None, workers: int, port: int, max_connections: int):
+    """Cliente HTTP contra un servidor externo o un uvicorn lanzado para la prueba"""
+    process = None
+    if url is None:
+        url = f"http://127.0.0.1:{port}"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+             "--log-level", "warning", "--no-access-log"],
+            env={**os.environ},
+        )
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    try:
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+            await _wait_ready(client)
+            yield client
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+async def _wait_ready(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("El servidor no quedó listo a tiempo")
+
+async def run(
+    mode: str,
+    scenarios: list[str],
+    concurrency_levels: list[int],
+    ids: list[int],
+    duration: float,
+    warmup: float,
+    url: str | None = None,
+    workers: int = 1,
+    port: int = 8765
+) -> list[dict]:
+    max_connections = max(concurrency_levels)
+    if mode == "asgi":
+        context = asgi_client(max_connections)
+    else:
+        context = http_client(url, workers, port, max_connections)
+    
+    results = []
+    async with context as client:
+        for name in scenarios:
+            for concurrency in concurrency_levels:
+                result = await run_level(
+                    client, name, SCENARIOS[name], ids, concurrency, duration, warmup
+                )
+                result["mode"] = mode
+                print_result(result)
+                results.append(result)
+    return results
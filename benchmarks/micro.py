@@ -0,0 +1,134 @@
+"""
+Micro-benchmarks de métodos del controlador y del renderizado de plantillas
+
+Los métodos del controlador se miden con la caché de perfiles desactivada
+para aislar el coste de la base de datos.
+"""
+import time
+from datetime import datetime
+from typing import Awaitable, Callable
+from benchmarks.common import summarize, print_result
+
+async def _time_async(name: str, func: Callable[[], Awaitable], iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await func()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        begin = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - begin) * 1000)
+    return summarize(name, samples, time.perf_counter() - start)
+
+def _time_sync(name: str, func: Callable[[], object], iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        func()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        begin = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - begin) * 1000)
+    return summarize(name, samples, time.perf_counter() - start)
+
+def fake_users(count: int) -> list[dict]:
+    now = datetime.now()
+    return [
+        {
+            "id": i,
+            "email": f"user{i}@bench.example.com",
+            "full_name": f"Usuario de Prueba {i}",
+            "phone": "+57 300 1234567",
+            "bio": "Biografía de ejemplo " * 8,
+            "location": "Bogotá, Colombia",
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+            "version": 1,
+        }
+        for i in range(count)
+    ]
+
+def template_benchmarks(iterations: int, warmup: int) -> list[dict]:
+    """Renderizado de plantillas con datos sintéticos (no requiere base de datos)"""
+    from starlette.requests import Request
+    from app.main import app
+    from app.views.user_web_view import templates
+    
+    scope = {
+        "type": "http", "method": "GET", "path": "/web/users", "root_path": "",
+        "query_string": b"", "headers": [], "app": app, "router": app.router,
+    }
+    request = Request(scope)
+    results = []
+    for count in (20, 100, 1000):
+        users = fake_users(count)
+        template = templates.get_template("users_list.html")
+        results.append(_time_sync(
+            f"render users_list.html ({count})",
+            lambda: template.render(request=request, users=users, next_url="/web/users?cursor=x"),
+            iterations, warmup
+        ))
+    profile = fake_users(1)[0]
+    template = templates.get_template("view_profile.html")
+    results.append(_time_sync(
+        "render view_profile.html",
+        lambda: template.render(request=request, user=profile),
+        iterations, warmup
+    ))
+    return results
+
+def serialization_benchmarks(iterations: int, warmup: int) -> list[dict]:
+    """Serialización de 1000 perfiles: validación de pydantic frente a orjson (no requiere base de datos)"""
+    from fastapi.encoders import jsonable_encoder
+    from app.models.user import UserListResponse
+    from app.utils.fast_json import orjson, shape
+    
+    page = {"items": fake_users(1000), "limit": 1000, "next_cursor": None, "prev_cursor": None}
+    results = [
+        _time_sync(
+            "json pydantic (1000)",
+            lambda: UserListResponse.model_validate(page).model_dump_json(),
+            iterations, warmup
+        ),
+        _time_sync(
+            "json jsonable_encoder (1000)",
+            lambda: jsonable_encoder(UserListResponse.model_validate(page)),
+            iterations, warmup
+        ),
+    ]
+    if orjson is not None:
+        results.append(_time_sync(
+            "json orjson (1000)",
+            lambda: orjson.dumps(shape(page, UserListResponse)),
+            iterations, warmup
+        ))
+    return results
+
+async def controller_benchmarks(ids: list[int], iterations: int, warmup: int) -> list[dict]:
+    """Métodos del controlador contra la base de datos configurada"""
+    import random
+    from app.cache import profile_cache
+    from app.controllers.user_controller import UserController
+    from app.database import db
+    
+    rng = random.Random(7)
+    await db.open()
+    profile_cache.enabled = False
+    try:
+        return [
+            await _time_async("get_user_by_id", lambda: UserController.get_user_by_id(rng.choice(ids)), iterations, warmup),
+            await _time_async("get_users_by_ids (50)", lambda: UserController.get_users_by_ids(rng.sample(ids, min(50, len(ids)))), iterations, warmup),
+            await _time_async("list_users (20)", lambda: UserController.list_users(20), iterations, warmup),
+            await _time_async("search_users", lambda: UserController.search_users("ana"), iterations, warmup),
+        ]
+    finally:
+        await db.close()
+
+async def run(ids: list[int], iterations: int, warmup: int, include_db: bool = True) -> list[dict]:
+    results = template_benchmarks(iterations, warmup) + serialization_benchmarks(iterations, warmup)
+    if include_db:
+        results += await controller_benchmarks(ids, iterations, warmup)
+    for result in results:
+        print_result(result)
+    return results
@@ -0,0 +1,79 @@
+"""
+Carga usuarios sintéticos en PostgreSQL para los benchmarks
+
+Los usuarios se insertan con COPY y usan el dominio bench.example.com,
+de modo que --reset solo borra los datos generados por este script.
+"""
+import random
+import time
+import psycopg
+from app.config import settings
+
+SEED_DOMAIN = "bench.example.com"
+
+FIRST_NAMES = ("Ana", "Juan", "María", "Pedro", "Lucía", "Carlos", "Sofía", "Diego", "Valentina", "Andrés")
+LAST_NAMES = ("Gómez", "Rodríguez", "Pérez", "Martínez", "López", "García", "Torres", "Ramírez", "Rojas", "Díaz")
+CITIES = ("Bogotá", "Medellín", "Cali", "Barranquilla", "Cartagena", "Madrid", "Lima", "Quito", "Santiago", "México")
+WORDS = (
+    "desarrollador", "diseñadora", "python", "datos", "música", "fotografía", "viajes",
+    "café", "montaña", "lectura", "startup", "profesora", "ingeniero", "arte", "cocina",
+)
+
+def _generate(start: int, count: int, rng: random.Random):
+    now = time.time()
+    for i in range(start, start + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield (
+            f"user{i}@{SEED_DOMAIN}",
+            f"{first} {last} {i}",
+            f"+57 300 {rng.randint(1000000, 9999999)}",
+            " ".join(rng.choices(WORDS, k=rng.randint(5, 20))),
+            rng.choice(CITIES),
+            # Fechas repartidas hacia atrás para que la paginación recorra datos realistas
+            time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - (start + count - i) * 7)),
+        )
+
+def seed(users: int, batch_size: int = 50_000, reset: bool = False, database_url: str = settings.database_url):
+    """Inserta hasta `users` usuarios de prueba (continúa desde los que ya existan)"""
+    rng = random.Random(42)
+    with psycopg.connect(database_url) as conn:
+        if reset:
+            conn.execute("DELETE FROM users WHERE email LIKE %s", (f"%@{SEED_DOMAIN}",))
+            conn.commit()
+        
+        existing = conn.execute(
+            "SELECT count(*) FROM users WHERE email LIKE %s", (f"%@{SEED_DOMAIN}",)
+        ).fetchone()[0]
+        if existing >= users:
+            print(f"✅ Ya hay {existing} usuarios de prueba")
+            return
+        
+        start = time.perf_counter()
+        inserted = existing
+        while inserted < users:
+            count = min(batch_size, users - inserted)
+            with conn.cursor() as cur:
+                with cur.copy(
+                    "COPY users (email, full_name, phone, bio, location, created_at) FROM STDIN"
+                ) as copy:
+                    for row in _generate(inserted, count, rng):
+                        copy.write_row(row)
+            conn.commit()
+            inserted += count
+            print(f"   {inserted}/{users} usuarios")
+        
+        conn.execute("ANALYZE users")
+        elapsed = time.perf_counter() - start
+        print(f"✅ {users - existing} usuarios insertados en {elapsed:.1f} s")
+
+def sample_user_ids(limit: int = 1000, database_url: str = settings.database_url) -> list[int]:
+    """IDs de usuarios activos para repartir la carga entre perfiles distintos"""
+    with psycopg.connect(database_url) as conn:
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM users TABLESAMPLE SYSTEM (1) WHERE is_active LIMIT %s", (limit,)
+        )]
+        if len(ids) < limit:
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM users WHERE is_active ORDER BY random() LIMIT %s", (limit,)
+            )]
+    return ids
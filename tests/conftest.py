@@ -0,0 +1,41 @@
+"""
+Fixtures comunes de los tests
+
+Los tests que necesitan PostgreSQL usan la base de datos de TEST_DATABASE_URL
+(se migra al empezar la sesión) y se saltan si no está definida. Nunca se usa
+DATABASE_URL para no tocar datos de desarrollo.
+"""
+import os
+import uuid
+import httpx
+import pytest
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+# Settings exige DATABASE_URL al importarse app.config
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL or "postgresql://localhost/unused"
+
+from app.database import db
+from app.migrations import migrate
+
+@pytest.fixture(scope="session")
+async def database():
+    """Pool de app.database abierto sobre la base de datos de test ya migrada"""
+    if TEST_DATABASE_URL is None:
+        pytest.skip("TEST_DATABASE_URL no está definida")
+    await migrate(TEST_DATABASE_URL)
+    await db.open()
+    yield db
+    await db.close()
+
+@pytest.fixture
+def unique_email():
+    """Genera emails que no chocan entre tests ni entre ejecuciones"""
+    return lambda prefix="user": f"{prefix}-{uuid.uuid4().hex[:12]}@example.com"
+
+@pytest.fixture
+async def client(database):
+    """Cliente HTTP contra la aplicación (el pool ya lo abre la fixture database)"""
+    from app.main import app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http
@@ -0,0 +1,44 @@
+"""Dobles de prueba de las interfaces extensibles de la aplicación"""
+import copy
+from typing import Optional
+from app.cache import CacheBackend
+
+class FakeSharedCache(CacheBackend):
+    """
+    Backend compartido en memoria que se comporta como uno remoto
+    
+    Guarda copias de los valores (como si los serializara), de modo que
+    mutar lo devuelto no altera lo almacenado; varias ProfileCache pueden
+    compartir la misma instancia para simular varios workers. El reloj es
+    manual: advance() hace caducar las entradas sin esperar.
+    """
+    
+    def __init__(self):
+        self.now = 0.0
+        self.entries: dict[str, tuple[float, dict]] = {}
+        self.calls: list[tuple[str, str]] = []
+    
+    def advance(self, seconds: float):
+        self.now += seconds
+    
+    async def get(self, key: str) -> Optional[dict]:
+        self.calls.append(("get", key))
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= self.now:
+            self.entries.pop(key, None)
+            return None
+        return copy.deepcopy(entry[1])
+    
+    async def set(self, key: str, value: dict, ttl: float) -> None:
+        self.calls.append(("set", key))
+        self.entries[key] = (self.now + ttl, copy.deepcopy(value))
+    
+    async def delete(self, key: str) -> None:
+        self.calls.append(("delete", key))
+        self.entries.pop(key, None)
+    
+    async def clear(self) -> None:
+        self.entries.clear()
+    
+    def stats(self) -> dict:
+        return {"size": len(self.entries)}
@@ -0,0 +1,42 @@
+import asyncio
+from app.config import settings
+
+async def test_admin_api_is_closed_without_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", None)
+    
+    response = await client.get("/api/admin/jobs/", headers={"Authorization": "Bearer anything"})
+    
+    assert response.status_code == 503
+
+async def test_admin_api_requires_the_configured_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    
+    assert (await client.get("/api/admin/jobs/")).status_code == 401
+    assert (await client.get("/api/admin/jobs/", headers={"Authorization": "Bearer wrong"})).status_code == 401
+    assert (await client.post("/api/admin/jobs/", json={})).status_code == 401
+    
+    assert (await client.get("/api/admin/jobs/", headers={"Authorization": "Bearer s3cret"})).status_code == 200
+    assert (await client.get("/api/admin/jobs/", headers={"X-Admin-Token": "s3cret"})).status_code == 200
+
+async def test_admin_job_runs_in_background(client, monkeypatch, unique_email):
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    monkeypatch.setattr(settings, "job_batch_pause", 0.01)
+    headers = {"Authorization": "Bearer s3cret"}
+    created = await client.post("/api/users/", json={"email": unique_email(), "full_name": "Admin Job"})
+    user_id = created.json()["id"]
+    
+    response = await client.post("/api/admin/jobs/", json={"action": "deactivate", "ids": [user_id]}, headers=headers)
+    
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    for _ in range(50):
+        job = (await client.get(f"/api/admin/jobs/{job_id}", headers=headers)).json()
+        if job["status"] == "completed":
+            break
+        await asyncio.sleep(0.02)
+    assert (job["status"], job["processed"], job["last_id"]) == ("completed", 1, user_id)
+    assert (await client.get(f"/api/users/{user_id}/profile")).status_code == 404
+    
+    resumed = await client.post(f"/api/admin/jobs/{job_id}/resume", headers=headers)
+    assert resumed.status_code == 409
+    assert (await client.post("/api/admin/jobs/999999999/resume", headers=headers)).status_code == 404
@@ -0,0 +1,51 @@
+import asyncio
+from app.config import settings
+from app.middleware import AdmissionControlMiddleware, _TokenBuckets
+
+def test_token_buckets_evict_least_recently_seen_client():
+    buckets = _TokenBuckets(rate=1.0, burst=1, max_clients=2)
+    assert buckets.allow("a")
+    assert buckets.allow("b")
+    assert not buckets.allow("a")  # "a" pasa a ser el más reciente
+    
+    assert buckets.allow("c")      # desaloja a "b"
+    
+    assert list(buckets._buckets) == ["a", "c"]
+    assert not buckets.allow("a")  # "a" conserva su estado
+
+def test_bulk_routes_have_their_own_groups():
+    middleware = AdmissionControlMiddleware(app=None)
+    
+    assert middleware._group_for("/api/users/export").prefix == "/api/users/export"
+    assert middleware._group_for("/api/users/bulk").prefix == "/api/users/bulk"
+    assert middleware._group_for("/api/users/42/profile").prefix == "/api/users"
+
+async def test_running_exports_do_not_take_api_slots(monkeypatch):
+    monkeypatch.setattr(settings, "admission_limits", {"/api/users/export": 1, "/api/users": 1})
+    monkeypatch.setattr(settings, "admission_queue_timeout", 0.1)
+    release_export = asyncio.Event()
+    
+    async def app(scope, receive, send):
+        if scope["path"] == "/api/users/export":
+            await release_export.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+    
+    middleware = AdmissionControlMiddleware(app)
+    
+    async def call(path: str) -> int:
+        messages = []
+        async def receive():
+            return {"type": "http.request", "body": b""}
+        async def send(message):
+            messages.append(message)
+        await middleware({"type": "http", "path": path, "client": ("127.0.0.1", 1)}, receive, send)
+        return messages[0]["status"]
+    
+    export = asyncio.create_task(call("/api/users/export"))
+    await asyncio.sleep(0)
+    
+    assert await call("/api/users/1/profile") == 200
+    assert await call("/api/users/export") == 503
+    release_export.set()
+    assert await export == 200
@@ -0,0 +1,97 @@
+import json
+from app.config import settings
+from app.utils.importers import OverlongLine, iter_lines
+
+async def test_bulk_import_reports_each_row(client, unique_email):
+    existing = unique_email()
+    await client.post("/api/users/", json={"email": existing, "full_name": "Ya Existe"})
+    created = unique_email()
+    body = "\n".join([
+        json.dumps({"email": created, "full_name": "Nueva Persona"}),
+        json.dumps({"email": existing, "full_name": "Ya Existe"}),
+        json.dumps({"email": "no-es-un-email", "full_name": "Mala"}),
+        "{roto",
+    ])
+    
+    response = await client.post("/api/users/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["created"], report["duplicates"], report["invalid"]) == (1, 1, 2)
+    assert [row["status"] for row in report["rows"]] == ["created", "duplicate", "invalid", "invalid"]
+
+async def test_bulk_import_stops_at_undecodable_line(client, unique_email):
+    first, second, after = unique_email(), unique_email(), unique_email()
+    body = b"\n".join([
+        json.dumps({"email": first, "full_name": "Primera"}).encode(),
+        json.dumps({"email": second, "full_name": "Segunda"}).encode(),
+        b'{"email": "x@example.com", "full_name": "\xff\xfe"}',
+        json.dumps({"email": after, "full_name": "Nunca"}).encode(),
+    ])
+    
+    response = await client.post("/api/users/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    
+    assert response.status_code == 200
+    report = response.json()
+    assert report["created"] == 2
+    assert report["rows"][-1]["row"] == 3
+    assert report["rows"][-1]["status"] == "invalid"
+    assert "UTF-8" in report["rows"][-1]["errors"][0]
+    assert len(report["rows"]) == 3
+    # Lo cargado antes de la línea inválida queda confirmado
+    loaded = await client.post("/api/users/batch-get", json={"ids": [row["id"] for row in report["rows"][:2]]})
+    assert [user["email"] for user in loaded.json()["users"]] == [first, second]
+
+async def test_bulk_import_csv_stops_at_undecodable_line(client, unique_email):
+    email = unique_email()
+    body = f"email,full_name\n{email},Primera\n".encode() + b"bad@example.com,\xff\n"
+    
+    response = await client.post("/api/users/bulk", params={"format": "csv"}, content=body)
+    
+    report = response.json()
+    assert report["created"] == 1
+    assert report["rows"][-1]["row"] == 2
+    assert report["rows"][-1]["status"] == "invalid"
+
+async def test_bulk_import_skips_overlong_lines(client, unique_email, monkeypatch):
+    monkeypatch.setattr(settings, "import_max_line_bytes", 200)
+    before, after = unique_email(), unique_email()
+    body = "\n".join([
+        json.dumps({"email": before, "full_name": "Antes"}),
+        json.dumps({"email": unique_email(), "full_name": "x" * 500}),
+        json.dumps({"email": after, "full_name": "Después"}),
+    ])
+    
+    response = await client.post("/api/users/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    
+    report = response.json()
+    assert [row["status"] for row in report["rows"]] == ["created", "invalid", "created"]
+    assert "200 bytes" in report["rows"][1]["errors"][0]
+    assert report["rows"][2]["email"] == after
+
+async def test_bulk_import_csv_skips_overlong_quoted_record(client, unique_email, monkeypatch):
+    monkeypatch.setattr(settings, "import_max_line_bytes", 200)
+    after = unique_email()
+    # El campo largo abre comillas en una línea y las cierra en la siguiente
+    body = f'email,full_name,bio\nlong@example.com,Larga,"{"y" * 300}\n{"y" * 300}"\n{after},Después,\n'
+    
+    response = await client.post("/api/users/bulk", params={"format": "csv"}, content=body.encode())
+    
+    report = response.json()
+    assert [(row["row"], row["status"]) for row in report["rows"]] == [(1, "invalid"), (2, "created")]
+    assert report["rows"][1]["email"] == after
+
+async def test_iter_lines_never_buffers_a_line_past_the_limit(monkeypatch):
+    monkeypatch.setattr(settings, "import_max_line_bytes", 10)
+    
+    async def chunks():
+        yield b"corta\n" + b"a" * 8
+        for _ in range(1000):
+            yield b"a" * 8
+        yield b'"\nfin'
+    
+    lines = [line async for line in iter_lines(chunks())]
+    
+    assert lines[0] == "corta"
+    assert isinstance(lines[1], OverlongLine) and lines[1].quotes == 1
+    assert lines[2:] == ["fin"]
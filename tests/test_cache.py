@@ -0,0 +1,73 @@
+import pytest
+from app.cache import LocalCache, ProfileCache, profile_cache
+from app.controllers.user_controller import UserController
+from app.models.user import UserCreate, UserUpdate
+from tests.fakes import FakeSharedCache
+
+@pytest.fixture
+def shared_backend(monkeypatch):
+    """Sustituye el backend de la caché de perfiles por el fake compartido"""
+    backend = FakeSharedCache()
+    monkeypatch.setattr(profile_cache, "backend", backend)
+    monkeypatch.setattr(profile_cache, "enabled", True)
+    return backend
+
+async def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(max_size=2)
+    await cache.set("a", {"id": 1}, ttl=60)
+    await cache.set("b", {"id": 2}, ttl=60)
+    await cache.get("a")
+    await cache.set("c", {"id": 3}, ttl=60)
+    
+    assert await cache.get("b") is None
+    assert await cache.get("a") == {"id": 1}
+    assert cache.stats()["evictions"] == 1
+
+async def test_local_cache_expires_entries():
+    cache = LocalCache(max_size=10)
+    await cache.set("a", {"id": 1}, ttl=0)
+    
+    assert await cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+async def test_invalidation_is_seen_by_every_worker_sharing_the_backend():
+    backend = FakeSharedCache()
+    worker_a = ProfileCache(backend, ttl=60)
+    worker_b = ProfileCache(backend, ttl=60)
+    await worker_a.set({"id": 7, "full_name": "Antes"})
+    
+    assert (await worker_b.get(7))["full_name"] == "Antes"
+    await worker_b.invalidate(7)
+    assert await worker_a.get(7) is None
+    assert (worker_a.hits, worker_a.misses, worker_b.invalidations) == (0, 1, 1)
+
+async def test_shared_backend_entries_expire_with_ttl():
+    backend = FakeSharedCache()
+    cache = ProfileCache(backend, ttl=30)
+    await cache.set({"id": 1})
+    
+    backend.advance(31)
+    assert await cache.get(1) is None
+
+async def test_profile_reads_go_through_the_cache(database, shared_backend, unique_email):
+    created = await UserController.create_user(UserCreate(email=unique_email(), full_name="Cacheada"))
+    user_id = created.user["id"]
+    
+    first = await UserController.get_user_by_id(user_id)
+    second = await UserController.get_user_by_id(user_id)
+    
+    assert first == second
+    assert [call for call in shared_backend.calls if call[0] == "set"] == [("set", f"user:{user_id}")]
+
+async def test_writes_refresh_or_invalidate_the_cached_profile(database, shared_backend, unique_email):
+    created = await UserController.create_user(UserCreate(email=unique_email(), full_name="Original"))
+    user_id = created.user["id"]
+    key = f"user:{user_id}"
+    await UserController.get_user_by_id(user_id)
+    
+    await UserController.update_user_profile(user_id, UserUpdate(full_name="Editada"))
+    assert shared_backend.entries[key][1]["full_name"] == "Editada"
+    
+    await UserController.deactivate_user_account(user_id)
+    assert key not in shared_backend.entries
+    assert await UserController.get_user_by_id(user_id) is None
@@ -0,0 +1,119 @@
+import asyncio
+import psycopg
+import pytest
+from app.cache import profile_cache
+from app.change_feed import ChangeFeed, changes_after, parse_cursor
+from app.config import settings
+from tests.conftest import TEST_DATABASE_URL
+
+async def _insert_user(conn, email: str) -> int:
+    cur = await conn.execute(
+        "INSERT INTO users (email, full_name) VALUES (%s, 'Feed Test') RETURNING id", (email,)
+    )
+    return (await cur.fetchone())[0]
+
+async def _changes_for(cursor, user_ids: set[int]) -> list[dict]:
+    return [c for c in await changes_after(cursor, 1000) if c["user_id"] in user_ids]
+
+async def test_late_commit_is_not_skipped(database, unique_email):
+    """Un cambio con ID menor que confirma después no queda detrás del cursor"""
+    feed = ChangeFeed()
+    head = await feed._head()
+    
+    async with await psycopg.AsyncConnection.connect(TEST_DATABASE_URL) as first, \
+               await psycopg.AsyncConnection.connect(TEST_DATABASE_URL) as second:
+        early_id = await _insert_user(first, unique_email("early"))
+        late_id = await _insert_user(second, unique_email("late"))
+        await second.commit()
+    
+        # La segunda ya confirmó, pero la primera (anterior) sigue abierta
+        assert await _changes_for(head, {early_id, late_id}) == []
+    
+        await first.commit()
+    
+    changes = await _changes_for(head, {early_id, late_id})
+    assert [c["user_id"] for c in changes] == [early_id, late_id]
+    
+    # Reanudar desde el primero entrega el segundo
+    first_cursor = (changes[0]["tx"], changes[0]["id"])
+    assert [c["user_id"] for c in await _changes_for(first_cursor, {early_id, late_id})] == [late_id]
+
+async def test_listener_cursor_waits_for_open_transactions(database, unique_email):
+    feed = ChangeFeed()
+    feed.cursor = await feed._head()
+    
+    async with await psycopg.AsyncConnection.connect(TEST_DATABASE_URL) as first, \
+               await psycopg.AsyncConnection.connect(TEST_DATABASE_URL) as second:
+        early_id = await _insert_user(first, unique_email("early"))
+        late_id = await _insert_user(second, unique_email("late"))
+        await second.commit()
+        await feed._poll()
+        held_cursor = feed.cursor
+        await first.commit()
+    
+    await feed._poll()
+    
+    assert feed.cursor > held_cursor
+    assert await _changes_for(held_cursor, {early_id, late_id})
+
+def test_parse_cursor():
+    assert parse_cursor("1250-42") == (1250, 42)
+    assert parse_cursor("42") == (0, 42)  # Last-Event-ID anterior a guardar la transacción
+    for token in ("", "x", "1-", "-1", "1-2-3"):
+        with pytest.raises(ValueError):
+            parse_cursor(token)
+
+async def test_stream_subscribes_when_iterated():
+    feed = ChangeFeed()
+    feed._task = asyncio.get_running_loop().create_future()  # feed activo
+    
+    stream = feed.stream()
+    assert feed.subscribers == set()
+    
+    keepalive = asyncio.create_task(anext(stream))
+    await asyncio.sleep(0)
+    assert len(feed.subscribers) == 1
+    
+    keepalive.cancel()
+    await asyncio.gather(keepalive, return_exceptions=True)
+    await stream.aclose()
+    assert feed.subscribers == set()
+
+def test_pool_sizes_leave_room_for_listen_connection(monkeypatch):
+    monkeypatch.setattr(settings, "db_max_connections", 20)
+    monkeypatch.setattr(settings, "workers", 4)
+    monkeypatch.setattr(settings, "db_pool_max_size", 50)
+    
+    monkeypatch.setattr(settings, "change_feed_enabled", True)
+    assert settings.pool_sizes()[1] == 4
+    
+    monkeypatch.setattr(settings, "change_feed_enabled", False)
+    assert settings.pool_sizes()[1] == 5
+
+async def test_long_transaction_suspends_the_profile_cache(database, unique_email, monkeypatch):
+    monkeypatch.setattr(settings, "change_feed_max_lag", 0.2)
+    monkeypatch.setattr(profile_cache, "suspended", False)
+    feed = ChangeFeed()
+    feed.cursor = await feed._head()
+    
+    async with await psycopg.AsyncConnection.connect(TEST_DATABASE_URL) as long_writer, \
+               await psycopg.AsyncConnection.connect(TEST_DATABASE_URL) as other:
+        await long_writer.execute("SELECT pg_current_xact_id()")  # transacción abierta con xid
+        await _insert_user(other, unique_email("held"))
+        await other.commit()
+        
+        await feed._poll()
+        assert 0 < feed.lag() < 0.2
+        assert not profile_cache.suspended
+        
+        await asyncio.sleep(0.25)
+        await feed._poll()
+        assert feed.lag() > 0.2
+        assert profile_cache.suspended
+        assert await profile_cache.get(1) is None
+        
+        await long_writer.rollback()
+    
+    await feed._poll()
+    assert feed.lag() == 0
+    assert not profile_cache.suspended
@@ -0,0 +1,46 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+from app.middleware import CompressionMiddleware
+from app.static_assets import _accepts_gzip
+from app.utils.http_cache import accepts_encoding
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("GZIP;q=0.5", True),
+    ("gzip;q=0", False),
+    ("gzip; q=0.0, br", False),
+    ("deflate, br", False),
+    ("*", True),
+    ("br, *;q=0", False),
+    ("*;q=0.1, gzip;q=0", False),
+    ("identity", False),
+    ("", False),
+    (None, False),
+])
+def test_accepts_encoding_honours_q_values(header, expected):
+    assert accepts_encoding(header, "gzip") is expected
+
+def test_static_files_respect_gzip_refusal():
+    assert _accepts_gzip({"headers": [(b"accept-encoding", b"gzip, br")]})
+    assert not _accepts_gzip({"headers": [(b"accept-encoding", b"gzip;q=0, br")]})
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=10)
+    
+    @app.get("/text")
+    async def text():
+        return PlainTextResponse("x" * 1000)
+    
+    return TestClient(app)
+
+def test_compression_follows_accept_encoding():
+    client = _client()
+    
+    assert client.get("/text", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+    refused = client.get("/text", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "content-encoding" not in refused.headers
+    assert refused.text == "x" * 1000
@@ -0,0 +1,67 @@
+from app.controllers.user_controller import UserController
+from app.models.user import UserCreate
+from app.utils.http_cache import gzip_etag, make_etag, parse_etag
+
+GZIP = {"Accept-Encoding": "gzip"}
+IDENTITY = {"Accept-Encoding": "identity"}
+
+async def _create_user(unique_email, bio: str = "") -> dict:
+    result = await UserController.create_user(UserCreate(email=unique_email(), full_name="Condicional", bio=bio))
+    return result.user
+
+def test_parse_etag_accepts_the_gzip_variant():
+    etag = make_etag(5, 3)
+    
+    assert parse_etag(etag, 5) == 3
+    assert parse_etag(gzip_etag(etag), 5) == 3
+    assert parse_etag(gzip_etag(etag), 6) is None
+
+async def test_if_match_on_missing_user_is_412(client):
+    for if_match in ('"999999999.1"', "*"):
+        response = await client.put(
+            "/api/users/999999999/profile", json={"full_name": "Nadie"}, headers={"If-Match": if_match}
+        )
+        assert response.status_code == 412
+    
+    unconditional = await client.put("/api/users/999999999/profile", json={"full_name": "Nadie"})
+    assert unconditional.status_code == 404
+
+async def test_stale_if_match_is_412(client, unique_email):
+    user = await _create_user(unique_email)
+    url = f"/api/users/{user['id']}/profile"
+    etag = (await client.get(url)).headers["etag"]
+    await client.put(url, json={"full_name": "Otra edición"})
+    
+    response = await client.put(url, json={"full_name": "Tarde"}, headers={"If-Match": etag})
+    
+    assert response.status_code == 412
+
+async def test_compressed_representation_has_its_own_etag(client, unique_email):
+    # Biografía larga para superar gzip_min_size
+    user = await _create_user(unique_email, bio="texto " * 400)
+    url = f"/api/users/{user['id']}/profile"
+    
+    plain = await client.get(url, headers=IDENTITY)
+    compressed = await client.get(url, headers=GZIP)
+    
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == gzip_etag(plain.headers["etag"])
+    
+    revalidated = await client.get(url, headers={**GZIP, "If-None-Match": compressed.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == compressed.headers["etag"]
+    
+    # El ETag de la variante comprimida sigue sirviendo para If-Match
+    updated = await client.put(
+        url, json={"full_name": "Editada"}, headers={**GZIP, "If-Match": compressed.headers["etag"]}
+    )
+    assert updated.status_code == 200
+
+async def test_list_page_etag_changes_when_a_row_changes(client, unique_email):
+    user = await _create_user(unique_email)
+    first = await client.get("/web/users", headers=IDENTITY)
+    etag = first.headers["etag"]
+    
+    assert (await client.get("/web/users", headers={**IDENTITY, "If-None-Match": etag})).status_code == 304
+    await client.put(f"/api/users/{user['id']}/profile", json={"full_name": "Cambiada"})
+    assert (await client.get("/web/users", headers={**IDENTITY, "If-None-Match": etag})).status_code == 200
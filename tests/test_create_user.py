@@ -0,0 +1,21 @@
+import pytest
+from app.controllers.user_controller import UserController
+
+async def test_duplicate_email_is_400_every_time(client, unique_email):
+    email = unique_email("dup")
+    
+    created = await client.post("/api/users/", json={"email": email, "full_name": "Primera"})
+    assert created.status_code == 201
+    
+    for _ in range(2):
+        duplicate = await client.post("/api/users/", json={"email": email, "full_name": "Otra"})
+        assert duplicate.status_code == 400
+        assert email in duplicate.json()["detail"]
+
+async def test_programming_errors_are_not_turned_into_500(client, unique_email, monkeypatch):
+    async def broken(user):
+        raise KeyError("id")
+    monkeypatch.setattr(UserController, "create_user", broken)
+    
+    with pytest.raises(KeyError):
+        await client.post("/api/users/", json={"email": unique_email(), "full_name": "Fallo"})
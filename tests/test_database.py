@@ -0,0 +1,39 @@
+import asyncio
+import time
+from app.config import settings
+
+SLEEP = 0.5
+
+async def _sleep_query(database):
+    async with database.get_connection() as conn:
+        await conn.execute("SELECT pg_sleep(%s)", (SLEEP,))
+
+async def test_concurrent_queries_do_not_serialize(database):
+    """N consultas lentas en paralelo tardan lo que una, no N veces más"""
+    _, max_size = settings.pool_sizes()
+    concurrency = min(8, max_size)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(_sleep_query(database) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    assert concurrency > 1
+    assert elapsed < SLEEP * 2, f"{concurrency} consultas de {SLEEP}s tardaron {elapsed:.2f}s"
+
+async def test_event_loop_stays_responsive_during_query(database):
+    """Mientras una consulta espera en PostgreSQL el loop sigue atendiendo otras tareas"""
+    ticks = 0
+    
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.05)
+            ticks += 1
+    
+    task = asyncio.create_task(ticker())
+    try:
+        await _sleep_query(database)
+    finally:
+        task.cancel()
+    
+    assert ticks >= SLEEP / 0.05 / 2
@@ -0,0 +1,88 @@
+import asyncio
+import time
+import psycopg
+import pytest
+from app.config import settings
+from app.controllers.statements import Statement, execute
+from app.deadlines import request_deadline
+from app.middleware import DeadlineMiddleware
+
+async def call(middleware, receive=None) -> list[dict]:
+    messages = []
+    async def default_receive():
+        await asyncio.Event().wait()
+    async def send(message):
+        messages.append(message)
+    scope = {"type": "http", "path": "/api/users", "method": "GET", "client": ("127.0.0.1", 1)}
+    await middleware(scope, receive or default_receive, send)
+    return messages
+
+async def test_timeout_before_response_start_returns_504(monkeypatch):
+    monkeypatch.setattr(settings, "request_timeout", 0.05)
+    
+    async def app(scope, receive, send):
+        await asyncio.sleep(1)
+    
+    messages = await call(DeadlineMiddleware(app))
+    
+    assert messages[0]["status"] == 504
+
+async def test_streaming_response_outlives_the_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "request_timeout", 0.05)
+    
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for chunk in (b"a", b"b", b"c"):
+            await asyncio.sleep(0.04)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    
+    messages = await call(DeadlineMiddleware(app))
+    
+    assert b"".join(m.get("body", b"") for m in messages) == b"abc"
+
+async def test_disconnect_after_response_does_not_cancel_background_work(monkeypatch):
+    monkeypatch.setattr(settings, "request_timeout", 1.0)
+    background_done = asyncio.Event()
+    
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+        await asyncio.sleep(0.05)  # tarea en segundo plano tras la respuesta
+        background_done.set()
+    
+    async def receive():
+        return {"type": "http.disconnect"}
+    
+    await call(DeadlineMiddleware(app), receive)
+    
+    assert background_done.is_set()
+
+async def test_execute_applies_the_deadline_as_statement_timeout(database):
+    sleep = Statement("test_sleep", "SELECT pg_sleep(%s)")
+    token = request_deadline.set(time.monotonic() + 0.2)
+    try:
+        async with database.get_connection() as conn:
+            async with conn.cursor() as cur:
+                with pytest.raises(psycopg.errors.QueryCanceled):
+                    await execute(cur, sleep, (2,))
+    finally:
+        request_deadline.reset(token)
+
+async def test_execute_overrides_the_server_timeout_only_within_a_deadline(database):
+    show = Statement("test_show_timeout", "SELECT current_setting('statement_timeout') AS timeout")
+    async with database.get_connection() as conn:
+        async with conn.cursor() as cur:
+            await execute(cur, show)
+            server_default = (await cur.fetchone())["timeout"]
+    
+    token = request_deadline.set(time.monotonic() + 10)
+    try:
+        async with database.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute(cur, show)
+                row = await cur.fetchone()
+    finally:
+        request_deadline.reset(token)
+    
+    assert row["timeout"] != server_default
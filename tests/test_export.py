@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+from app.config import settings
+from app.controllers.user_controller import EXPORT_COLUMNS
+from app.metrics import db_query_duration_seconds
+
+async def _user_count(database) -> int:
+    async with database.get_connection() as conn:
+        cur = await conn.execute("SELECT count(*) AS total FROM users")
+        return (await cur.fetchone())["total"]
+
+def _observations(statement: str) -> int:
+    counts, _ = db_query_duration_seconds.values.get((statement,), ([], None))
+    return sum(counts)
+
+async def test_csv_export_streams_every_row_in_several_fetches(client, database, unique_email, monkeypatch):
+    for _ in range(3):
+        await client.post("/api/users/", json={"email": unique_email("export"), "full_name": 'Exportada, con "comillas"'})
+    total = await _user_count(database)
+    monkeypatch.setattr(settings, "export_chunk_size", max(1, total // 4))
+    fetches = _observations("export_users_fetch")
+    
+    response = await client.get("/api/users/export", params={"format": "csv"})
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="users.csv"'
+    records = list(csv.reader(io.StringIO(response.text)))
+    assert records[0] == list(EXPORT_COLUMNS)
+    assert len(records) == 1 + total
+    assert len({record[0] for record in records[1:]}) == total
+    # Varias lecturas del cursor del servidor, medidas aunque no pasen por execute()
+    assert _observations("export_users_fetch") - fetches >= 4
+
+async def test_ndjson_export_selected_columns(client, database, monkeypatch):
+    total = await _user_count(database)
+    monkeypatch.setattr(settings, "export_chunk_size", max(1, total // 3))
+    
+    response = await client.get("/api/users/export", params={"format": "ndjson", "columns": "id,email"})
+    
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == total
+    assert all(set(row) == {"id", "email"} for row in rows)
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+
+async def test_export_rejects_unknown_columns(client):
+    response = await client.get("/api/users/export", params={"columns": "id,password"})
+    
+    assert response.status_code == 400
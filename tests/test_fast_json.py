@@ -0,0 +1,45 @@
+import json
+import pytest
+from app.controllers.user_controller import UserController
+from app.models.user import UserCreate, UserProfileResponse, UserSearchResponse, UserSearchResult
+from app.utils import fast_json
+
+pytest.importorskip("orjson")
+
+@pytest.fixture
+def fast_path(monkeypatch):
+    monkeypatch.setattr(fast_json, "FAST_JSON", True)
+
+def _validated(data, model) -> dict:
+    """Lo que devolvería FastAPI validando con el response_model"""
+    return model.model_validate(data).model_dump(mode="json")
+
+def test_shape_keeps_only_model_fields():
+    page = {"items": [{"id": 2, "internal": "x"}], "limit": 1, "offset": 0, "has_more": False, "extra": True}
+    
+    shaped = fast_json.shape(page, UserSearchResponse)
+    
+    assert set(shaped) == set(UserSearchResponse.model_fields)
+    assert set(shaped["items"][0]) == set(UserSearchResult.model_fields)
+
+async def test_fast_path_matches_pydantic_for_a_profile(database, fast_path, unique_email):
+    created = await UserController.create_user(UserCreate(email=unique_email(), full_name="Rápida", bio="orjson"))
+    user = await UserController.get_user_by_id(created.user["id"])
+    
+    response = fast_json.model_response(user, UserProfileResponse)
+    
+    assert json.loads(response.body) == _validated(user, UserProfileResponse)
+
+async def test_fast_path_matches_pydantic_for_nested_lists(database, fast_path, unique_email):
+    email = unique_email("anidada")
+    await UserController.create_user(UserCreate(email=email, full_name="Anidada"))
+    page = await UserController.search_users(email)
+    
+    response = fast_json.model_response(page, UserSearchResponse)
+    
+    assert json.loads(response.body) == _validated(page, UserSearchResponse)
+
+def test_disabled_fast_path_returns_data_unchanged():
+    data = {"id": 1}
+    
+    assert fast_json.model_response(data, UserProfileResponse) is data
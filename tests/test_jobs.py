@@ -0,0 +1,163 @@
+import asyncio
+import psycopg
+import pytest
+from app.config import settings
+from app.jobs import batch_jobs
+from app.models.job import JobCreate
+from tests.conftest import TEST_DATABASE_URL
+
+@pytest.fixture
+def fast_jobs(monkeypatch):
+    """Sin pausas entre lotes"""
+    monkeypatch.setattr(settings, "job_batch_pause", 0.01)
+    monkeypatch.setattr(settings, "job_backoff_step", 0.01)
+
+async def _create_users(database, unique_email, count: int) -> list[int]:
+    async with database.get_connection() as conn:
+        cur = await conn.execute(
+            "INSERT INTO users (email, full_name) SELECT unnest(%s::text[]), 'Job Test' RETURNING id",
+            ([unique_email("job") for _ in range(count)],)
+        )
+        ids = sorted(row["id"] for row in await cur.fetchall())
+        await conn.commit()
+    return ids
+
+async def _active(database, ids: list[int]) -> dict[int, bool]:
+    async with database.get_connection() as conn:
+        cur = await conn.execute("SELECT id, is_active FROM users WHERE id = ANY(%s)", (ids,))
+        return {row["id"]: row["is_active"] for row in await cur.fetchall()}
+
+async def test_locked_row_is_retried_until_released(database, unique_email, fast_jobs):
+    ids = await _create_users(database, unique_email, 3)
+    job = await batch_jobs.create(JobCreate(action="deactivate", ids=ids, batch_size=10))
+    
+    async with await psycopg.AsyncConnection.connect(TEST_DATABASE_URL) as other:
+        await other.execute("SELECT 1 FROM users WHERE id = %s FOR UPDATE", (ids[1],))
+    
+        async def release():
+            await asyncio.sleep(0.2)
+            await other.commit()
+    
+        releasing = asyncio.create_task(release())
+        result = await batch_jobs.run(job["id"])
+        await releasing
+    
+    assert result["status"] == "completed"
+    assert result["processed"] == 3
+    assert result["last_id"] >= ids[1]
+    assert await _active(database, ids) == {user_id: False for user_id in ids}
+
+async def test_job_fails_instead_of_completing_while_rows_stay_locked(database, unique_email, fast_jobs, monkeypatch):
+    monkeypatch.setattr(settings, "job_locked_retries", 3)
+    ids = await _create_users(database, unique_email, 3)
+    job = await batch_jobs.create(JobCreate(action="deactivate", ids=ids, batch_size=10))
+    
+    async with await psycopg.AsyncConnection.connect(TEST_DATABASE_URL) as other:
+        await other.execute("SELECT 1 FROM users WHERE id = %s FOR UPDATE", (ids[1],))
+        result = await batch_jobs.run(job["id"])
+        await other.rollback()
+    
+    # El cursor no pasa de la fila bloqueada y el trabajo se puede reanudar
+    assert result["status"] == "failed"
+    assert result["processed"] == 2
+    assert result["last_id"] == ids[1] - 1
+    assert await _active(database, ids) == {ids[0]: False, ids[1]: True, ids[2]: False}
+    
+    resumed = await batch_jobs.run(job["id"])
+    
+    assert resumed["status"] == "completed"
+    assert resumed["processed"] == 3
+    assert await _active(database, ids) == {user_id: False for user_id in ids}
+
+async def _mark_abandoned(database, job_id: int, status: str, seconds_ago: float):
+    """Simula un proceso que murió durante el trabajo hace seconds_ago segundos"""
+    async with database.get_connection() as conn:
+        await conn.execute(
+            "UPDATE batch_jobs SET status = %s, updated_at = CURRENT_TIMESTAMP - %s * INTERVAL '1 second' WHERE id = %s",
+            (status, seconds_ago, job_id)
+        )
+        await conn.commit()
+
+@pytest.mark.parametrize("status", ["running", "cancelling"])
+async def test_abandoned_job_can_be_resumed_once_stale(database, unique_email, fast_jobs, status):
+    ids = await _create_users(database, unique_email, 2)
+    job = await batch_jobs.create(JobCreate(action="deactivate", ids=ids))
+    
+    await _mark_abandoned(database, job["id"], status, 10)
+    assert await batch_jobs.run(job["id"]) is None  # aún puede estar vivo
+    
+    await _mark_abandoned(database, job["id"], status, settings.job_stale_after + 10)
+    resumed = await batch_jobs.run(job["id"])
+    
+    assert resumed["status"] == "completed"
+    assert await _active(database, ids) == {user_id: False for user_id in ids}
+
+async def test_abandoned_cancelling_job_can_be_cancelled(database, unique_email):
+    ids = await _create_users(database, unique_email, 1)
+    job = await batch_jobs.create(JobCreate(action="deactivate", ids=ids))
+    
+    await _mark_abandoned(database, job["id"], "cancelling", 10)
+    assert await batch_jobs.cancel(job["id"]) is None
+    
+    await _mark_abandoned(database, job["id"], "cancelling", settings.job_stale_after + 10)
+    assert (await batch_jobs.cancel(job["id"]))["status"] == "cancelled"
+
+async def test_deactivate_records_progress_with_each_batch(database, unique_email, fast_jobs, monkeypatch):
+    ids = await _create_users(database, unique_email, 5)
+    job = await batch_jobs.create(JobCreate(action="deactivate", ids=ids, batch_size=2))
+    snapshots = []
+    
+    async def observe():
+        # Entre lotes, lo registrado en batch_jobs coincide con lo ya aplicado en users
+        snapshots.append((await batch_jobs.get(job["id"]), await _active(database, ids)))
+    monkeypatch.setattr(batch_jobs, "_throttle", observe)
+    
+    result = await batch_jobs.run(job["id"])
+    
+    assert (result["status"], result["processed"], result["batches"], result["last_id"]) == ("completed", 5, 3, ids[-1])
+    assert [progress["last_id"] for progress, _ in snapshots] == [ids[1], ids[3]]
+    for progress, active in snapshots:
+        assert progress["status"] == "running"
+        assert progress["processed"] == sum(not value for value in active.values())
+        assert all(active[user_id] == (user_id > progress["last_id"]) for user_id in ids)
+
+async def test_purge_moves_users_to_the_archive_partition(database, unique_email, fast_jobs):
+    ids = await _create_users(database, unique_email, 3)
+    job = await batch_jobs.create(JobCreate(action="purge", ids=ids, batch_size=2))
+    
+    result = await batch_jobs.run(job["id"])
+    
+    assert (result["status"], result["processed"]) == ("completed", 3)
+    async with database.get_connection() as conn:
+        cur = await conn.execute("SELECT count(*) AS remaining FROM users WHERE id = ANY(%s)", (ids,))
+        assert (await cur.fetchone())["remaining"] == 0
+        cur = await conn.execute(
+            "SELECT id, job_id, tableoid::regclass::text AS partition FROM users_archive WHERE id = ANY(%s) ORDER BY id",
+            (ids,)
+        )
+        archived = await cur.fetchall()
+        cur = await conn.execute("SELECT 'users_archive_' || to_char(CURRENT_TIMESTAMP, 'YYYY_MM') AS partition")
+        partition = (await cur.fetchone())["partition"]
+    assert [(row["id"], row["job_id"], row["partition"]) for row in archived] == [
+        (user_id, job["id"], partition) for user_id in ids
+    ]
+
+async def test_cancelled_job_resumes_from_last_id(database, unique_email, fast_jobs, monkeypatch):
+    ids = await _create_users(database, unique_email, 5)
+    job = await batch_jobs.create(JobCreate(action="deactivate", ids=ids, batch_size=2))
+    
+    async def cancel_after_first_batch():
+        await batch_jobs.cancel(job["id"])
+    monkeypatch.setattr(batch_jobs, "_throttle", cancel_after_first_batch)
+    
+    # La cancelación se ve al registrar el lote siguiente, que termina igualmente
+    cancelled = await batch_jobs.run(job["id"])
+    
+    assert (cancelled["status"], cancelled["processed"], cancelled["last_id"]) == ("cancelled", 4, ids[3])
+    assert await _active(database, ids) == {**{user_id: False for user_id in ids[:4]}, ids[4]: True}
+    
+    monkeypatch.delattr(batch_jobs, "_throttle")
+    resumed = await batch_jobs.run(job["id"])
+    
+    assert (resumed["status"], resumed["processed"], resumed["last_id"]) == ("completed", 5, ids[4])
+    assert await _active(database, ids) == {user_id: False for user_id in ids}
@@ -0,0 +1,78 @@
+import re
+from app.metrics import Counter, Histogram, Registry
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})? (\S+)$')
+
+def _families(text: str) -> dict[str, dict]:
+    """Agrupa la exposición por familia comprobando que HELP y TYPE preceden a sus muestras"""
+    families: dict[str, dict] = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name = line.split(" ")[2]
+            families[name] = {"help": True, "type": None, "samples": []}
+            current = name
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert name == current, f"TYPE de {name} sin su HELP"
+            families[name]["type"] = kind
+        else:
+            match = SAMPLE.match(line)
+            assert match, f"Línea con formato inválido: {line!r}"
+            name, labels, value = match.groups()
+            suffixes = ("_bucket", "_sum", "_count") if families[current]["type"] == "histogram" else ()
+            assert name == current or name in {current + suffix for suffix in suffixes}, line
+            families[current]["samples"].append((name, labels or "", float(value)))
+    return families
+
+def _histogram_series(family: dict, labels: str) -> tuple[list[tuple[str, float]], float, float]:
+    """Buckets (le, valor), suma y cuenta de una serie; labels sin la llave final"""
+    buckets = [
+        (re.search(r'le="([^"]+)"', sample_labels).group(1), value)
+        for name, sample_labels, value in family["samples"]
+        if name.endswith("_bucket") and sample_labels.startswith(labels + ",le=")
+    ]
+    total = next(value for name, sample_labels, value in family["samples"] if name.endswith("_sum") and sample_labels == labels + "}")
+    count = next(value for name, sample_labels, value in family["samples"] if name.endswith("_count") and sample_labels == labels + "}")
+    return buckets, total, count
+
+def test_exposition_format_escapes_labels_and_accumulates_buckets():
+    registry = Registry()
+    errors = registry.register(Counter("demo_errors_total", "Errores de prueba", ("detail",)))
+    latency = registry.register(Histogram("demo_seconds", "Latencia de prueba", ("route",), buckets=(0.1, 1.0)))
+    errors.inc(detail='comillas " barra \\ salto\nfin')
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, route="/x")
+    
+    text = registry.render()
+    families = _families(text)
+    
+    assert families["demo_errors_total"]["type"] == "counter"
+    assert 'demo_errors_total{detail="comillas \\" barra \\\\ salto\\nfin"} 1' in text.splitlines()
+    buckets, total, count = _histogram_series(families["demo_seconds"], '{route="/x"')
+    assert buckets == [("0.1", 1), ("1", 3), ("+Inf", 4)]
+    assert (total, count) == (4.05, 4)
+
+async def test_metrics_endpoint_uses_route_templates(client, unique_email):
+    created = await client.post("/api/users/", json={"email": unique_email("metrics"), "full_name": "Métrica"})
+    user_id = created.json()["id"]
+    await client.get(f"/api/users/{user_id}/profile")
+    
+    response = await client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    families = _families(response.text)
+    assert families["http_requests_total"]["type"] == "counter"
+    assert families["http_request_duration_seconds"]["type"] == "histogram"
+    assert f"/api/users/{user_id}/" not in response.text
+    
+    route = '{method="GET",route="/api/users/{user_id}/profile"'
+    assert any(
+        labels == route + ',status="200"}' and value >= 1
+        for _, labels, value in families["http_requests_total"]["samples"]
+    )
+    buckets, _, count = _histogram_series(families["http_request_duration_seconds"], route)
+    values = [value for _, value in buckets]
+    assert values == sorted(values)
+    assert buckets[-1] == ("+Inf", count) and count >= 1
@@ -0,0 +1,55 @@
+"""
+Migraciones sobre una base de datos vacía (TEST_DATABASE_URL con el sufijo
+_migrations), que se recrea en cada test
+"""
+import psycopg
+import pytest
+from psycopg import sql
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+from psycopg.rows import dict_row
+from app import migrations
+from app.migrations import LATEST_VERSION, MIGRATIONS, migrate
+
+@pytest.fixture
+async def empty_database(database):
+    name = f"{conninfo_to_dict(database.connection_string)['dbname']}_migrations"
+    async with await psycopg.AsyncConnection.connect(database.connection_string, autocommit=True) as conn:
+        await conn.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(name)))
+        await conn.execute(
+            sql.SQL("CREATE DATABASE {} TEMPLATE template0 ENCODING 'UTF8'").format(sql.Identifier(name))
+        )
+    return make_conninfo(database.connection_string, dbname=name)
+
+async def _search_vector_column(conn) -> dict:
+    cur = await conn.execute(
+        """
+        SELECT attgenerated <> '' AS generated,
+               EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'update_users_search_vector') AS has_trigger,
+               EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'idx_users_search_vector') AS has_index
+        FROM pg_attribute
+        WHERE attrelid = 'users'::regclass AND attname = 'search_vector'
+        """
+    )
+    return await cur.fetchone()
+
+async def test_generated_search_vector_becomes_trigger_maintained(empty_database, monkeypatch):
+    # Una base de datos que ya pasó la migración 4 con la columna generada
+    monkeypatch.setattr(migrations, "MIGRATIONS", tuple(m for m in MIGRATIONS if m.version < 11))
+    await migrate(empty_database)
+    async with await psycopg.AsyncConnection.connect(empty_database, row_factory=dict_row) as conn:
+        assert (await _search_vector_column(conn))["generated"]
+        await conn.execute("INSERT INTO users (email, full_name, bio) VALUES ('a@example.com', 'Ana Pérez', 'pianista')")
+        await conn.commit()
+    
+    monkeypatch.setattr(migrations, "MIGRATIONS", MIGRATIONS)
+    assert await migrate(empty_database) == [LATEST_VERSION]
+    
+    async with await psycopg.AsyncConnection.connect(empty_database, row_factory=dict_row) as conn:
+        assert await _search_vector_column(conn) == {"generated": False, "has_trigger": True, "has_index": True}
+        await conn.execute("INSERT INTO users (email, full_name) VALUES ('b@example.com', 'Bruno Díaz')")
+        await conn.execute("UPDATE users SET bio = 'violinista' WHERE email = 'a@example.com'")
+        cur = await conn.execute("SELECT email, search_vector::text AS vector FROM users ORDER BY email")
+        vectors = {row["email"]: row["vector"] for row in await cur.fetchall()}
+    
+    assert "'violinista'" in vectors["a@example.com"] and "'pianista'" not in vectors["a@example.com"]
+    assert "'bruno'" in vectors["b@example.com"]
@@ -0,0 +1,72 @@
+import base64
+import json
+import pytest
+
+@pytest.fixture
+async def same_instant_users(client, database, unique_email):
+    """Siete usuarios con el mismo created_at, más recientes que cualquier otro"""
+    ids = []
+    for _ in range(7):
+        response = await client.post("/api/users/", json={"email": unique_email("page"), "full_name": "Página"})
+        ids.append(response.json()["id"])
+    async with database.get_connection() as conn:
+        await conn.execute("UPDATE users SET created_at = '2100-01-01' WHERE id = ANY(%s)", (ids,))
+        await conn.commit()
+    yield sorted(ids, reverse=True)
+    # Desactivados dejan de aparecer en la primera página de los demás tests
+    async with database.get_connection() as conn:
+        await conn.execute("UPDATE users SET is_active = FALSE WHERE id = ANY(%s)", (ids,))
+        await conn.commit()
+
+async def _page(client, cursor=None) -> dict:
+    params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+    response = await client.get("/api/users/", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+def _ids(page: dict) -> list[int]:
+    return [user["id"] for user in page["items"]]
+
+async def test_walks_forward_and_back_through_equal_created_at(client, same_instant_users):
+    first = await _page(client)
+    second = await _page(client, first["next_cursor"])
+    third = await _page(client, second["next_cursor"])
+    
+    # Empate en created_at: el id desempata sin huecos ni repetidos
+    assert _ids(first) + _ids(second) + _ids(third)[:1] == same_instant_users
+    assert first["prev_cursor"] is None
+    assert second["prev_cursor"] is not None and second["next_cursor"] is not None
+    
+    back_to_second = await _page(client, third["prev_cursor"])
+    back_to_first = await _page(client, back_to_second["prev_cursor"])
+    
+    assert _ids(back_to_second) == _ids(second)
+    assert _ids(back_to_first) == _ids(first)
+    assert back_to_first["prev_cursor"] is None
+    assert back_to_first["next_cursor"] is not None
+    assert _ids(await _page(client, back_to_first["next_cursor"])) == _ids(second)
+
+async def test_full_walk_has_no_gaps_or_duplicates(client, database, same_instant_users):
+    async with database.get_connection() as conn:
+        cur = await conn.execute("SELECT count(*) AS active FROM users WHERE is_active = TRUE")
+        active = (await cur.fetchone())["active"]
+    
+    page = await _page(client)
+    seen = _ids(page)
+    while page["next_cursor"]:
+        page = await _page(client, page["next_cursor"])
+        seen += _ids(page)
+    
+    assert len(seen) == len(set(seen)) == active
+    assert page["prev_cursor"] is not None
+    assert seen[:7] == same_instant_users
+
+@pytest.mark.parametrize("cursor", [
+    "no-es-un-cursor",
+    base64.urlsafe_b64encode(json.dumps({"d": "sideways", "k": ["2024-01-01T00:00:00", 1]}).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps({"d": "next", "k": ["ayer", 1]}).encode()).decode(),
+])
+async def test_invalid_cursor_returns_400(client, cursor):
+    response = await client.get("/api/users/", params={"cursor": cursor})
+    
+    assert response.status_code == 400
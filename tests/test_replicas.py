@@ -0,0 +1,145 @@
+"""
+Enrutado a réplicas contra una réplica de prueba
+
+La "réplica" es otra base de datos del mismo servidor (TEST_DATABASE_URL con
+el sufijo _replica), migrada igual que la principal. No replica nada: las
+filas que debe tener se copian a mano, lo que permite simular que va retrasada.
+"""
+import psycopg
+import pytest
+from psycopg import sql
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+from psycopg.errors import QueryCanceled
+from app.config import settings
+from app.controllers import user_controller
+from app.controllers.user_controller import UserController
+from app.database import Database
+from app.migrations import migrate
+from app.models.user import UserCreate, UserUpdate
+from tests.fakes import FakeSharedCache
+
+@pytest.fixture(scope="session")
+async def replica_url(database):
+    params = conninfo_to_dict(database.connection_string)
+    name = f"{params['dbname']}_replica"
+    async with await psycopg.AsyncConnection.connect(database.connection_string, autocommit=True) as conn:
+        cur = await conn.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+        if await cur.fetchone() is None:
+            await conn.execute(
+                sql.SQL("CREATE DATABASE {} TEMPLATE template0 ENCODING 'UTF8'").format(sql.Identifier(name))
+            )
+    url = make_conninfo(database.connection_string, dbname=name)
+    await migrate(url)
+    return url
+
+async def _open_database(monkeypatch, replica_urls: str, **overrides) -> Database:
+    monkeypatch.setattr(settings, "database_replica_urls", replica_urls)
+    monkeypatch.setattr(settings, "replica_check_interval", 3600.0)
+    for name, value in overrides.items():
+        monkeypatch.setattr(settings, name, value)
+    database = Database()
+    await database.open()
+    return database
+
+@pytest.fixture
+async def routed_db(monkeypatch, database, replica_url):
+    """Database con la réplica de prueba, usada también por UserController"""
+    routed = await _open_database(monkeypatch, replica_url, read_your_writes_window=30.0)
+    monkeypatch.setattr(user_controller, "db", routed)
+    yield routed
+    await routed.close()
+
+async def _served_by(conn) -> str:
+    cur = await conn.execute("SELECT current_database() AS name")
+    return (await cur.fetchone())["name"]
+
+async def _copy_to_replica(replica_url: str, user: dict):
+    """Deja en la réplica la versión actual del usuario (la que quedará atrasada)"""
+    async with await psycopg.AsyncConnection.connect(replica_url, autocommit=True) as conn:
+        await conn.execute(
+            "INSERT INTO users (id, email, full_name, bio, created_at, updated_at) VALUES (%s, %s, %s, %s, %s, %s)",
+            (user["id"], user["email"], user["full_name"], user["bio"], user["created_at"], user["updated_at"])
+        )
+
+async def test_reads_go_to_the_replica_unless_written_recently(routed_db, replica_url):
+    replica_name = conninfo_to_dict(replica_url)["dbname"]
+    primary_name = conninfo_to_dict(routed_db.connection_string)["dbname"]
+    routed_db.note_write(42)
+    
+    async with routed_db.get_read_connection() as conn:
+        assert await _served_by(conn) == replica_name
+    async with routed_db.get_read_connection(43) as conn:
+        assert await _served_by(conn) == replica_name
+    async with routed_db.get_read_connection(41, 42) as conn:
+        assert await _served_by(conn) == primary_name
+
+async def test_statement_timeout_does_not_count_against_the_replica(routed_db):
+    replica = routed_db.replicas[0]
+    
+    for _ in range(settings.replica_max_failures + 1):
+        with pytest.raises(QueryCanceled):
+            async with routed_db.get_read_connection() as conn:
+                await conn.execute("SET statement_timeout = 10")
+                await conn.execute("SELECT pg_sleep(1)")
+    
+    assert replica.healthy
+    assert replica.failures == 0
+
+async def test_unreachable_replica_falls_back_to_primary_and_is_ejected(monkeypatch, database):
+    routed = await _open_database(
+        monkeypatch, "postgresql://postgres@127.0.0.1:1/none",
+        replica_connect_timeout=0.2, replica_max_failures=2
+    )
+    try:
+        for _ in range(2):
+            async with routed.get_read_connection() as conn:
+                assert await _served_by(conn) == conninfo_to_dict(database.connection_string)["dbname"]
+        assert not routed.replicas[0].healthy
+    finally:
+        await routed.close()
+
+async def test_reads_see_own_writes_despite_a_lagging_replica(routed_db, replica_url, unique_email):
+    created = await UserController.create_user(UserCreate(email=unique_email("ryw"), full_name="Antigua"))
+    user = created.user
+    await _copy_to_replica(replica_url, user)
+    await UserController.update_user_profile(user["id"], UserUpdate(full_name="Nueva"))
+    
+    by_ids = await UserController.get_users_by_ids([user["id"]])
+    by_email = await UserController.get_user_by_email(user["email"])
+    search = await UserController.search_users(user["email"])
+    listing = await UserController.list_users(limit=100)
+    
+    assert by_ids[user["id"]]["full_name"] == "Nueva"
+    assert by_email["full_name"] == "Nueva"
+    assert [row["full_name"] for row in search["items"]] == ["Nueva"]
+    assert "rank" in search["items"][0]
+    assert {row["id"]: row["full_name"] for row in listing["items"]}[user["id"]] == "Nueva"
+
+async def test_stale_replica_reads_are_not_cached(monkeypatch, routed_db, replica_url, unique_email):
+    backend = FakeSharedCache()
+    monkeypatch.setattr(user_controller.profile_cache, "backend", backend)
+    monkeypatch.setattr(user_controller.profile_cache, "enabled", True)
+    created = await UserController.create_user(UserCreate(email=unique_email("lag"), full_name="Antigua"))
+    user = created.user
+    await _copy_to_replica(replica_url, user)
+    await UserController.update_user_profile(user["id"], UserUpdate(full_name="Nueva"))
+    backend.entries.clear()
+    # Pasada la ventana de read-your-writes la lectura va a la réplica, todavía atrasada
+    monkeypatch.setattr(settings, "read_your_writes_window", 0.0)
+    
+    stale = await UserController.get_user_by_id(user["id"])
+    
+    assert stale["full_name"] == "Antigua"
+    assert backend.entries == {}
+
+async def test_recent_writes_are_pruned_by_age_and_size(monkeypatch, routed_db):
+    monkeypatch.setattr(settings, "recent_writes_max_size", 3)
+    for user_id in range(1, 6):
+        routed_db.note_write(user_id)
+    
+    assert list(routed_db._recent_writes) == [3, 4, 5]
+    
+    monkeypatch.setattr(settings, "read_your_writes_window", 0.0)
+    monkeypatch.setattr(settings, "replica_lag_window", 0.0)
+    routed_db.note_write(6)
+    assert list(routed_db._recent_writes) == []
@@ -0,0 +1,29 @@
+import uuid
+from app.config import settings
+from app.controllers.user_controller import UserController
+from app.models.user import UserCreate
+
+async def test_search_requires_minimum_length(client):
+    response = await client.get("/api/users/search", params={"q": "a" * (settings.search_min_length - 1)})
+    
+    assert response.status_code == 422
+
+async def test_prefix_matches_rank_before_full_text(client):
+    token = uuid.uuid4().hex[:10]
+    await UserController.create_user(UserCreate(email=f"bio-{token}@example.com", full_name="Otra Persona", bio=f"conoce a {token}"))
+    await UserController.create_user(UserCreate(email=f"{token}@example.com", full_name="Por Prefijo"))
+    
+    response = await client.get("/api/users/search", params={"q": token})
+    
+    assert response.status_code == 200
+    assert [user["full_name"] for user in response.json()["items"]] == ["Por Prefijo", "Otra Persona"]
+
+async def test_candidates_are_capped_before_ranking(database, monkeypatch):
+    token = uuid.uuid4().hex[:10]
+    for index in range(3):
+        await UserController.create_user(UserCreate(email=f"{token}{index}@example.com", full_name=f"Usuario {index}"))
+    monkeypatch.setattr(settings, "search_max_candidates", 2)
+    
+    page = await UserController.search_users(token, limit=10)
+    
+    assert len(page["items"]) == 2